@@ -1,14 +1,24 @@
 """
-Simple in-memory caching system for Daily Set application.
+Simple caching system for Daily Set application.
 Provides caching for daily boards and other frequently accessed data.
+
+The backend is pluggable: a process-local MemoryCache (default) or a
+SQLite-file backed cache shared by all workers on one machine, fronted by a
+per-process memory tier kept coherent through a shared invalidation log.
 """
 
+import json
+import os
+import sqlite3
 import time
-from typing import Any, Optional, Dict, Tuple
-from datetime import datetime, timedelta
+import uuid
+from typing import Any, Callable, Optional, Dict, Tuple
+from datetime import datetime, timedelta, timezone
 import threading
 from dataclasses import dataclass
 from .logging_utils import get_logger
+from .metrics import REGISTRY, render_gauges
+from .tracing import span
 
 logger = get_logger("app.cache")
 
@@ -21,119 +31,599 @@ class CacheEntry:
     created_at: float
 
 
-class MemoryCache:
-    """Thread-safe in-memory cache with TTL support"""
-    
+def namespace_of(key: str) -> str:
+    """Namespace of a cache key: the prefix before the first ':' (e.g. 'daily_board')"""
+    return key.partition(':')[0]
+
+
+_STAT_NAMES = ('hits', 'misses', 'sets', 'evictions', 'invalidations')
+
+LOAD_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+AGE_BUCKETS = (1, 10, 60, 300, 900, 3600, 6 * 3600, 24 * 3600, 48 * 3600)
+
+# Process-wide, like every registry metric; `backend` keeps the tiers of a
+# TieredCache (and its memory/sqlite layers) apart
+CACHE_LOAD_SECONDS = REGISTRY.histogram(
+    "cache_load_seconds",
+    "Time a miss-path loader took to produce a value, by namespace",
+    ("backend", "namespace"),
+    LOAD_BUCKETS,
+)
+CACHE_ENTRY_AGE_SECONDS = REGISTRY.histogram(
+    "cache_entry_age_seconds",
+    "Age of entries leaving the cache, by namespace and reason (expired, invalidated, cleared)",
+    ("backend", "namespace", "reason"),
+    AGE_BUCKETS,
+)
+
+
+class CacheMetrics:
+    """Per-namespace cache counters, plus loader latency and entry age.
+
+    Counters are kept in per-thread dicts (written only by their owning thread)
+    and summed lazily on read, so recording a hit or miss never takes a lock.
+    Histograms go to the process registry (app/metrics.py), labelled with this
+    backend's name.
+    """
+
+    def __init__(self, backend: str = "memory"):
+        self.backend = backend
+        # thread ident -> {namespace: {stat: count}}; a reused ident simply
+        # continues the dead thread's counters, so totals stay exact
+        self._counters: Dict[int, Dict[str, Dict[str, int]]] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, namespace: str, stat: str, n: int = 1) -> None:
+        tid = threading.get_ident()
+        counters = self._counters.get(tid)
+        if counters is None:
+            with self._lock:
+                counters = self._counters.setdefault(tid, {})
+        ns = counters.get(namespace)
+        if ns is None:
+            ns = counters[namespace] = dict.fromkeys(_STAT_NAMES, 0)
+        ns[stat] += n
+
+    def observe_load(self, namespace: str, seconds: float) -> None:
+        """Record how long a miss-path loader took to produce a value"""
+        CACHE_LOAD_SECONDS.observe(seconds, (self.backend, namespace))
+
+    def observe_removal(self, namespace: str, age_seconds: float, reason: str) -> None:
+        """Record an entry leaving the cache: reason is expired, invalidated or cleared"""
+        self.incr(namespace, 'invalidations' if reason == 'invalidated' else 'evictions')
+        CACHE_ENTRY_AGE_SECONDS.observe(max(0.0, age_seconds), (self.backend, namespace, reason))
+
+    def by_namespace(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            per_thread = list(self._counters.values())
+        totals: Dict[str, Dict[str, int]] = {}
+        for counters in per_thread:
+            for ns, values in list(counters.items()):
+                agg = totals.setdefault(ns, dict.fromkeys(_STAT_NAMES, 0))
+                for name in _STAT_NAMES:
+                    agg[name] += values[name]
+        return totals
+
+    def totals(self) -> Dict[str, int]:
+        out = dict.fromkeys(_STAT_NAMES, 0)
+        for values in self.by_namespace().values():
+            for name in _STAT_NAMES:
+                out[name] += values[name]
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-namespace counters, hit rate, loader latency and entry-age histograms"""
+        namespaces: Dict[str, Any] = {}
+        for ns, values in self.by_namespace().items():
+            lookups = values['hits'] + values['misses']
+            namespaces[ns] = {
+                **values,
+                'hit_rate_percent': round(values['hits'] / lookups * 100, 2) if lookups else 0,
+            }
+        totals = REGISTRY.totals()
+        for name, labels in sorted(totals):
+            if labels[:1] != (self.backend,):
+                continue
+            if name == CACHE_LOAD_SECONDS.name:
+                entry = namespaces.setdefault(labels[1], dict.fromkeys(_STAT_NAMES, 0))
+                entry['load_seconds'] = CACHE_LOAD_SECONDS.snapshot(labels, totals)
+            elif name == CACHE_ENTRY_AGE_SECONDS.name:
+                entry = namespaces.setdefault(labels[1], dict.fromkeys(_STAT_NAMES, 0))
+                entry.setdefault('entry_age_seconds', {})[labels[2]] = CACHE_ENTRY_AGE_SECONDS.snapshot(labels, totals)
+        return namespaces
+
+    def render_counters(self, prefix: str = "daily_set_cache") -> str:
+        """Per-namespace counters in the Prometheus text format (histograms live in the registry)"""
+        by_ns = self.by_namespace()
+        return "".join(
+            render_gauges(
+                f"{prefix}_{name}_total",
+                f"Cache {name} by key namespace",
+                {(ns,): values[name] for ns, values in by_ns.items()},
+                ("namespace",),
+                kind="counter",
+            )
+            for name in _STAT_NAMES
+        )
+
+    def render_prometheus(self, prefix: str = "daily_set_cache") -> str:
+        """Counters plus the cache histograms, for the standalone cache endpoint"""
+        return self.render_counters(prefix) + REGISTRY.render_metrics([CACHE_LOAD_SECONDS, CACHE_ENTRY_AGE_SECONDS])
+
+
+def _summarize(metrics: CacheMetrics, size: int) -> Dict[str, Any]:
+    totals = metrics.totals()
+    total_requests = totals['hits'] + totals['misses']
+    hit_rate = (totals['hits'] / total_requests * 100) if total_requests > 0 else 0
+    return {
+        **totals,
+        'total_requests': total_requests,
+        'hit_rate_percent': round(hit_rate, 2),
+        'cache_size': size,
+        # Very rough estimate: 1KB per entry on average
+        'cache_memory_estimate_kb': size,
+        'namespaces': metrics.snapshot(),
+    }
+
+
+class CacheBackend:
+    """Interface implemented by cache backends used behind the cache_* helpers"""
+
+    metrics: CacheMetrics
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def cleanup_expired(self) -> int:
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl_seconds: int = 3600) -> Any:
+        """Return the cached value, or compute it with loader(), cache and return it.
+
+        Loader latency is recorded per namespace so miss-path cost is visible.
+        """
+        with span("cache.get_or_load", namespace=namespace_of(key)) as sp:
+            value = self.get(key)
+            sp.set("hit", value is not None)
+            if value is not None:
+                return value
+            start = time.perf_counter()
+            value = loader()
+            self.metrics.observe_load(namespace_of(key), time.perf_counter() - start)
+            if value is not None:
+                self.set(key, value, ttl_seconds)
+            return value
+
+
+class _Shard:
+    """One stripe of a MemoryCache: its own dict and its own lock"""
+    __slots__ = ('entries', 'lock')
+
     def __init__(self):
-        self._cache: Dict[str, CacheEntry] = {}
-        self._lock = threading.RLock()
-        self._stats = {
-            'hits': 0,
-            'misses': 0,
-            'sets': 0,
-            'evictions': 0
-        }
+        self.entries: Dict[str, CacheEntry] = {}
+        self.lock = threading.Lock()
+
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-memory cache with TTL support.
+
+    Keys are striped across shards, each guarded by its own lock, so writers to
+    different keys do not contend. Reads do not lock at all: a single dict
+    lookup is atomic under the GIL and internally synchronized on free-threaded
+    builds, and entries are immutable once stored. Locks are only taken to
+    mutate a shard. Statistics are recorded in CacheMetrics, which counts per
+    thread and sums lazily in get_stats.
+    """
     
+    def __init__(self, shards: int = 16):
+        # Power of two so shard selection is a mask rather than a modulo
+        count = 1
+        while count < max(1, shards):
+            count <<= 1
+        self._shards = [_Shard() for _ in range(count)]
+        self._mask = count - 1
+        self.metrics = CacheMetrics()
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) & self._mask]
+
     def get(self, key: str) -> Optional[Any]:
         """Get a value from cache, return None if not found or expired"""
-        with self._lock:
-            entry = self._cache.get(key)
-            if entry is None:
-                self._stats['misses'] += 1
-                return None
-            
-            # Check if expired
-            if time.time() > entry.expires_at:
-                del self._cache[key]
-                self._stats['misses'] += 1
-                self._stats['evictions'] += 1
-                return None
-            
-            self._stats['hits'] += 1
-            return entry.value
+        shard = self._shard(key)
+        entry = shard.entries.get(key)
+        ns = namespace_of(key)
+        if entry is None:
+            self.metrics.incr(ns, 'misses')
+            return None
+
+        # Check if expired
+        now = time.time()
+        if now > entry.expires_at:
+            with shard.lock:
+                # Only drop it if nobody replaced it in the meantime
+                removed = shard.entries.get(key) is entry
+                if removed:
+                    del shard.entries[key]
+            if removed:
+                self.metrics.observe_removal(ns, now - entry.created_at, 'expired')
+            self.metrics.incr(ns, 'misses')
+            return None
+
+        self.metrics.incr(ns, 'hits')
+        return entry.value
     
     def set(self, key: str, value: Any, ttl_seconds: int = 3600) -> None:
         """Set a value in cache with TTL in seconds"""
-        with self._lock:
-            now = time.time()
-            expires_at = now + ttl_seconds
-            
-            self._cache[key] = CacheEntry(
-                value=value,
-                expires_at=expires_at,
-                created_at=now
-            )
-            self._stats['sets'] += 1
+        now = time.time()
+        entry = CacheEntry(
+            value=value,
+            expires_at=now + ttl_seconds,
+            created_at=now
+        )
+        shard = self._shard(key)
+        with shard.lock:
+            shard.entries[key] = entry
+        self.metrics.incr(namespace_of(key), 'sets')
     
     def delete(self, key: str) -> bool:
         """Delete a key from cache, return True if existed"""
-        with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-                return True
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.pop(key, None)
+        if entry is None:
             return False
+        self.metrics.observe_removal(namespace_of(key), time.time() - entry.created_at, 'invalidated')
+        return True
     
     def clear(self) -> None:
         """Clear all cache entries"""
-        with self._lock:
-            evicted = len(self._cache)
-            self._cache.clear()
-            self._stats['evictions'] += evicted
+        now = time.time()
+        for shard in self._shards:
+            with shard.lock:
+                removed = list(shard.entries.items())
+                shard.entries.clear()
+            for key, entry in removed:
+                self.metrics.observe_removal(namespace_of(key), now - entry.created_at, 'cleared')
     
     def cleanup_expired(self) -> int:
         """Remove all expired entries, return count of removed entries"""
-        with self._lock:
-            now = time.time()
-            expired_keys = [
-                key for key, entry in self._cache.items()
-                if now > entry.expires_at
-            ]
-            
-            for key in expired_keys:
-                del self._cache[key]
-            
-            self._stats['evictions'] += len(expired_keys)
-            return len(expired_keys)
+        now = time.time()
+        removed = 0
+        for shard in self._shards:
+            with shard.lock:
+                expired = [
+                    (key, entry) for key, entry in shard.entries.items()
+                    if now > entry.expires_at
+                ]
+                for key, _ in expired:
+                    del shard.entries[key]
+            for key, entry in expired:
+                self.metrics.observe_removal(namespace_of(key), now - entry.created_at, 'expired')
+            removed += len(expired)
+        return removed
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        with self._lock:
-            total_requests = self._stats['hits'] + self._stats['misses']
-            hit_rate = (self._stats['hits'] / total_requests * 100) if total_requests > 0 else 0
-            
-            return {
-                **self._stats,
-                'total_requests': total_requests,
-                'hit_rate_percent': round(hit_rate, 2),
-                'cache_size': len(self._cache),
-                'cache_memory_estimate_kb': self._estimate_memory_usage()
-            }
-    
-    def _estimate_memory_usage(self) -> int:
-        """Rough estimate of memory usage in KB"""
-        # Very rough estimate: 1KB per entry on average
-        return len(self._cache)
+        stats = _summarize(self.metrics, self._size())
+        stats['shards'] = len(self._shards)
+        return stats
+
+    def _size(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+
+class SQLiteCache(CacheBackend):
+    """Cache stored in a SQLite file so every worker process on a host shares it.
+
+    Values are stored as JSON. Every write also appends to an invalidation log
+    that per-process memory tiers (see TieredCache) replay to stay coherent.
+    """
+
+    def __init__(self, path: str, invalidation_retention_seconds: int = 600):
+        self.path = path
+        self.invalidation_retention_seconds = invalidation_retention_seconds
+        # Identifies this process's writes in the invalidation log
+        self.origin = uuid.uuid4().hex
+        self._local = threading.local()
+        self.metrics = CacheMetrics("sqlite")
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_invalidations ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, origin TEXT NOT NULL, ts REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared across threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _record_invalidation(self, conn: sqlite3.Connection, key: str) -> None:
+        conn.execute(
+            "INSERT INTO cache_invalidations (key, origin, ts) VALUES (?, ?, ?)",
+            (key, self.origin, time.time()),
+        )
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """Return the raw entry (value plus expiry) or None if missing/expired"""
+        ns = namespace_of(key)
+        row = self._conn().execute(
+            "SELECT value, expires_at, created_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.metrics.incr(ns, 'misses')
+            return None
+        value_json, expires_at, created_at = row
+        now = time.time()
+        if now > expires_at:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM cache_entries WHERE key = ? AND created_at = ?", (key, created_at))
+                self._record_invalidation(conn, key)
+            self.metrics.observe_removal(ns, now - created_at, 'expired')
+            self.metrics.incr(ns, 'misses')
+            return None
+        self.metrics.incr(ns, 'hits')
+        return CacheEntry(value=json.loads(value_json), expires_at=expires_at, created_at=created_at)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry.value if entry is not None else None
+
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600) -> None:
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.warning("cache_set_unserializable", extra={"error": str(e)})
+            return
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl_seconds, now),
+            )
+            self._record_invalidation(conn, key)
+        self.metrics.incr(namespace_of(key), 'sets')
+
+    def delete(self, key: str) -> bool:
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT created_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._record_invalidation(conn, key)
+        if row is None:
+            return False
+        self.metrics.observe_removal(namespace_of(key), time.time() - row[0], 'invalidated')
+        return True
+
+    def _remove_where(self, where: str, params: tuple, reason: str) -> int:
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            rows = conn.execute(f"SELECT key, created_at FROM cache_entries WHERE {where}", params).fetchall()
+            conn.execute(f"DELETE FROM cache_entries WHERE {where}", params)
+            if reason == 'cleared':
+                self._record_invalidation(conn, "*")
+            else:
+                for key, _ in rows:
+                    self._record_invalidation(conn, key)
+        for key, created_at in rows:
+            self.metrics.observe_removal(namespace_of(key), now - created_at, reason)
+        return len(rows)
+
+    def clear(self) -> None:
+        self._remove_where("1 = 1", (), 'cleared')
+
+    def cleanup_expired(self) -> int:
+        now = time.time()
+        removed = self._remove_where("expires_at < ?", (now,), 'expired')
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "DELETE FROM cache_invalidations WHERE ts < ?",
+                (now - self.invalidation_retention_seconds,),
+            )
+        return removed
+
+    def data_version(self) -> int:
+        """Changes whenever another connection commits to the database"""
+        return int(self._conn().execute("PRAGMA data_version").fetchone()[0])
+
+    def invalidations_since(self, seq: int) -> Tuple[int, list[str], bool]:
+        """Return (latest_seq, keys written by other processes after seq, gap).
+
+        `gap` is True when log rows after `seq` were already pruned, meaning the
+        caller missed invalidations and must drop everything it holds.
+        """
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT seq, key, origin FROM cache_invalidations WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        if rows:
+            latest = rows[-1][0]
+            gap = rows[0][0] > seq + 1
+        else:
+            # Every row after seq may have been pruned; AUTOINCREMENT keeps the
+            # highest seq ever issued in sqlite_sequence
+            max_seq = int(conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'cache_invalidations'"
+            ).fetchone()[0])
+            latest = max(seq, max_seq)
+            gap = max_seq > seq
+        keys = [key for _, key, origin in rows if origin != self.origin]
+        return latest, keys, gap
+
+    def get_stats(self) -> Dict[str, Any]:
+        size = self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        stats = _summarize(self.metrics, int(size))
+        stats['backend'] = 'sqlite'
+        return stats
+
+
+class TieredCache(CacheBackend):
+    """Per-process MemoryCache in front of a shared SQLiteCache.
+
+    Reads are served from the local tier when possible. Before each read the
+    shared database's data_version is checked; when another process has
+    committed, its invalidations are replayed so stale local copies are dropped.
+    Metrics on the tier itself describe the combined (logical) lookups.
+    """
+
+    def __init__(self, shared: SQLiteCache, local: Optional[MemoryCache] = None):
+        self.shared = shared
+        self.local = local or MemoryCache()
+        self.metrics = CacheMetrics("tiered")
+        self._sync_lock = threading.Lock()
+        self._seen_seq, _, _ = shared.invalidations_since(0)
+        self._seen_version: Dict[int, int] = {}
+
+    def _sync(self) -> None:
+        # data_version is per-connection; track the last value per thread
+        tid = threading.get_ident()
+        version = self.shared.data_version()
+        if self._seen_version.get(tid) == version:
+            return
+        with self._sync_lock:
+            latest, keys, gap = self.shared.invalidations_since(self._seen_seq)
+            if gap or "*" in keys:
+                self.local.clear()
+            else:
+                for key in keys:
+                    self.local.delete(key)
+            self._seen_seq = latest
+        self._seen_version[tid] = version
+
+    def get(self, key: str) -> Optional[Any]:
+        self._sync()
+        ns = namespace_of(key)
+        value = self.local.get(key)
+        if value is not None:
+            self.metrics.incr(ns, 'hits')
+            return value
+        entry = self.shared.get_entry(key)
+        if entry is None:
+            self.metrics.incr(ns, 'misses')
+            return None
+        remaining = int(entry.expires_at - time.time())
+        if remaining > 0:
+            self.local.set(key, entry.value, remaining)
+        self.metrics.incr(ns, 'hits')
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600) -> None:
+        self.shared.set(key, value, ttl_seconds)
+        self.local.set(key, value, ttl_seconds)
+        self.metrics.incr(namespace_of(key), 'sets')
+
+    def delete(self, key: str) -> bool:
+        self.local.delete(key)
+        existed = self.shared.delete(key)
+        if existed:
+            self.metrics.incr(namespace_of(key), 'invalidations')
+        return existed
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.shared.clear()
+
+    def cleanup_expired(self) -> int:
+        self.local.cleanup_expired()
+        return self.shared.cleanup_expired()
+
+    def get_stats(self) -> Dict[str, Any]:
+        shared = self.shared.get_stats()
+        stats = _summarize(self.metrics, shared['cache_size'])
+        stats['backend'] = 'tiered'
+        stats['shared'] = shared
+        stats['local'] = self.local.get_stats()
+        return stats
 
 
 # Global cache instance
-_cache = MemoryCache()
+_cache: CacheBackend = MemoryCache()
 
 
-def get_cache() -> MemoryCache:
+def get_cache() -> CacheBackend:
     """Get the global cache instance"""
     return _cache
 
 
-def cache_daily_board(date: str, board: list, ttl_hours: int = 24) -> None:
+def configure_cache(backend: CacheBackend) -> CacheBackend:
+    """Swap the global cache backend used by the cache_* helpers"""
+    global _cache
+    _cache = backend
+    return _cache
+
+
+def create_cache_from_env() -> CacheBackend:
+    """Build a backend from CACHE_BACKEND (memory|sqlite) and CACHE_SQLITE_PATH"""
+    kind = os.getenv("CACHE_BACKEND", "memory").lower()
+    if kind == "sqlite":
+        path = os.getenv("CACHE_SQLITE_PATH", "./cache.sqlite3")
+        return TieredCache(SQLiteCache(path))
+    return MemoryCache()
+
+
+def _daily_board_ttl_seconds(date: str) -> int:
+    """TTL that keeps a board cached until the end of the UTC day after its date.
+
+    A fixed TTL counted from the moment of caching lets today's board expire
+    mid-day; anchoring to the UTC calendar keeps it warm for the whole day.
+    """
+    minimum = 24 * 3600
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return minimum
+    expires = day + timedelta(days=2)
+    remaining = int((expires - datetime.now(timezone.utc)).total_seconds())
+    return max(minimum, remaining)
+
+
+def _traced_get(key: str) -> Optional[Any]:
+    with span("cache.get", namespace=namespace_of(key)) as sp:
+        value = _cache.get(key)
+        sp.set("hit", value is not None)
+        return value
+
+
+def cache_daily_board(date: str, board: list, ttl_hours: Optional[int] = None) -> None:
     """Cache a daily board for the given date"""
     cache_key = f"daily_board:{date}"
-    _cache.set(cache_key, board, ttl_hours * 3600)
+    ttl_seconds = ttl_hours * 3600 if ttl_hours is not None else _daily_board_ttl_seconds(date)
+    _cache.set(cache_key, board, ttl_seconds)
 
 
 def get_cached_daily_board(date: str) -> Optional[list]:
     """Get cached daily board for the given date"""
     cache_key = f"daily_board:{date}"
-    return _cache.get(cache_key)
+    return _traced_get(cache_key)
+
+
+def load_daily_board(date: str, loader: Callable[[], list]) -> list:
+    """Return the cached board for date, generating and caching it on a miss"""
+    return _cache.get_or_load(f"daily_board:{date}", loader, _daily_board_ttl_seconds(date))
 
 
 def cache_leaderboard(date: str, leaderboard: list, ttl_minutes: int = 5) -> None:
@@ -145,7 +635,12 @@ def cache_leaderboard(date: str, leaderboard: list, ttl_minutes: int = 5) -> Non
 def get_cached_leaderboard(date: str) -> Optional[list]:
     """Get cached leaderboard for the given date"""
     cache_key = f"leaderboard:{date}"
-    return _cache.get(cache_key)
+    return _traced_get(cache_key)
+
+
+def load_leaderboard(date: str, loader: Callable[[], list], ttl_minutes: int = 5) -> list:
+    """Return the cached leaderboard for date, querying and caching it on a miss"""
+    return _cache.get_or_load(f"leaderboard:{date}", loader, ttl_minutes * 60)
 
 
 def invalidate_leaderboard_cache(date: str) -> None:
@@ -154,6 +649,24 @@ def invalidate_leaderboard_cache(date: str) -> None:
     _cache.delete(cache_key)
 
 
+def invalidate_daily_board_cache(date: str) -> None:
+    """Drop the cached board for a date (e.g. once the day has rolled over)"""
+    cache_key = f"daily_board:{date}"
+    _cache.delete(cache_key)
+
+
+def cache_final_leaderboard(date: str, leaderboard: list, ttl_hours: int = 24 * 7) -> None:
+    """Cache the immutable end-of-day leaderboard for a finished date"""
+    cache_key = f"leaderboard_final:{date}"
+    _cache.set(cache_key, leaderboard, ttl_hours * 3600)
+
+
+def get_cached_final_leaderboard(date: str) -> Optional[list]:
+    """Get the cached end-of-day leaderboard for a finished date"""
+    cache_key = f"leaderboard_final:{date}"
+    return _traced_get(cache_key)
+
+
 def cleanup_cache_periodically():
     """Cleanup function that can be called periodically"""
     expired_count = _cache.cleanup_expired()
@@ -167,17 +680,15 @@ def warm_daily_board_cache(dates: list[str]) -> None:
     from . import game
     
     for date in dates:
-        if get_cached_daily_board(date) is None:
-            board = game.daily_board(date)
-            cache_daily_board(date, board)
+        load_daily_board(date, lambda d=date: game.daily_board(d))
 
 
 def warm_cache_for_today_and_recent():
-    """Warm cache with today's board and recent dates"""
+    """Warm cache with today's board and recent dates (UTC, matching game.today_str)"""
     from . import game
-    from datetime import date, timedelta
+    from datetime import date
     
-    today = date.today()
+    today = date.fromisoformat(game.today_str())
     dates_to_warm = []
     
     # Add today and next few days
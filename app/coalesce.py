@@ -0,0 +1,172 @@
+"""
+Event coalescing for realtime broadcasts in Daily Set application.
+
+Events are grouped per (room, type). The first event of a group is delivered
+immediately (leading edge) and opens a short window; anything arriving while
+the window is open is merged and delivered once when it closes (trailing
+edge). A burst of N events therefore costs at most two fan-outs per window
+instead of N, and enrichment runs once per merged event.
+
+Merging rules:
+- completion: the latest event, plus a bounded `completions` list of everyone
+  who finished during the window
+- any other type: the latest event wins
+- a trailing event identical to the one already delivered (e.g. repeated
+  `daily_update`s for the same date) is suppressed entirely
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .logging_utils import get_logger
+
+logger = get_logger("app.coalesce")
+
+DeliverFunc = Callable[[dict], Awaitable[None]]
+GroupKey = Tuple[Optional[str], Optional[str]]
+
+# Cap on per-window completion details carried in a merged event
+MAX_MERGED_COMPLETIONS = 20
+
+
+def merge_events(events: List[dict]) -> dict:
+    """Collapse a window's worth of same-type events into one"""
+    latest = dict(events[-1])
+    if len(events) == 1:
+        return latest
+    latest['coalesced'] = len(events)
+    if latest.get('type') == 'completion':
+        latest['completions'] = [
+            {'player_id': e.get('player_id'), 'seconds': e.get('seconds')}
+            for e in events[-MAX_MERGED_COMPLETIONS:]
+        ]
+    return latest
+
+
+class _Window:
+    __slots__ = ('deadline', 'pending', 'last')
+
+    def __init__(self, deadline: float, last: dict):
+        self.deadline = deadline
+        self.pending: List[dict] = []
+        # Raw (pre-enrichment) copy of the last delivered event, for suppression
+        self.last = last
+
+
+class EventCoalescer:
+    """Leading+trailing edge coalescing of events per (room, type)"""
+
+    def __init__(
+        self,
+        deliver: DeliverFunc,
+        window_seconds: float = 0.25,
+        type_windows: Optional[Dict[str, float]] = None,
+    ):
+        self._deliver = deliver
+        self.window_seconds = window_seconds
+        self.type_windows = dict(type_windows or {})
+        self._windows: Dict[GroupKey, _Window] = {}
+        self._tasks: set = set()
+        self.stats_counters = {
+            'submitted': 0,
+            'delivered': 0,
+            'merged': 0,
+            'suppressed': 0,
+        }
+
+    def _key(self, event: dict) -> GroupKey:
+        return (event.get('date'), event.get('type'))
+
+    def _window_for(self, event_type: Optional[str]) -> float:
+        return self.type_windows.get(event_type or '', self.window_seconds)
+
+    async def submit(self, event: dict) -> None:
+        """Deliver now if the group is idle, otherwise hold for the trailing edge"""
+        self.stats_counters['submitted'] += 1
+        if not isinstance(event, dict):
+            await self._deliver(event)
+            return
+        key = self._key(event)
+        window = self._window_for(key[1])
+        if window <= 0:
+            await self._emit_now(event)
+            return
+        now = time.monotonic()
+        w = self._windows.get(key)
+        if w is not None and now < w.deadline:
+            w.pending.append(dict(event))
+            return
+        # Idle group, or its timer was lost with a closed loop: flush what was held
+        batch = (w.pending if w is not None else []) + [dict(event)]
+        if w is not None and self._redundant(w, batch):
+            batch = []
+        merged = merge_events(batch) if batch else None
+        w = _Window(now + window, dict(merged) if merged else (w.last if w else {}))
+        self._windows[key] = w
+        self._schedule(key, w, window)
+        if merged is not None:
+            self.stats_counters['merged'] += len(batch) - 1
+            await self._emit_now(merged)
+
+    def _redundant(self, w: _Window, batch: List[dict]) -> bool:
+        if all(e == w.last for e in batch):
+            self.stats_counters['suppressed'] += len(batch)
+            return True
+        return False
+
+    def _schedule(self, key: GroupKey, w: _Window, delay: float) -> None:
+        try:
+            asyncio.get_running_loop().call_later(delay, self._on_window_end, key, w)
+        except RuntimeError:
+            # No loop: the next submit after the deadline flushes instead
+            pass
+
+    def _on_window_end(self, key: GroupKey, w: _Window) -> None:
+        if self._windows.get(key) is not w:
+            return
+        if not w.pending:
+            del self._windows[key]
+            return
+        batch, w.pending = w.pending, []
+        window = self._window_for(key[1])
+        w.deadline = time.monotonic() + window
+        # Keep the window open so trailing deliveries are rate-limited too
+        self._schedule(key, w, window)
+        if self._redundant(w, batch):
+            return
+        merged = merge_events(batch)
+        self.stats_counters['merged'] += len(batch) - 1
+        w.last = dict(merged)
+        task = asyncio.get_running_loop().create_task(self._emit_now(merged))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _emit_now(self, event: dict) -> None:
+        self.stats_counters['delivered'] += 1
+        try:
+            await self._deliver(event)
+        except Exception as e:
+            logger.debug("coalesced_delivery_failed", extra={"error": str(e)})
+
+    def pending_count(self) -> int:
+        return sum(len(w.pending) for w in self._windows.values())
+
+    def reset(self) -> None:
+        """Forget all windows and held events (tests, shutdown)"""
+        self._windows.clear()
+
+    def drop_date(self, date: str) -> int:
+        """Forget windows (and held events) for a finished date; returns how many"""
+        keys = [k for k in self._windows if k[0] == date]
+        for key in keys:
+            del self._windows[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            'open_windows': len(self._windows),
+            'pending': self.pending_count(),
+            'window_seconds': self.window_seconds,
+        }
@@ -0,0 +1,517 @@
+"""
+WebSocket connection management for Daily Set application.
+
+Every connection owns a bounded outbound queue drained by its own writer task,
+so broadcasting enqueues one pre-serialized message per socket in O(n) without
+awaiting any network I/O. A slow client only ever delays itself: when its queue
+overflows it is either disconnected or downgraded to "latest messages only".
+
+Sends to one socket can be paced (`min_interval`). While a socket waits for its
+next slot, a new message of an event type that is already queued replaces the
+queued one, so the client always converges on the latest state without any
+message being silently skipped.
+
+Connections can subscribe to rooms (``daily-YYYYMMDD``, the same naming the Go
+gateway uses). Room-scoped events only reach that room's subscribers, plus
+legacy clients that never subscribed to anything.
+
+Liveness: a heartbeat task sends an application-level ping to connections the
+client has been silent on for `ping_interval` and reaps those silent for
+`idle_timeout`. Half-open sockets (typically mobile clients that lost their
+network) never fail a send, so without this they would linger and be visited
+by every fan-out. Admission is capped globally and per client IP.
+"""
+
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from .fastjson import dumps
+from .logging_utils import get_logger
+
+logger = get_logger("app.connections")
+
+# send(ws, meta, message, event, now_ts) -> bool; False means the socket is dead
+SendFunc = Callable[[Any, dict, Optional[str], Any, float], Awaitable[bool]]
+
+_ROOM_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Close codes: 1001 going away (idle reap), 1012 service restart (shutdown),
+# 1013 try again later (slow consumer, connection caps)
+CLOSE_IDLE = 1001
+CLOSE_SHUTDOWN = 1012
+CLOSE_TRY_AGAIN = 1013
+
+
+def room_for_date(date: Optional[str]) -> Optional[str]:
+    """Room name for a YYYY-MM-DD date (no dots: NATS subjects are tokenized by '.')"""
+    if not date:
+        return None
+    return f"daily-{str(date).replace('-', '')}"
+
+
+def is_valid_room(room: Any) -> bool:
+    return isinstance(room, str) and bool(_ROOM_RE.match(room))
+
+
+async def _default_send(ws, meta: dict, msg: Optional[str], ev, now_ts: float) -> bool:
+    try:
+        await ws.send_text(msg)
+        return True
+    except Exception as send_exc:
+        logger.debug("ws_send_error", extra={"error": str(send_exc)})
+        return False
+
+
+class Connection:
+    """A registered socket with its outbound queue and writer task"""
+
+    __slots__ = (
+        'ws', 'meta', 'pending', 'latest', 'wakeup', 'writer', 'sending', 'sent', 'dropped',
+        'coalesced', 'closed', 'rooms', 'scoped', 'next_send_at', 'ip', 'last_seen', 'last_ping',
+    )
+
+    def __init__(self, ws, meta: dict, ip: Optional[str] = None):
+        self.ws = ws
+        self.meta = meta
+        self.ip = ip
+        # Monotonic time of the last message from the client, and of our last ping
+        self.last_seen = time.monotonic()
+        self.last_ping = 0.0
+        # Queued [kind, message] entries; latest maps kind -> its queued entry
+        self.pending: Deque[List[Any]] = deque()
+        self.latest: Dict[str, List[Any]] = {}
+        # Created with the writer so it binds to the loop the writer runs on
+        self.wakeup: Optional[asyncio.Event] = None
+        self.writer: Optional[asyncio.Task] = None
+        self.sending = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.closed = False
+        self.rooms: Set[str] = set()
+        # True once the client has subscribed; it then only gets its rooms' events
+        self.scoped = False
+        # Monotonic time before which the writer must not send again (pacing)
+        self.next_send_at = 0.0
+
+    def messages(self) -> List[str]:
+        """Queued message payloads, oldest first"""
+        return [entry[1] for entry in self.pending]
+
+    def _popleft(self) -> List[Any]:
+        entry = self.pending.popleft()
+        kind = entry[0]
+        if kind is not None and self.latest.get(kind) is entry:
+            del self.latest[kind]
+        return entry
+
+
+class ConnectionManager:
+    """Registry of live WebSocket connections with per-connection send queues.
+
+    overflow_policy:
+    - "disconnect" (default): a client whose queue is full is closed with 1013
+      (try again later) and forgotten; it will reconnect and refetch
+    - "drop_oldest": the oldest queued message is discarded to make room, so
+      the client keeps receiving the most recent updates
+
+    min_interval paces sends per socket; typed messages queued meanwhile are
+    coalesced to the newest per kind (see module docstring).
+
+    max_connections / max_per_ip cap admission (0 = unlimited); ping_interval
+    and idle_timeout drive the heartbeat task (0 disables each).
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 64,
+        send_timeout: float = 5.0,
+        overflow_policy: str = "disconnect",
+        send: Optional[SendFunc] = None,
+        max_rooms_per_connection: int = 8,
+        min_interval: float = 0.0,
+        max_connections: int = 0,
+        max_per_ip: int = 0,
+        ping_interval: float = 0.0,
+        idle_timeout: float = 0.0,
+    ):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._per_ip: Dict[str, int] = {}
+        self.min_interval = min_interval
+        self.send_timeout = send_timeout
+        self.overflow_policy = overflow_policy
+        self.max_rooms_per_connection = max_rooms_per_connection
+        self._send = send or _default_send
+        self._conns: Dict[Any, Connection] = {}
+        # room -> subscribed connections; unscoped connections receive every event
+        self._rooms: Dict[str, Set[Connection]] = {}
+        self._unscoped: Set[Connection] = set()
+        self.stats_counters = {
+            'enqueued': 0,
+            'sent': 0,
+            'dropped': 0,
+            'slow_disconnects': 0,
+            'send_failures': 0,
+            'coalesced': 0,
+            'pings': 0,
+            'rejected_global': 0,
+            'rejected_per_ip': 0,
+        }
+        # Server-initiated disconnects by reason
+        self.reaped: Dict[str, int] = {}
+        self.max_queue_depth_seen = 0
+
+    # --- registry (dict-like so callers can treat it as ws -> meta) ---
+
+    def admit(self, ip: Optional[str]) -> Optional[str]:
+        """Reason a new connection from ip must be refused, or None to accept it.
+
+        Call register() without awaiting in between so the caps cannot be raced.
+        """
+        if self.max_connections and len(self._conns) >= self.max_connections:
+            self.stats_counters['rejected_global'] += 1
+            return "global_limit"
+        if self.max_per_ip and ip and self._per_ip.get(ip, 0) >= self.max_per_ip:
+            self.stats_counters['rejected_per_ip'] += 1
+            return "per_ip_limit"
+        return None
+
+    def register(self, ws, meta: Optional[dict] = None, ip: Optional[str] = None) -> Connection:
+        conn = Connection(ws, meta if meta is not None else {}, ip)
+        self._conns[ws] = conn
+        self._unscoped.add(conn)
+        if ip:
+            self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        return conn
+
+    def touch(self, ws) -> None:
+        """Record that the client sent something (any message proves liveness)"""
+        conn = self._conns.get(ws)
+        if conn is not None:
+            conn.last_seen = time.monotonic()
+
+    def __setitem__(self, ws, meta: dict) -> None:
+        self.register(ws, meta)
+
+    def __getitem__(self, ws) -> dict:
+        return self._conns[ws].meta
+
+    def __contains__(self, ws) -> bool:
+        return ws in self._conns
+
+    def __len__(self) -> int:
+        return len(self._conns)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self._conns))
+
+    def items(self) -> Iterator[Tuple[Any, dict]]:
+        return iter([(ws, c.meta) for ws, c in self._conns.items()])
+
+    def get(self, ws) -> Optional[Connection]:
+        return self._conns.get(ws)
+
+    def pop(self, ws, default=None):
+        conn = self._conns.get(ws)
+        if conn is None:
+            return default
+        self._forget(conn)
+        return conn.meta
+
+    def unregister(self, ws) -> None:
+        self.pop(ws, None)
+
+    def clear(self) -> None:
+        for conn in list(self._conns.values()):
+            self._stop(conn)
+        self._conns.clear()
+        self._rooms.clear()
+        self._unscoped.clear()
+        self._per_ip.clear()
+
+    def _forget(self, conn: Connection, reason: Optional[str] = None) -> None:
+        """Drop a connection from the registry and room index and stop its writer.
+
+        reason records a server-initiated disconnect in `reaped`.
+        """
+        if self._conns.get(conn.ws) is conn:
+            del self._conns[conn.ws]
+            if conn.ip:
+                left = self._per_ip.get(conn.ip, 0) - 1
+                if left > 0:
+                    self._per_ip[conn.ip] = left
+                else:
+                    self._per_ip.pop(conn.ip, None)
+            if reason is not None:
+                self.reaped[reason] = self.reaped.get(reason, 0) + 1
+        self._unscoped.discard(conn)
+        for room in conn.rooms:
+            members = self._rooms.get(room)
+            if members is not None:
+                members.discard(conn)
+                if not members:
+                    del self._rooms[room]
+        conn.rooms.clear()
+        self._stop(conn)
+
+    # --- rooms ---
+
+    def subscribe(self, ws, room: str) -> bool:
+        """Add a connection to a room; return False if unknown, invalid or over the cap"""
+        conn = self._conns.get(ws)
+        if conn is None or not is_valid_room(room):
+            return False
+        if room not in conn.rooms and len(conn.rooms) >= self.max_rooms_per_connection:
+            return False
+        conn.rooms.add(room)
+        conn.scoped = True
+        self._unscoped.discard(conn)
+        self._rooms.setdefault(room, set()).add(conn)
+        return True
+
+    def unsubscribe(self, ws, room: str) -> bool:
+        conn = self._conns.get(ws)
+        if conn is None or room not in conn.rooms:
+            return False
+        conn.rooms.discard(room)
+        members = self._rooms.get(room)
+        if members is not None:
+            members.discard(conn)
+            if not members:
+                del self._rooms[room]
+        return True
+
+    def subscribers(self, room: Optional[str]) -> int:
+        """How many connections an event for room would reach"""
+        if room is None:
+            return len(self._conns)
+        return len(self._rooms.get(room, ())) + len(self._unscoped)
+
+    # --- sending ---
+
+    def _stop(self, conn: Connection) -> None:
+        conn.closed = True
+        conn.pending.clear()
+        conn.latest.clear()
+        writer = conn.writer
+        if writer is None or writer.done():
+            return
+        try:
+            current = asyncio.current_task()
+        except RuntimeError:
+            current = None
+        if writer is not current:
+            try:
+                writer.cancel()
+            except RuntimeError:
+                # The writer's loop is already closed
+                pass
+
+    def _ensure_writer(self, conn: Connection) -> None:
+        if conn.writer is not None and not conn.writer.done():
+            return
+        conn.wakeup = asyncio.Event()
+        conn.writer = asyncio.get_running_loop().create_task(self._writer(conn))
+
+    async def _writer(self, conn: Connection) -> None:
+        wakeup = conn.wakeup
+        assert wakeup is not None
+        while not conn.closed:
+            if not conn.pending:
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+            delay = conn.next_send_at - time.monotonic()
+            if delay > 0:
+                # Rate-limited: newer messages of a queued kind replace it meanwhile
+                await asyncio.sleep(delay)
+                if not conn.pending:
+                    continue
+            _kind, msg = conn._popleft()
+            conn.sending = True
+            try:
+                ok = await asyncio.wait_for(
+                    self._send(conn.ws, conn.meta, msg, None, time.time()), self.send_timeout
+                )
+            except Exception:
+                ok = False
+            finally:
+                conn.sending = False
+            if not ok:
+                self.stats_counters['send_failures'] += 1
+                self._forget(conn, "send_failure")
+                return
+            conn.sent += 1
+            self.stats_counters['sent'] += 1
+            if self.min_interval > 0:
+                conn.next_send_at = time.monotonic() + self.min_interval
+
+    def _overflow(self, conn: Connection) -> bool:
+        """Handle a full queue; return True if the message can still be queued"""
+        conn.dropped += 1
+        self.stats_counters['dropped'] += 1
+        if self.overflow_policy == "drop_oldest":
+            conn._popleft()
+            return True
+        self.stats_counters['slow_disconnects'] += 1
+        logger.info("ws_slow_consumer_disconnected", extra={"event": {"queued": len(conn.pending)}})
+        self._forget(conn, "slow_consumer")
+        try:
+            asyncio.get_running_loop().create_task(self._close(conn.ws, CLOSE_TRY_AGAIN))
+        except RuntimeError:
+            pass
+        return False
+
+    async def _close(self, ws, code: int) -> None:
+        try:
+            await ws.close(code=code)
+        except Exception:
+            pass
+
+    def enqueue(self, conn: Connection, message: str, kind: Optional[str] = None) -> bool:
+        """Queue a message for one connection without awaiting I/O.
+
+        If a message of the same kind is still queued it is replaced in place.
+        """
+        if conn.closed:
+            return False
+        if kind is not None:
+            queued = conn.latest.get(kind)
+            if queued is not None:
+                queued[1] = message
+                conn.coalesced += 1
+                self.stats_counters['coalesced'] += 1
+                return True
+        if len(conn.pending) >= self.queue_size and not self._overflow(conn):
+            return False
+        entry = [kind, message]
+        conn.pending.append(entry)
+        if kind is not None:
+            conn.latest[kind] = entry
+        depth = len(conn.pending)
+        if depth > self.max_queue_depth_seen:
+            self.max_queue_depth_seen = depth
+        self.stats_counters['enqueued'] += 1
+        self._ensure_writer(conn)
+        assert conn.wakeup is not None
+        conn.wakeup.set()
+        return True
+
+    def broadcast(self, message: str, room: Optional[str] = None, kind: Optional[str] = None) -> int:
+        """Enqueue a pre-serialized message; return how many connections accepted it.
+
+        With a room, only that room's subscribers (and never-subscribed legacy
+        clients) are visited, so cost scales with interested clients.
+        """
+        if room is None:
+            targets = list(self._conns.values())
+        else:
+            targets = list(self._rooms.get(room, ()))
+            targets.extend(self._unscoped)
+        accepted = 0
+        for conn in targets:
+            if self.enqueue(conn, message, kind):
+                accepted += 1
+        return accepted
+
+    # --- liveness ---
+
+    def heartbeat(self, now: Optional[float] = None) -> Tuple[int, int]:
+        """Ping quiet connections and reap silent ones; return (pinged, reaped)"""
+        now = time.monotonic() if now is None else now
+        ping_msg = None
+        pinged = reaped = 0
+        for conn in list(self._conns.values()):
+            idle = now - conn.last_seen
+            if self.idle_timeout and idle >= self.idle_timeout:
+                self._forget(conn, "idle_timeout")
+                reaped += 1
+                try:
+                    asyncio.get_running_loop().create_task(self._close(conn.ws, CLOSE_IDLE))
+                except RuntimeError:
+                    pass
+                continue
+            if self.ping_interval and idle >= self.ping_interval and now - conn.last_ping >= self.ping_interval:
+                if ping_msg is None:
+                    ping_msg = dumps({"v": 1, "type": "ping", "ts": time.time()})
+                conn.last_ping = now
+                if self.enqueue(conn, ping_msg, kind="ping"):
+                    pinged += 1
+        self.stats_counters['pings'] += pinged
+        if reaped:
+            logger.info("ws_idle_reaped", extra={"event": {"reaped": reaped, "connections": len(self._conns)}})
+        return pinged, reaped
+
+    async def _heartbeat_loop(self) -> None:
+        periods = [p for p in (self.ping_interval, self.idle_timeout) if p > 0]
+        tick = max(0.05, min(periods) / 2)
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                self.heartbeat()
+            except Exception as e:  # pragma: no cover - defensive
+                logger.warning("ws_heartbeat_failed", extra={"error": str(e)})
+
+    def start_heartbeat(self) -> None:
+        """Run heartbeat() periodically on the running loop (no-op if disabled or running)"""
+        if not (self.ping_interval > 0 or self.idle_timeout > 0):
+            return
+        if self._heartbeat_task is not None and not self._heartbeat_task.done():
+            return
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+
+    def stop_heartbeat(self) -> None:
+        if self._heartbeat_task is not None:
+            try:
+                self._heartbeat_task.cancel()
+            except RuntimeError:
+                pass
+            self._heartbeat_task = None
+
+    async def close_all(self, code: int = CLOSE_SHUTDOWN, timeout: float = 2.0) -> int:
+        """Close every connection (graceful shutdown); return how many were closed"""
+        conns = list(self._conns.values())
+        for conn in conns:
+            self._forget(conn, "shutdown")
+        if conns:
+            await asyncio.wait(
+                [asyncio.get_running_loop().create_task(self._close(c.ws, code)) for c in conns],
+                timeout=timeout,
+            )
+        return len(conns)
+
+    async def flush(self, timeout: float = 5.0) -> None:
+        """Wait until every queue has been written out (used by tests and shutdown)"""
+        deadline = time.monotonic() + timeout
+        while any(c.pending or c.sending for c in self._conns.values()):
+            if time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.001)
+
+    def stats(self) -> Dict[str, Any]:
+        depths = [len(c.pending) for c in self._conns.values()]
+        return {
+            **self.stats_counters,
+            'connections': len(self._conns),
+            'queue_depth_total': sum(depths),
+            'queue_depth_max': max(depths) if depths else 0,
+            'queue_depth_max_seen': self.max_queue_depth_seen,
+            'queue_size': self.queue_size,
+            'min_interval': self.min_interval,
+            'overflow_policy': self.overflow_policy,
+            'rooms': len(self._rooms),
+            'room_subscriptions': sum(len(m) for m in self._rooms.values()),
+            'unscoped_connections': len(self._unscoped),
+            'unique_ips': len(self._per_ip),
+            'max_connections': self.max_connections,
+            'max_per_ip': self.max_per_ip,
+            'reaped': dict(self.reaped),
+        }
@@ -6,16 +6,19 @@ from sqlalchemy import func, select as sa_select, desc
 import json
 from datetime import datetime, timedelta, timezone
 import uuid
-from typing import Optional
+from typing import Optional, Sequence
 from . import models
 import hmac
 import hashlib
 import os
 
+from .tracing import traced
+
 # secret for signing session tokens; override with SESSION_SECRET env var in production
 _SECRET = os.environ.get('SESSION_SECRET', 'dev-secret-change-me')
 
 
+@traced()
 def sign_session_token(db_session: Session, sid: str) -> Optional[str]:
     """Sign a session id using the session's per-session secret.
 
@@ -29,6 +32,7 @@ def sign_session_token(db_session: Session, sid: str) -> Optional[str]:
     return f"{sid}.{sig}"
 
 
+@traced()
 def sign_player_token(db_session: Session, pid: int) -> Optional[str]:
     """Sign a player id into a token for cookie-based persistent identity."""
     # simple HMAC of pid using global secret
@@ -45,6 +49,7 @@ def sign_player_token(db_session: Session, pid: int) -> Optional[str]:
     return f"{val}.{sig}"
 
 
+@traced()
 def verify_player_token(db_session: Session, token: str) -> Optional[int]:
     try:
         pid_s, sig = token.rsplit('.', 1)
@@ -66,6 +71,7 @@ def verify_player_token(db_session: Session, token: str) -> Optional[int]:
     return pid
 
 
+@traced()
 def create_anonymous_player(session: Session) -> models.Player:
     # create a lightweight player record without password so we can persist identity
     uname = f"anon-{uuid.uuid4().hex[:8]}"
@@ -76,6 +82,7 @@ def create_anonymous_player(session: Session) -> models.Player:
     return p
 
 
+@traced()
 def verify_session_token(db_session: Session, token: str) -> Optional[str]:
     """Verify a session token using the per-session secret.
 
@@ -98,6 +105,7 @@ pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
 engine = None
 
 
+@traced()
 def create_player(session: Session, username: str, password: str):
     q = session.exec(sqlmodel_select(models.Player).where(models.Player.username == username)).first()
     if q:
@@ -110,13 +118,19 @@ def create_player(session: Session, username: str, password: str):
     return p
 
 
+@traced()
 def get_player_by_username(session: Session, username: str):
     return session.exec(sqlmodel_select(models.Player).where(models.Player.username == username)).first()
 
 
-def record_time(session: Session, player_id: int, date: str, seconds: int):
+@traced()
+def record_time(session: Session, player_id: int, date: str, seconds: int, events: Sequence[dict] = ()):
+    """Insert a completion; `events` are staged in the realtime outbox in the same transaction."""
     comp = models.Completion(player_id=player_id, date=date, seconds=seconds, completed_at=datetime.now(timezone.utc))
     session.add(comp)
+    if events:
+        from .outbox import stage_events
+        stage_events(session, events)
     session.commit()
     
     # Invalidate leaderboard cache for this date
@@ -129,6 +143,7 @@ def record_time(session: Session, player_id: int, date: str, seconds: int):
     return comp
 
 
+@traced()
 def create_session(session: Session, player_id: Optional[int], date: str, board, ttl_minutes: int = 60):
     sid = str(uuid.uuid4())
     now = datetime.now(timezone.utc)
@@ -150,6 +165,7 @@ def create_session(session: Session, player_id: Optional[int], date: str, board,
     return gs
 
 
+@traced()
 def rotate_session_secret(session: Session, sid: str) -> Optional[str]:
     gs = session.get(models.GameSession, sid)
     if not gs:
@@ -163,10 +179,12 @@ def rotate_session_secret(session: Session, sid: str) -> Optional[str]:
     return new_secret
 
 
+@traced()
 def get_session_by_id(session: Session, sid: str):
     return session.get(models.GameSession, sid)
 
 
+@traced()
 def get_active_session_for_player_date(session: Session, player_id: Optional[int], date: str):
     """Return the most recent unfinished session for this player/date if any."""
     if player_id is None:
@@ -180,6 +198,7 @@ def get_active_session_for_player_date(session: Session, player_id: Optional[int
     ).first()
 
 
+@traced()
 def finish_session(session: Session, sid: str):
     gs = session.get(models.GameSession, sid)
     if not gs:
@@ -191,6 +210,7 @@ def finish_session(session: Session, sid: str):
     return gs
 
 
+@traced()
 def get_leaderboard(session: Session, date: str, limit: int | None = 10):
     """Return list of {username, best, completed_at, sets_found, effective}.
     - best: minimum seconds for the date
@@ -268,6 +288,40 @@ def get_leaderboard(session: Session, date: str, limit: int | None = 10):
     return leaders
 
 
+@traced()
+def save_leaderboard_snapshot(session: Session, date: str, leaders: list):
+    """Persist the final leaderboard for a finished date.
+
+    Snapshots are immutable: if one already exists for the date it is returned unchanged.
+    """
+    existing = session.get(models.LeaderboardSnapshot, date)
+    if existing:
+        return existing
+    snap = models.LeaderboardSnapshot(
+        date=date,
+        leaders_json=json.dumps(leaders),
+        created_at=datetime.now(timezone.utc),
+    )
+    session.add(snap)
+    session.commit()
+    session.refresh(snap)
+    return snap
+
+
+@traced()
+def get_leaderboard_snapshot(session: Session, date: str) -> Optional[list]:
+    """Return the stored final leaderboard rows for a date, or None if not finalized."""
+    snap = session.get(models.LeaderboardSnapshot, date)
+    if not snap:
+        return None
+    try:
+        leaders = json.loads(snap.leaders_json)
+    except Exception:
+        return None
+    return leaders if isinstance(leaders, list) else None
+
+
+@traced()
 def has_completed(session: Session, player_id: int, date: str) -> bool:
     """Return True if the player has at least one completion for the given date."""
     if player_id is None:
@@ -281,6 +335,7 @@ def has_completed(session: Session, player_id: int, date: str) -> bool:
     return row is not None
 
 
+@traced()
 def get_player_daily_status(session: Session, player_id: int, date: str):
     """Return dict with keys: seconds (best), completed_at (earliest for best), placement (1-indexed).
     Returns None if the player has no completion for the date.
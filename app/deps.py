@@ -1,8 +1,15 @@
 from sqlmodel import Session
 from . import crud
+from .tracing import span
 
 
 def get_session():
-    # simple dependency that yields a session
-    with Session(crud.engine) as session:
-        yield session
+    # simple dependency that yields a session; its span covers the session's
+    # lifetime (setup and teardown run in different threadpool calls, so the
+    # span is ended explicitly rather than made current)
+    session_span = span("deps.get_session")
+    try:
+        with Session(crud.engine) as session:
+            yield session
+    finally:
+        session_span.end()
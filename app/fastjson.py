@@ -0,0 +1,71 @@
+"""
+Shared JSON encoding for Daily Set application.
+
+One encoder for API responses, realtime messages (WebSocket, SSE, NATS) and
+JSON log lines: orjson when it is installed (optional dependency), otherwise
+stdlib `json` with compact separators. Output is UTF-8 without ASCII escaping
+either way. Anything orjson refuses (e.g. integers beyond 64 bits) is retried
+with stdlib so both paths accept the same inputs.
+
+`FastJSONResponse` renders with this encoder. FastAPI still runs returned
+dicts through `jsonable_encoder`; endpoints whose payload is already plain
+JSON types (dict/list/str/int/float/bool/None) can return `json_response()`
+directly to skip that pass as well.
+"""
+
+import json
+from typing import Any, Callable, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional dep
+    orjson = None  # type: ignore
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps_bytes(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Serialize to UTF-8 JSON bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """Serialize to a JSON str (for text frames and log lines)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":"))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the shared encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> FastJSONResponse:
+    """Return plain-JSON content as-is, skipping FastAPI's jsonable_encoder pass.
+
+    Returning a Response from an endpoint bypasses the injected `response`
+    parameter, so headers that dependencies set on it (e.g. RateLimit-*) are
+    copied over here.
+    """
+    out = FastJSONResponse(content, status_code=status_code)
+    if response is not None:
+        for name, value in response.raw_headers:
+            if name not in (b"content-length", b"content-type"):
+                out.raw_headers.append((name, value))
+        if response.status_code is not None:
+            out.status_code = response.status_code
+    return out
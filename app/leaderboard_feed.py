@@ -0,0 +1,201 @@
+"""
+Versioned, delta-encoded live leaderboard for Daily Set application.
+
+Each date has a sequence number and the last published top-N rows. Publishing
+new rows produces a `leaderboard_delta` message that carries only what changed
+relative to the previous version:
+
+- {"op": "remove", "key": username}
+- {"op": "upsert", "key": username, "index": i, "row": {...}}  (new or changed row)
+- {"op": "move", "key": username, "index": i}                  (same row, new place)
+
+Rows whose relative order is unchanged (the longest increasing run of old
+positions) get no op at all; a client places every upsert/move at its index
+and fills the remaining slots with the untouched rows in their previous order
+(see apply_ops). A client whose `seq` differs from a delta's `base` (or whose
+`epoch` differs, e.g. after a restart) missed a version and asks for a
+`leaderboard_snapshot` instead.
+
+Versions must follow the database: callers hold `lock_for(date)` around the
+leaderboard read and `publish`, so an older read can never be published after
+a newer one. Deltas are handed to clients with `mark_sent`, which refuses one
+older than a delta already sent for its date (clients that are behind resync
+from the snapshot).
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .connections import room_for_date
+
+Row = Dict[str, Any]
+
+
+def _row_key(row: Row) -> Any:
+    return row.get('username')
+
+
+def _stable_positions(old_positions: List[int]) -> set:
+    """Indices (into old_positions) forming a longest strictly increasing subsequence"""
+    tails: List[int] = []
+    tail_idx: List[int] = []
+    prev: List[int] = [-1] * len(old_positions)
+    for i, pos in enumerate(old_positions):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < pos:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(tails):
+            tails.append(pos)
+            tail_idx.append(i)
+        else:
+            tails[lo] = pos
+            tail_idx[lo] = i
+        prev[i] = tail_idx[lo - 1] if lo > 0 else -1
+    keep = set()
+    i = tail_idx[-1] if tail_idx else -1
+    while i >= 0:
+        keep.add(i)
+        i = prev[i]
+    return keep
+
+
+def diff_rows(old: List[Row], new: List[Row]) -> List[Dict[str, Any]]:
+    """Minimal remove/upsert/move ops turning old into new (rows keyed by username)"""
+    old_index = {_row_key(r): i for i, r in enumerate(old)}
+    new_keys = {_row_key(r) for r in new}
+    ops: List[Dict[str, Any]] = [{'op': 'remove', 'key': k} for k in old_index if k not in new_keys]
+
+    # Rows present in both versions, in new order, with their old positions
+    carried = [(i, r) for i, r in enumerate(new) if _row_key(r) in old_index]
+    stable = _stable_positions([old_index[_row_key(r)] for _, r in carried])
+    stable_keys = {_row_key(carried[j][1]) for j in stable}
+
+    for i, row in enumerate(new):
+        key = _row_key(row)
+        if key not in old_index or row != old[old_index[key]]:
+            ops.append({'op': 'upsert', 'key': key, 'index': i, 'row': row})
+        elif key not in stable_keys:
+            ops.append({'op': 'move', 'key': key, 'index': i})
+    return ops
+
+
+def apply_ops(old: List[Row], ops: List[Dict[str, Any]], size: int) -> List[Row]:
+    """Reference client-side application of a delta (mirrored in the frontend)"""
+    by_key = {_row_key(r): r for r in old}
+    placed: Dict[int, Row] = {}
+    touched = set()
+    for op in ops:
+        key = op.get('key')
+        touched.add(key)
+        if op['op'] == 'remove':
+            by_key.pop(key, None)
+        elif op['op'] == 'upsert':
+            by_key[key] = op['row']
+            placed[op['index']] = op['row']
+        elif op['op'] == 'move' and key in by_key:
+            placed[op['index']] = by_key[key]
+    rest = iter(r for r in old if _row_key(r) not in touched)
+    return [placed[i] if i in placed else next(rest) for i in range(size)]
+
+
+class LeaderboardFeed:
+    """Per-date versioned top-N leaderboard that emits deltas between versions"""
+
+    def __init__(self, top_n: int = 10, max_dates: int = 8):
+        self.top_n = top_n
+        self.max_dates = max_dates
+        # Sequence numbers restart with the process; the epoch tells clients so
+        self.epoch = uuid.uuid4().hex[:8]
+        # date -> (seq, rows); least recently published first
+        self._state: "OrderedDict[str, Tuple[int, List[Row]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # date -> lock serializing that date's read-and-publish
+        self._date_locks: "OrderedDict[str, threading.Lock]" = OrderedDict()
+        # date -> seq of the newest delta handed to clients
+        self._sent: Dict[str, int] = {}
+
+    def lock_for(self, date: str) -> threading.Lock:
+        """Lock to hold around reading a date's leaderboard and publishing it"""
+        with self._lock:
+            lock = self._date_locks.get(date)
+            if lock is None:
+                lock = self._date_locks[date] = threading.Lock()
+                # Forget idle locks of old dates; a held one stays until released
+                for stale in list(self._date_locks)[: max(0, len(self._date_locks) - self.max_dates)]:
+                    if not self._date_locks[stale].locked():
+                        del self._date_locks[stale]
+            else:
+                self._date_locks.move_to_end(date)
+            return lock
+
+    def mark_sent(self, delta: Dict[str, Any]) -> bool:
+        """Record that a delta is going out; False if a newer one for its date already did"""
+        if delta.get('epoch') != self.epoch:
+            return False
+        date, seq = delta['date'], delta['seq']
+        with self._lock:
+            if seq <= self._sent.get(date, 0) or date not in self._state:
+                return False
+            self._sent[date] = seq
+            return True
+
+    def publish(self, date: str, rows: List[Row]) -> Optional[Dict[str, Any]]:
+        """Record a new version; return the delta message, or None if nothing changed"""
+        rows = [dict(r) for r in rows[: self.top_n]]
+        with self._lock:
+            seq, old = self._state.get(date, (0, []))
+            if seq and rows == old:
+                return None
+            ops = diff_rows(old, rows)
+            self._state[date] = (seq + 1, rows)
+            self._state.move_to_end(date)
+            while len(self._state) > self.max_dates:
+                evicted, _ = self._state.popitem(last=False)
+                self._sent.pop(evicted, None)
+        return {
+            'v': 1,
+            'type': 'leaderboard_delta',
+            'date': date,
+            'room': room_for_date(date),
+            'epoch': self.epoch,
+            'seq': seq + 1,
+            'base': seq,
+            'size': len(rows),
+            'top_n': self.top_n,
+            'ops': ops,
+        }
+
+    def snapshot(self, date: str) -> Optional[Dict[str, Any]]:
+        """Full current version for a date, or None if nothing was published yet"""
+        with self._lock:
+            state = self._state.get(date)
+        if state is None:
+            return None
+        seq, rows = state
+        return {
+            'v': 1,
+            'type': 'leaderboard_snapshot',
+            'date': date,
+            'epoch': self.epoch,
+            'seq': seq,
+            'top_n': self.top_n,
+            'rows': rows,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._state.clear()
+            self._sent.clear()
+
+    def drop(self, date: str) -> bool:
+        """Forget a finished date's versions; returns whether it was tracked"""
+        with self._lock:
+            self._sent.pop(date, None)
+            self._date_locks.pop(date, None)
+            return self._state.pop(date, None) is not None
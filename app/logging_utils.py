@@ -1,11 +1,16 @@
-import json
+import atexit
+import copy
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 import typing as _t
 from contextvars import ContextVar
 from typing import Any, Dict, Optional
 
+from .fastjson import dumps
+
 # Context var to carry a request id through the request lifecycle
 request_id_ctx: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
 
@@ -20,7 +25,7 @@ class JsonFormatter(logging.Formatter):
             "logger": record.name,
             "message": record.getMessage(),
         }
-        rid = request_id_ctx.get()
+        rid = _record_request_id(record)
         if rid:
             payload["request_id"] = rid
         # Pick up known extra fields added via logger.extra (as attributes on record)
@@ -29,6 +34,9 @@ class JsonFormatter(logging.Formatter):
             "method",
             "status",
             "duration_ms",
+            "sample_rate",
+            "db_queries",
+            "db_ms",
             "client",
             "user_agent",
             "event",
@@ -43,7 +51,7 @@ class JsonFormatter(logging.Formatter):
         # Attach exception info if present
         if record.exc_info:
             payload["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(payload, ensure_ascii=False)
+        return dumps(payload)
 
 
 class ColorFormatter(logging.Formatter):
@@ -93,8 +101,10 @@ class ColorFormatter(logging.Formatter):
             parts.append(self._color(f"{duration_ms}ms", "\033[90m"))
         return " ".join(parts) if parts else None
 
-    def _context_str(self, client: Optional[str], ua: Optional[str]) -> Optional[str]:
+    def _context_str(self, client: Optional[str], ua: Optional[str], db_queries: Optional[int] = None, db_ms: Optional[float] = None) -> Optional[str]:
         ctx: _t.List[str] = []
+        if db_queries:
+            ctx.append(f"db={db_queries}q/{db_ms}ms")
         if client:
             ctx.append(f"client={client}")
         if ua:
@@ -105,7 +115,7 @@ class ColorFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         level = record.levelname
         ts = self.formatTime(record, datefmt="%H:%M:%S")
-        rid = request_id_ctx.get()
+        rid = _record_request_id(record)
         logger_name = record.name
 
         method = getattr(record, "method", None)
@@ -131,7 +141,7 @@ class ColorFormatter(logging.Formatter):
         if msg:
             parts.extend(["-", msg])
 
-        ctx = self._context_str(client, ua)
+        ctx = self._context_str(client, ua, getattr(record, "db_queries", None), getattr(record, "db_ms", None))
         if ctx:
             parts.append(self._color(ctx, "\033[90m"))
 
@@ -141,6 +151,65 @@ class ColorFormatter(logging.Formatter):
         return " ".join(parts)
 
 
+def _record_request_id(record: logging.LogRecord) -> Optional[str]:
+    """Request id captured when the record was queued, else the current context's"""
+    rid = getattr(record, "request_id", None)
+    return rid if rid is not None else request_id_ctx.get()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the listener thread without formatting them or blocking.
+
+    The request id is captured here because formatting happens on another
+    thread, outside the request's context. When the queue is full the record
+    is dropped and counted rather than stalling the caller.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.request_id = request_id_ctx.get()
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_QueueHandler] = None
+
+
+def stop_logging_listener() -> None:
+    """Flush queued records and stop the background log writer"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        _listener = None
+
+
+atexit.register(stop_logging_listener)
+
+
+def logging_stats() -> Dict[str, Any]:
+    h = _queue_handler
+    return {
+        'async': h is not None and _listener is not None,
+        'queue_depth': h.queue.qsize() if h is not None else 0,
+        'dropped': h.dropped if h is not None else 0,
+    }
+
+
 def _isatty(stream) -> bool:
     try:
         return hasattr(stream, "isatty") and stream.isatty()
@@ -156,12 +225,19 @@ def setup_logging(level: int = logging.INFO) -> logging.Logger:
     - LOG_FORMAT=json forces JSON
     - otherwise: pretty if stdout is a TTY, else JSON
     - LOG_COLOR=0 disables ANSI colors in pretty mode
+
+    Unless LOG_ASYNC=0, records are queued (LOG_QUEUE_SIZE, default 10000)
+    and formatted/written by a background thread, so log I/O never blocks
+    the event loop; records beyond a full queue are dropped and counted.
     """
+    global _listener, _queue_handler
     root = logging.getLogger()
     root.setLevel(level)
     # Clear existing handlers to avoid duplicate logs
     for h in root.handlers[:]:
         root.removeHandler(h)
+    stop_logging_listener()
+    _queue_handler = None
 
     fmt_env = os.getenv("LOG_FORMAT", "").lower()
     color_env = os.getenv("LOG_COLOR", "1").lower()
@@ -173,6 +249,11 @@ def setup_logging(level: int = logging.INFO) -> logging.Logger:
         handler.setFormatter(ColorFormatter(use_color=use_color))
     else:
         handler.setFormatter(JsonFormatter())
+    if os.getenv("LOG_ASYNC", "1").lower() not in ("0", "false", "no"):
+        _queue_handler = _QueueHandler(queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, handler, respect_handler_level=True)
+        _listener.start()
+        handler = _queue_handler
     root.addHandler(handler)
 
     # Align uvicorn loggers to the same handler/level
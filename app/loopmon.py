@@ -0,0 +1,176 @@
+"""
+Event loop responsiveness monitoring for Daily Set application.
+
+A background task sleeps for a fixed interval and measures how late it wakes
+up. The overshoot is the time the loop spent running something else without
+yielding (e.g. blocking DB calls in async code), which is exactly the delay
+every WebSocket and async request on the worker experienced. A wake-up at
+least `slow_callback_seconds` late is counted as a slow callback: one
+callback or task step held the loop that long.
+
+On the same tick the monitor reads AnyIO's default thread limiter, which is
+the pool that runs every sync endpoint and dependency. It records how many
+threads are in use and how many tasks are queued waiting for one. A non-zero
+queue means requests are waiting on the pool rather than doing work. The
+limiter can only be read from the loop, so scrapes (which run in the pool)
+see the last tick's values.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from .logging_utils import get_logger
+from .metrics import REGISTRY, render_gauges
+
+logger = get_logger("app.loopmon")
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the loop monitor woke up (scheduling lag)", buckets=LAG_BUCKETS
+)
+SLOW_CALLBACKS = REGISTRY.counter(
+    "event_loop_slow_callbacks_total", "Monitor ticks delayed by at least the slow-callback threshold"
+)
+THREADPOOL_SATURATED = REGISTRY.counter(
+    "threadpool_saturated_ticks_total", "Monitor ticks that saw tasks waiting for a threadpool thread"
+)
+
+
+def default_thread_limiter():
+    """AnyIO's default thread limiter for the running loop (sync endpoints run under it)"""
+    import anyio.to_thread
+
+    return anyio.to_thread.current_default_thread_limiter()
+
+
+def configure_threadpool(size: int) -> int:
+    """Resize the default threadpool on the running loop; returns the size now in effect"""
+    limiter = default_thread_limiter()
+    if size > 0:
+        limiter.total_tokens = size
+    return int(limiter.total_tokens)
+
+
+class LoopLagMonitor:
+    """Measure asyncio event-loop lag by timing a periodic sleep, and sample threadpool usage"""
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        warn_seconds: float = 0.25,
+        slow_callback_seconds: float = 0.1,
+        saturation_warn_interval: float = 10.0,
+        recent_window_seconds: float = 10.0,
+    ):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self.slow_callback_seconds = slow_callback_seconds
+        self.saturation_warn_interval = saturation_warn_interval
+        self.last_lag = 0.0
+        # Lags over the last recent_window_seconds, for readiness (one stall should not fail it)
+        self._recent: deque = deque(maxlen=max(1, int(recent_window_seconds / interval)))
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+        self.threadpool: Dict[str, int] = {
+            'size': 0,
+            'in_use': 0,
+            'waiting': 0,
+            'max_in_use': 0,
+            'max_waiting': 0,
+            'saturated_ticks': 0,
+        }
+        self._limiter = None
+        self._last_saturation_warning = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.observe(time.perf_counter() - started - self.interval)
+            self.sample_threadpool()
+
+    def observe(self, lag: float) -> None:
+        lag = max(0.0, lag)
+        self.last_lag = lag
+        self._recent.append(lag)
+        if lag > self.max_lag:
+            self.max_lag = lag
+        LOOP_LAG_SECONDS.observe(lag)
+        if lag >= self.slow_callback_seconds:
+            self.slow_callbacks += 1
+            SLOW_CALLBACKS.inc()
+        if lag >= self.warn_seconds:
+            logger.warning("event_loop_lag", extra={"event": {"lag_ms": round(lag * 1000, 1)}})
+
+    def sample_threadpool(self) -> None:
+        """Read the default thread limiter (must run on the loop)"""
+        if self._limiter is None:
+            try:
+                self._limiter = default_thread_limiter()
+            except Exception:
+                return
+        stats = self._limiter.statistics()
+        tp = self.threadpool
+        tp['size'] = int(stats.total_tokens)
+        tp['in_use'] = stats.borrowed_tokens
+        tp['waiting'] = stats.tasks_waiting
+        tp['max_in_use'] = max(tp['max_in_use'], stats.borrowed_tokens)
+        tp['max_waiting'] = max(tp['max_waiting'], stats.tasks_waiting)
+        if stats.tasks_waiting:
+            tp['saturated_ticks'] += 1
+            THREADPOOL_SATURATED.inc()
+            now = time.monotonic()
+            if now - self._last_saturation_warning >= self.saturation_warn_interval:
+                self._last_saturation_warning = now
+                logger.warning(
+                    "threadpool_saturated",
+                    extra={"event": {"in_use": stats.borrowed_tokens, "size": tp['size'], "waiting": stats.tasks_waiting}},
+                )
+
+    def recent_lag(self, quantile: float = 0.9) -> float:
+        """Lag at `quantile` over the recent window (0.0 before the first tick)"""
+        samples = sorted(self._recent)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+    def start(self) -> None:
+        """Start sampling on the running loop (no-op if already running)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._limiter = None
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            try:
+                self._task.cancel()
+            except RuntimeError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'interval_seconds': self.interval,
+            'last_lag_seconds': round(self.last_lag, 6),
+            'recent_lag_p90_seconds': round(self.recent_lag(0.9), 6),
+            'max_lag_seconds': round(self.max_lag, 6),
+            'slow_callbacks': self.slow_callbacks,
+            'slow_callback_seconds': self.slow_callback_seconds,
+            'histogram': LOOP_LAG_SECONDS.snapshot(),
+            'threadpool': dict(self.threadpool),
+        }
+
+    def render_prometheus(self, prefix: str = "daily_set") -> str:
+        """Gauges for the last tick (lag histogram and counters live in the registry)"""
+        tp = self.threadpool
+        out = render_gauges(f"{prefix}_event_loop_lag_last_seconds", "Lag measured on the last tick", {(): round(self.last_lag, 6)})
+        out += render_gauges(f"{prefix}_threadpool_size", "Default threadpool size (AnyIO thread limiter tokens)", {(): tp['size']})
+        out += render_gauges(f"{prefix}_threadpool_in_use", "Threadpool threads busy on the last tick", {(): tp['in_use']})
+        out += render_gauges(f"{prefix}_threadpool_waiting", "Tasks waiting for a threadpool thread on the last tick", {(): tp['waiting']})
+        out += render_gauges(f"{prefix}_threadpool_in_use_max", "Most threadpool threads seen busy at once", {(): tp['max_in_use']})
+        return out
@@ -4,7 +4,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from pathlib import Path
-from fastapi.responses import RedirectResponse, JSONResponse, FileResponse
+from fastapi.responses import RedirectResponse, JSONResponse, FileResponse, StreamingResponse
 from sqlmodel import SQLModel, Session, create_engine, select
 from . import models, crud, game
 from pydantic import BaseModel, Field, validator
@@ -12,91 +12,152 @@ from typing import List, Optional
 from .deps import get_session
 
 import asyncio
+import contextvars
+import copy
+import hmac
 import time
 import re
 from sqlmodel import Session as SQLSession
 import json
 from datetime import datetime, timezone
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.background import BackgroundTask
 from starlette.middleware.gzip import GZipMiddleware
-from .logging_utils import setup_logging, get_logger, request_id_ctx
-from .realtime_publisher import publish_room_update_sync
+from .logging_utils import setup_logging, get_logger
+from .realtime_publisher import get_publisher, publish_room_update_sync
+from .ratelimit import RateLimitResult, create_rate_limiter_from_env
+from .connections import CLOSE_TRY_AGAIN, ConnectionManager, room_for_date
+from .coalesce import EventCoalescer
+from .leaderboard_feed import LeaderboardFeed
+from .loopmon import LoopLagMonitor, configure_threadpool
+from .middleware import RequestLoggingMiddleware, SecurityHeadersMiddleware
+from .fastjson import FastJSONResponse, dumps as json_dumps, json_response
+from .static_assets import StaticAssetCache, StaticAssetMiddleware, static_cache_enabled
+from .sse import SSEHub, sse_stream
+from .metrics import (
+    BROADCAST_FANOUT_SECONDS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    RATE_LIMIT_REJECTIONS,
+    REGISTRY as METRICS,
+    render_gauges,
+    route_template,
+)
+from .sqlmon import QUERY_MONITOR, instrument_engine
+from .profiling import ProfilingMiddleware, profiler_from_env
+from .readiness import checker_from_env
+from .tracing import Span, configure_tracer, current_span, span, tracer_from_env
+from .outbox import DURABLE_EVENT_TYPES, OutboxRelay, is_active as outbox_active, set_relay, stage_events
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os as _os
 import uuid
 from urllib.parse import urlparse
 
 
-# Rate limiting - store last request times per IP
-_RATE_LIMIT_STORE: dict = {}
+# Rate limiting - sliding-window counters per (client IP, limit); see app/ratelimit.py
+_RATE_LIMIT_STORE = create_rate_limiter_from_env()
+
+
+def _rate_limit_key(request: Request, max_requests: int, window_seconds: int) -> str:
+    client_ip = request.client.host if request.client else "unknown"
+    return f"{client_ip}|{max_requests}/{window_seconds}"
+
+
+def rate_limit_status(request: Request, max_requests: int = 30, window_seconds: int = 60) -> RateLimitResult:
+    """Count this request against the client's quota and return the outcome"""
+    return _RATE_LIMIT_STORE.hit(_rate_limit_key(request, max_requests, window_seconds), max_requests, window_seconds)
+
 
 def check_rate_limit(request: Request, max_requests: int = 30, window_seconds: int = 60) -> bool:
     """
-    Simple in-memory rate limiting. Returns True if request is allowed, False if rate limited.
+    Rate limiting check. Returns True if request is allowed, False if rate limited.
     Default: 30 requests per 60 seconds per IP address.
     """
-    client_ip = request.client.host if request.client else "unknown"
-    current_time = time.time()
-    
-    # Clean up old entries (older than window)
-    cutoff_time = current_time - window_seconds
-    _RATE_LIMIT_STORE[client_ip] = [
-        req_time for req_time in _RATE_LIMIT_STORE.get(client_ip, []) 
-        if req_time > cutoff_time
-    ]
-    
-    # Check if under the limit
-    if len(_RATE_LIMIT_STORE[client_ip]) >= max_requests:
-        return False
-    
-    # Add current request
-    _RATE_LIMIT_STORE[client_ip].append(current_time)
-    return True
+    return rate_limit_status(request, max_requests, window_seconds).allowed
 
 def rate_limit_dependency(max_requests: int = 30, window_seconds: int = 60):
-    """Create a dependency function that raises HTTP 429 if rate limited"""
-    def dependency(request: Request):
-        if not check_rate_limit(request, max_requests, window_seconds):
+    """Create a dependency that raises HTTP 429 if rate limited and reports quota in RateLimit-* headers"""
+    def dependency(request: Request, response: Response):
+        result = rate_limit_status(request, max_requests, window_seconds)
+        headers = result.headers()
+        if not result.allowed:
+            RATE_LIMIT_REJECTIONS.inc((route_template(request.scope),))
             raise HTTPException(
                 status_code=429,
-                detail=f"Rate limit exceeded. Maximum {max_requests} requests per {window_seconds} seconds."
+                detail=f"Rate limit exceeded. Maximum {max_requests} requests per {window_seconds} seconds.",
+                headers={**headers, 'Retry-After': str(result.reset_seconds)},
             )
+        response.headers.update(headers)
     return dependency
 
-# track websocket connections -> metadata {ws: {'player_id': int|None, 'last_sent': float}}
-_WS_CONNECTIONS: dict = {}
-
 
 # Helper functions for broadcast_event
 def _enrich_event(e: dict) -> None:
-    """Enrich completion event with username and leaderboard data."""
+    """Enrich completion event with usernames.
+
+    Coalesced events carry a `completions` list; all their usernames are
+    resolved in one query. Leaderboard rows travel as deltas instead (see
+    _update_live_leaderboard).
+    """
     if not (e.get('type') == 'completion' and 'player_id' in e and 'date' in e):
         return
-    leaders = []
     uname = None
+    merged = e.get('completions') or []
     try:
         with SQLSession(crud.engine) as s:
-            user = s.get(models.Player, e['player_id'])
-            if user:
-                uname = user.username
-            leaders = crud.get_leaderboard(s, e['date'], limit=5)
+            ids = ({e['player_id']} | {c.get('player_id') for c in merged}) - {None}
+            rows = s.exec(
+                select(models.Player.id, models.Player.username).where(models.Player.id.in_(ids))  # type: ignore[attr-defined]
+            ).all()
+            names = {pid: name for pid, name in rows}
+            uname = names.get(e['player_id'])
+            for c in merged:
+                c['username'] = names.get(c.get('player_id'))
     except Exception:
-        leaders = []
+        pass
     e['username'] = uname
-    e['leaders'] = leaders
+
+
+def _update_live_leaderboard(e: dict) -> Optional[dict]:
+    """Publish a new leaderboard version for the event's date; return the delta if it changed.
+
+    Enrichment runs on several workers, so the read and the publish happen under
+    the date's lock: versions then only ever move forward with the database.
+    """
+    if e.get('type') not in _LEADERBOARD_EVENTS or not e.get('date'):
+        return None
+    with _LEADERBOARD_FEED.lock_for(e['date']):
+        with SQLSession(crud.engine) as s:
+            rows = crud.get_leaderboard(s, e['date'], limit=_LEADERBOARD_FEED.top_n)
+        return _LEADERBOARD_FEED.publish(e['date'], rows)
+
+
+def _leaderboard_snapshot(date: str) -> dict:
+    """Current live version for a date, seeding it from the DB if none was published yet"""
+    snap = _LEADERBOARD_FEED.snapshot(date)
+    if snap is None:
+        with _LEADERBOARD_FEED.lock_for(date):
+            if _LEADERBOARD_FEED.snapshot(date) is None:
+                with SQLSession(crud.engine) as s:
+                    rows = crud.get_leaderboard(s, date, limit=_LEADERBOARD_FEED.top_n)
+                _LEADERBOARD_FEED.publish(date, rows)
+        snap = _LEADERBOARD_FEED.snapshot(date)
+    assert snap is not None
+    return snap
 
 def _prepare_message(e: dict):
-    """Serialize event to JSON."""
+    """Serialize event to JSON (once per broadcast, shared by every recipient)."""
     try:
-        return json.dumps(e)
+        return json_dumps(e)
     except Exception:
         return None
 
 async def _send_to_websocket(ws: WebSocket, meta: dict, msg, ev, now_ts: float) -> bool:
-    """Send message to websocket with rate limiting. Return False if failed."""
+    """Send message to websocket. Return False if failed.
+
+    Pacing is done by the connection's writer, which coalesces queued messages
+    to the newest per event type instead of skipping sends.
+    """
     try:
-        last = meta.get('last_sent', 0)
-        if now_ts - last < 0.45:
-            return True
         if msg is not None:
             await ws.send_text(msg)
         else:
@@ -107,148 +168,232 @@ async def _send_to_websocket(ws: WebSocket, meta: dict, msg, ev, now_ts: float)
         logger.debug("ws_send_error", extra={"error": str(send_exc)})
         return False
 
-async def broadcast_event(event: dict):
-    """Enrich event with username/leaderboard, then broadcast to all connections."""
-    logger.debug("broadcast_event_called", extra={"event": event})
+# track websocket connections -> metadata {ws: {'player_id': int|None, 'last_sent': float}};
+# each connection has its own bounded send queue and writer task
+_WS_CONNECTIONS = ConnectionManager(
+    queue_size=int(_os.getenv('WS_QUEUE_SIZE', '64')),
+    overflow_policy=_os.getenv('WS_OVERFLOW_POLICY', 'disconnect'),
+    send=_send_to_websocket,
+    min_interval=int(_os.getenv('WS_MIN_INTERVAL_MS', '450')) / 1000.0,
+    max_connections=int(_os.getenv('WS_MAX_CONNECTIONS', '10000')),
+    max_per_ip=int(_os.getenv('WS_MAX_CONNECTIONS_PER_IP', '50')),
+    ping_interval=float(_os.getenv('WS_PING_INTERVAL_SECONDS', '20')),
+    idle_timeout=float(_os.getenv('WS_IDLE_TIMEOUT_SECONDS', '60')),
+)
+
+
+async def broadcast_event(event: dict, trace_parent: Optional[Span] = None):
+    """Broadcast an event; bursts per (room, type) are coalesced (see app/coalesce.py).
+
+    Leading-edge deliveries run inside this span; trailing-edge (merged)
+    deliveries happen later on their own and are not attributed to a trace.
+    """
+    with span("broadcast_event", parent=trace_parent, type=event.get('type') if isinstance(event, dict) else None):
+        await _BROADCAST_COALESCER.submit(event)
+
+
+# The server's event loop, captured at startup so sync (threadpool) handlers can broadcast
+_MAIN_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _schedule_broadcast(event: dict) -> None:
+    """Fire-and-forget broadcast_event from either an async or a sync (threadpool) handler"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        loop.create_task(broadcast_event(event))
+        return
+    main_loop = _MAIN_LOOP
+    if main_loop is None or main_loop.is_closed() or not main_loop.is_running():
+        return
+    # The task runs in the loop's context, so hand over the request's span explicitly
+    parent = current_span()
+    coro = broadcast_event(event) if parent is None else broadcast_event(event, trace_parent=parent)
+    asyncio.run_coroutine_threadsafe(coro, main_loop)
+
 
-    # Enrich the event if applicable
+def _enrich_and_diff(event: dict) -> Optional[dict]:
+    """Blocking DB work for one delivery: username enrichment and the leaderboard delta"""
     try:
         _enrich_event(event)
     except Exception as ex:
         logger.debug("broadcast_event_enrich_failed", extra={"error": str(ex)})
+    try:
+        return _update_live_leaderboard(event)
+    except Exception as ex:
+        logger.debug("broadcast_event_leaderboard_failed", extra={"error": str(ex)})
+        return None
+
+
+async def _run_blocking(func, *args):
+    """Run DB-bound broadcast work on the enrichment executor, bounded by a timeout"""
+    loop = asyncio.get_running_loop()
+    # Carry the context over so the worker's queries join the current trace
+    ctx = contextvars.copy_context()
+    return await asyncio.wait_for(loop.run_in_executor(_ENRICH_EXECUTOR, ctx.run, func, *args), _ENRICH_TIMEOUT)
+
+
+async def _deliver_event(event: dict):
+    """Enrich event with usernames, then broadcast it and any leaderboard delta."""
+    logger.debug("broadcast_event_called", extra={"event": event})
+
+    delta = None
+    if isinstance(event, dict):
+        # DB lookups run off the event loop on a copy; on timeout the event goes
+        # out unenriched while the worker finishes with its own copy
+        work = copy.deepcopy(event)
+        try:
+            with span("broadcast.enrich"):
+                delta = await _run_blocking(_enrich_and_diff, work)
+            event = work
+        except asyncio.TimeoutError:
+            _BROADCAST_STATS['enrich_timeouts'] += 1
+            logger.warning("broadcast_event_enrich_timeout", extra={"event": {"type": event.get('type'), "date": event.get('date')}})
+        except Exception as ex:
+            logger.debug("broadcast_event_enrich_failed", extra={"error": str(ex)})
 
     logger.debug("broadcast_event_enriched", extra={"event": event, "ws_count": len(_WS_CONNECTIONS)})
 
-    json_message = _prepare_message(event)
+    # Events carrying a UTC date are scoped to that day's room
+    room = room_for_date(event.get('date')) if isinstance(event, dict) else None
+    kind = event.get('type') if isinstance(event, dict) else None
+    _fan_out(event, room, kind)
+    # Deltas build on each other, so they are never coalesced per connection.
+    # Two deliveries for a date can finish enrichment out of order; a delta
+    # older than one already sent is dropped and lagging clients resync.
+    if delta is not None and _LEADERBOARD_FEED.mark_sent(delta):
+        _fan_out(delta, room, None)
+    elif delta is not None:
+        _BROADCAST_STATS['stale_deltas'] += 1
+
+
+def _fan_out(event: dict, room: Optional[str], kind: Optional[str]) -> None:
+    """Publish to NATS (if configured) and enqueue for the room's WebSocket clients"""
+    with BROADCAST_FANOUT_SECONDS.time((kind or 'delta',)), span("broadcast.fan_out", room=room, type=kind or 'delta'):
+        json_message = _prepare_message(event)
+
+        # Also publish to external realtime (NATS) if configured; durable event
+        # types already reach NATS through the outbox relay
+        if not (outbox_active() and isinstance(event, dict) and event.get('type') in DURABLE_EVENT_TYPES):
+            try:
+                publish_room_update_sync(room or "broadcast", {"event": event})
+            except Exception as ex:
+                logger.debug("broadcast_event_publish_failed", extra={"error": str(ex)})
+        if json_message is None:
+            logger.debug("broadcast_event_unserializable", extra={"event": repr(event)})
+            return
+
+        # Enqueue once per interested connection; writer tasks do the network I/O
+        _WS_CONNECTIONS.broadcast(json_message, room=room, kind=kind)
+        _SSE_HUB.publish(json_message, room=room)
+
+
+# Enrichment queries run on a small dedicated pool so they never block the loop
+# (nor compete with request handlers for the default threadpool)
+_ENRICH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(_os.getenv('BROADCAST_ENRICH_WORKERS', '2')), thread_name_prefix='enrich'
+)
+_ENRICH_TIMEOUT = float(_os.getenv('BROADCAST_ENRICH_TIMEOUT_SECONDS', '2'))
+_BROADCAST_STATS = {'enrich_timeouts': 0, 'stale_deltas': 0}
+_LOOP_LAG = LoopLagMonitor(
+    interval=float(_os.getenv('LOOP_LAG_INTERVAL_SECONDS', '0.5')),
+    warn_seconds=int(_os.getenv('LOOP_LAG_WARN_MS', '250')) / 1000.0,
+    slow_callback_seconds=int(_os.getenv('LOOP_SLOW_CALLBACK_MS', '100')) / 1000.0,
+)
 
-    # Also publish to external realtime (NATS) if configured.
-    try:
-        # Use UTC date on completion events when available; otherwise a general channel
-        room = None
-        if isinstance(event, dict):
-            date = event.get('date')
-            if date:
-                # Avoid dots in room token (NATS subject is tokenized by '.')
-                room = f"daily-{str(date).replace('-', '')}"
-        publish_room_update_sync(room or "broadcast", {"event": event})
-    except Exception as ex:
-        logger.debug("broadcast_event_publish_failed", extra={"error": str(ex)})
-    now = time.time()
-    dead = []
+# /ready probe thresholds (READY_*), and startup steps that failed (step -> error).
+# Its blocking probes get their own thread so a saturated default threadpool
+# cannot stall the check that is meant to report it
+_READINESS = checker_from_env()
+_READY_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ready')
+_READY_TIMEOUT = float(_os.getenv('READY_PROBE_TIMEOUT_SECONDS', '3'))
+_STARTUP_STATE: dict = {}
+
+# Server-Sent Events subscribers and the replay buffer for Last-Event-ID resume
+_SSE_HUB = SSEHub(
+    history=int(_os.getenv('SSE_HISTORY_SIZE', '512')),
+    queue_size=int(_os.getenv('SSE_QUEUE_SIZE', '256')),
+    # Streams are capped like WebSockets so they cannot be used to get around those limits
+    max_subscribers=_WS_CONNECTIONS.max_connections,
+    max_per_ip=_WS_CONNECTIONS.max_per_ip,
+)
+_SSE_HEARTBEAT_SECONDS = float(_os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
 
-    # Process each connection
-    for ws, meta in _WS_CONNECTIONS.items():
-        success = await _send_to_websocket(ws, meta, json_message, event, now)
-        if not success:
-            dead.append(ws)
+# Live top-N leaderboard versions, sent to clients as deltas
+_LEADERBOARD_EVENTS = ('completion', 'leaderboard_change')
+_LEADERBOARD_FEED = LeaderboardFeed(top_n=int(_os.getenv('LEADERBOARD_LIVE_TOP_N', '10')))
+
+
+# Coalesce event storms: one delivery per (room, type) per window, and at most
+# one daily_update per date per BROADCAST_DAILY_UPDATE_SECONDS
+_BROADCAST_COALESCER = EventCoalescer(
+    _deliver_event,
+    window_seconds=int(_os.getenv('BROADCAST_COALESCE_MS', '250')) / 1000.0,
+    type_windows={'daily_update': float(_os.getenv('BROADCAST_DAILY_UPDATE_SECONDS', '30'))},
+)
 
-    # Clean up disconnected sockets
-    for d in dead:
-        _WS_CONNECTIONS.pop(d, None)
+
+def _drop_day_state(finished_date: str) -> None:
+    _LEADERBOARD_FEED.drop(finished_date)
+    _BROADCAST_COALESCER.drop_date(finished_date)
+    _SSE_HUB.drop_room(room_for_date(finished_date))
+
+
+def _on_rollover(finished_date: str, new_date: str) -> None:
+    """Rollover hook: forget the finished day's live leaderboard, coalescing windows and SSE history"""
+    main_loop = _MAIN_LOOP
+    if main_loop is not None and main_loop.is_running():
+        # The coalescer and SSE hub are owned by the loop; the scheduler runs in its own thread
+        main_loop.call_soon_threadsafe(_drop_day_state, finished_date)
+    else:
+        _drop_day_state(finished_date)
 
 setup_logging(logging.INFO)
 logger = get_logger("app")
-app = FastAPI(title="Daily Set")
+# Request tracing to a Zipkin-format file (off unless TRACE_FILE is set)
+configure_tracer(tracer_from_env())
+app = FastAPI(title="Daily Set", default_response_class=FastJSONResponse)
 
-# Enable gzip compression for text payloads (HTML, JS, CSS, JSON, etc.)
-app.add_middleware(GZipMiddleware, minimum_size=512)
+class _StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZip that passes the SSE stream through untouched.
 
-# Security headers & Content Security Policy
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    def _csp_connect_sources(self) -> list[str]:
-        srcs: list[str] = ["'self'"]
-        try:
-            import os as _os
-            from urllib.parse import urlparse as _urlparse
-            rt = _os.getenv('REALTIME_WS_URL')
-            if rt:
-                p = _urlparse(rt)
-                if p.scheme in ('ws', 'wss') and p.hostname:
-                    host = p.hostname
-                    if p.port:
-                        host = f"{host}:{p.port}"
-                    src = f"{p.scheme}://{host}"
-                    if src not in srcs:
-                        srcs.append(src)
-        except Exception:
-            pass
-        return srcs
-    
-    def _set_security_headers(self, response):
-        # Build a strict Content Security Policy
-        csp_directives = [
-            "default-src 'self'",
-            "script-src 'self'",
-            "style-src 'self' 'unsafe-inline'",
-            "img-src 'self' data:",
-            "font-src 'self'",
-            f"connect-src {' '.join(self._csp_connect_sources())}",
-            "object-src 'none'",
-            "base-uri 'self'",
-            "frame-ancestors 'none'",
-            "form-action 'self'",
-            "upgrade-insecure-requests",
-        ]
-        csp = "; ".join(csp_directives)
-        response.headers['Content-Security-Policy'] = csp
-        # Additional best-practice headers
-        response.headers.setdefault('Referrer-Policy', 'strict-origin-when-cross-origin')
-        response.headers.setdefault('X-Content-Type-Options', 'nosniff')
-        response.headers.setdefault('X-Frame-Options', 'DENY')
-        response.headers.setdefault('Permissions-Policy', 'geolocation=(), microphone=(), camera=()')
-        response.headers.setdefault('Cross-Origin-Opener-Policy', 'same-origin')
-        # HSTS is only relevant when behind HTTPS; enabling is generally safe in prod
-        response.headers.setdefault('Strict-Transport-Security', 'max-age=31536000; includeSubDomains')
-
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        self._set_security_headers(response)
-        return response
+    Starlette's gzip responder never flushes the compressor between streamed
+    chunks, so events would sit in its buffer instead of reaching the client.
+    """
 
-app.add_middleware(SecurityHeadersMiddleware)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope.get("path") == "/api/events":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        rid = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        token = request_id_ctx.set(rid)
-        start = time.time()
-        client = request.client.host if request.client else "-"
-        ua = request.headers.get("user-agent", "-")
-        response = None
-        try:
-            response = await call_next(request)
-            return response
-        except Exception:
-            # Log exception with context
-            logger.exception(
-                "request_error",
-                extra={"path": str(request.url), "method": request.method},
-            )
-            raise
-        finally:
-            duration_ms = int((time.time() - start) * 1000)
-            status = getattr(response, "status_code", 500)
-            logger.info(
-                "request",
-                extra={
-                    "method": request.method,
-                    "path": request.url.path,
-                    "status": status,
-                    "duration_ms": duration_ms,
-                    "client": client,
-                    "user_agent": ua,
-                },
-            )
-            try:
-                if response is not None:
-                    response.headers["X-Request-ID"] = rid
-            except Exception:
-                pass
-            request_id_ctx.reset(token)
+# Sampled / header-forced request profiling (off unless PROFILE_SAMPLE_RATE or
+# PROFILE_SECRET is set); innermost, so samples are taken around the endpoint only
+_PROFILER = profiler_from_env()
+if _PROFILER.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=_PROFILER)
+
+# Enable gzip compression for text payloads (HTML, JS, CSS, JSON, etc.)
+app.add_middleware(_StreamAwareGZipMiddleware, minimum_size=512)
+
+# Static assets and icons served from memory with precompressed variants and
+# ETags (loaded at startup); sits outside gzip so nothing is recompressed
+_STATIC_ASSETS = StaticAssetCache(Path(__file__).resolve().parent / "static")
+app.add_middleware(StaticAssetMiddleware, cache=_STATIC_ASSETS, enabled=static_cache_enabled())
 
+# Security headers & Content Security Policy (CSP built once from REALTIME_WS_URL)
+app.add_middleware(SecurityHeadersMiddleware)
 
-app.add_middleware(RequestLoggingMiddleware)
+# Request id binding, X-Request-ID echo and per-request log line (fast successful
+# requests sampled at LOG_REQUEST_SAMPLE_RATE; errors and slow requests always logged)
+app.add_middleware(
+    RequestLoggingMiddleware,
+    sample_rate=float(_os.getenv('LOG_REQUEST_SAMPLE_RATE', '1')),
+    slow_ms=int(_os.getenv('LOG_SLOW_REQUEST_MS', '500')),
+)
 
 # Configure CORS
 def _origin_from_url(u: str):
@@ -282,7 +427,6 @@ allowed_origins = [
 ]
 
 # Optionally include realtime and NATS origins from env if they are browser-relevant
-import os as _os
 for _env in ("REALTIME_WS_URL", "NATS_URL"):
     _val = _os.getenv(_env)
     if _val:
@@ -425,9 +569,29 @@ def health():
     return JSONResponse({"status": "ok"})
 
 
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness: 503 once dependency probes keep failing, so the load balancer routes elsewhere.
+
+    `/health` stays a liveness check; this one times the database (reads and
+    the SQLite writer lock) and inspects today's cached board, the realtime
+    publisher and the event loop. Degraded instances still answer 200.
+    """
+    report = await _READINESS.check_async(
+        crud.engine,
+        game.today_str(),
+        get_publisher().stats,
+        _LOOP_LAG.snapshot,
+        _STARTUP_STATE,
+        executor=_READY_EXECUTOR,
+        timeout=_READY_TIMEOUT,
+    )
+    return JSONResponse(report, status_code=503 if report['status'] == "not_ready" else 200)
+
+
 @app.get("/api/cache/stats", include_in_schema=False)
 def cache_stats():
-    """Get cache statistics for monitoring"""
+    """Get cache statistics for monitoring (global totals plus per-namespace breakdown)"""
     from .cache import get_cache
     
     cache = get_cache()
@@ -439,11 +603,161 @@ def cache_stats():
     })
 
 
+@app.get("/api/cache/metrics", include_in_schema=False)
+def cache_metrics():
+    """Per-namespace cache metrics in Prometheus text exposition format"""
+    from .cache import get_cache
+
+    return Response(
+        get_cache().metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def _collect_cache_metrics() -> str:
+    """Cache counters; the cache histograms are registry metrics and render on their own"""
+    from .cache import get_cache
+
+    return get_cache().metrics.render_counters()
+
+
+def _collect_realtime_metrics() -> str:
+    """WebSocket, SSE and NATS publisher state, read from their stats() at scrape time"""
+    ws = _WS_CONNECTIONS.stats()
+    nats = get_publisher().stats()
+    out = render_gauges("daily_set_ws_connections", "Open WebSocket connections", {(): ws['connections']})
+    out += render_gauges("daily_set_ws_queue_depth", "Messages queued across WebSocket writers", {(): ws['queue_depth_total']})
+    out += render_gauges(
+        "daily_set_ws_messages_total",
+        "WebSocket messages by outcome",
+        {(name,): ws[name] for name in ('enqueued', 'sent', 'dropped', 'coalesced', 'pings')},
+        ("outcome",),
+        kind="counter",
+    )
+    out += render_gauges(
+        "daily_set_ws_disconnects_total",
+        "Server-initiated WebSocket disconnects and refused connections by reason",
+        {
+            **{(reason,): n for reason, n in ws['reaped'].items()},
+            ('rejected_global',): ws['rejected_global'],
+            ('rejected_per_ip',): ws['rejected_per_ip'],
+        },
+        ("reason",),
+        kind="counter",
+    )
+    out += render_gauges("daily_set_sse_subscribers", "Open Server-Sent Events streams", {(): _SSE_HUB.subscriber_count()})
+    out += render_gauges(
+        "daily_set_nats_publish_total",
+        "NATS publisher messages and batches by outcome",
+        {(name,): nats[name] for name in ('enqueued', 'published', 'dropped', 'batches', 'failures', 'reconnects')},
+        ("outcome",),
+        kind="counter",
+    )
+    out += render_gauges("daily_set_nats_queue_depth", "Messages buffered for NATS", {(): nats['queue_depth']})
+    out += render_gauges("daily_set_nats_connected", "1 while the publisher holds a NATS connection", {(): nats['connected']})
+    return out
+
+
+METRICS.add_collector("cache", _collect_cache_metrics)
+METRICS.add_collector("realtime", _collect_realtime_metrics)
+METRICS.add_collector("loop", _LOOP_LAG.render_prometheus)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Process metrics in Prometheus text exposition format (see app/metrics.py).
+
+    Async so the realtime collector reads loop-owned connection tables on the
+    loop. It also means scrapes still work when the threadpool is saturated.
+    Rendering only reads in-memory state.
+    """
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/db/stats", include_in_schema=False)
+def db_stats():
+    """SQL instrumentation: budget/N+1 flags and the slowest statement fingerprints"""
+    return JSONResponse({
+        "queries": QUERY_MONITOR.stats(),
+        "slow_queries": QUERY_MONITOR.slow_queries(),
+        "status": "ok"
+    })
+
+
+def _require_profile_admin(request: Request) -> None:
+    """Profile endpoints exist only when PROFILE_SECRET is set and the caller sends it"""
+    token = request.headers.get('x-admin-token', '')
+    if _PROFILER.secret is None or not hmac.compare_digest(token.encode(), _PROFILER.secret.encode()):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@app.get("/api/admin/profiles", include_in_schema=False)
+def list_profiles(request: Request):
+    """Collapsed-stack profiles (per route, and per header-forced request), newest first"""
+    _require_profile_admin(request)
+    return JSONResponse({"profiles": _PROFILER.list_profiles(), "profiler": _PROFILER.stats(), "status": "ok"})
+
+
+@app.get("/api/admin/profiles/{name}", include_in_schema=False)
+def download_profile(name: str, request: Request):
+    _require_profile_admin(request)
+    path = _PROFILER.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return FileResponse(str(path), media_type="text/plain; charset=utf-8", filename=name)
+
+
+@app.get("/api/ws/stats", include_in_schema=False)
+async def ws_stats():
+    """WebSocket fan-out statistics: connections, queue depths and drops.
+
+    Async on purpose: the connection, room and subscriber tables belong to the
+    event loop, and reading them from a threadpool thread races with it.
+    """
+    return JSONResponse({
+        "ws_stats": _WS_CONNECTIONS.stats(),
+        "coalescer": _BROADCAST_COALESCER.stats(),
+        "broadcast": dict(_BROADCAST_STATS),
+        "nats": get_publisher().stats(),
+        "loop_lag": _LOOP_LAG.snapshot(),
+        "sse": _SSE_HUB.stats(),
+        "status": "ok"
+    })
+
+
+@app.get("/api/events", include_in_schema=False)
+async def sse_events(request: Request, date: str = "", last_event_id: str = ""):
+    """Server-Sent Events stream of broadcasts, scoped to one day's room when date is given.
+
+    Reconnecting clients resume from the Last-Event-ID header (or the
+    last_event_id query parameter, for clients that cannot set headers).
+    """
+    if date and not re.match(r'^\d{4}-\d{2}-\d{2}$', date):
+        raise HTTPException(status_code=400, detail="invalid date")
+    resume = request.headers.get('last-event-id') or last_event_id or None
+    client_ip = request.client.host if request.client else None
+    refused = _SSE_HUB.admit(client_ip)
+    if refused is not None:
+        logger.info("sse_connection_refused", extra={"event": {"reason": refused, "client": client_ip}})
+        return JSONResponse({"detail": "too many connections"}, status_code=503, headers={'Retry-After': '5'})
+    room = room_for_date(date)
+    sub = _SSE_HUB.subscribe(room, ip=client_ip)
+    return StreamingResponse(
+        sse_stream(_SSE_HUB, room, resume, heartbeat_seconds=_SSE_HEARTBEAT_SECONDS, sub=sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Runs even if the client left before the stream started (the generator's
+        # own cleanup never runs then)
+        background=BackgroundTask(_SSE_HUB.unsubscribe, sub),
+    )
+
+
 @app.on_event("startup")
 def on_startup():
     import os
     from .migrations import run_migrations
-    from .cache import warm_cache_for_today_and_recent
+    from .cache import warm_cache_for_today_and_recent, configure_cache, create_cache_from_env
+    from .rollover import register_rollover_hook, start_rollover_scheduler
     
     db_path = os.getenv("DATABASE_URL", "sqlite:///./set.db")
     # Enable connection pooling for non-SQLite databases; keep SQLite thread setting
@@ -462,51 +776,129 @@ def on_startup():
         )
     else:
         engine = create_engine(db_path, echo=False, connect_args=connect_args)
+    instrument_engine(engine)
     
     # Create tables first
     SQLModel.metadata.create_all(engine)
     
     # Run database migrations
+    _STARTUP_STATE.clear()
     try:
         run_migrations()
+        _STARTUP_STATE['migrations'] = None
     except Exception as e:
+        _STARTUP_STATE['migrations'] = str(e)
         logger.warning("migrations_failed", extra={"error": str(e)})
     
     crud.engine = engine
+
+    # Select the cache backend (process-local memory or shared across workers)
+    try:
+        configure_cache(create_cache_from_env())
+    except Exception as e:
+        logger.warning("cache_backend_failed", extra={"error": str(e)})
     
+    # Load static assets and icons into memory
+    if static_cache_enabled():
+        try:
+            _STATIC_ASSETS.load()
+        except Exception as e:
+            logger.warning("static_assets_load_failed", extra={"error": str(e)})
+
     # Warm up the cache
     try:
         warm_cache_for_today_and_recent()
+        _STARTUP_STATE['cache_warm'] = None
         logger.info("cache_warm_success")
     except Exception as e:
+        _STARTUP_STATE['cache_warm'] = str(e)
         logger.warning("cache_warm_failed", extra={"error": str(e)})
 
+    # Keep the next UTC day warm and finalize finished days in the background
+    register_rollover_hook(_on_rollover)
+    try:
+        start_rollover_scheduler()
+    except Exception as e:
+        logger.warning("rollover_scheduler_failed", extra={"error": str(e)})
+
+    # Long-lived NATS publisher thread (no-op unless NATS_URL is set), relaying
+    # the durable outbox as well unless REALTIME_OUTBOX=0
+    publisher = get_publisher()
+    if publisher.enabled and os.getenv('REALTIME_OUTBOX', '1') not in ('0', 'false', 'False'):
+        relay = OutboxRelay(
+            lambda: crud.engine,
+            batch_size=int(os.getenv('REALTIME_OUTBOX_BATCH_SIZE', '100')),
+            max_attempts=int(os.getenv('REALTIME_OUTBOX_MAX_ATTEMPTS', '10')),
+        )
+        set_relay(relay)
+        publisher.attach_outbox(relay)
+    publisher.start()
+
+    # Sync handlers run in the threadpool and schedule broadcasts onto this loop
+    global _MAIN_LOOP
+    try:
+        _MAIN_LOOP = asyncio.get_running_loop()
+    except RuntimeError:
+        _MAIN_LOOP = None
+
+    # Size the threadpool that runs sync endpoints and dependencies (AnyIO
+    # default: 40); must run on the loop, which startup handlers do
+    try:
+        size = configure_threadpool(int(os.getenv('THREADPOOL_SIZE', '0')))
+        logger.info("threadpool_configured", extra={"event": {"size": size}})
+    except Exception as e:
+        logger.warning("threadpool_configure_failed", extra={"error": str(e)})
+
+    # Sample event-loop lag and threadpool usage (/api/ws/stats, /metrics)
+    try:
+        _LOOP_LAG.start()
+    except RuntimeError as e:
+        logger.warning("loop_lag_monitor_failed", extra={"error": str(e)})
+
+    # Ping quiet WebSockets and reap half-open ones
+    try:
+        _WS_CONNECTIONS.start_heartbeat()
+    except RuntimeError as e:
+        logger.warning("ws_heartbeat_failed", extra={"error": str(e)})
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    from .rollover import stop_rollover_scheduler
+
+    global _MAIN_LOOP
+    stop_rollover_scheduler()
+    _LOOP_LAG.stop()
+    _MAIN_LOOP = None
+    # Give buffered realtime updates a chance to reach the broker
+    get_publisher().stop(timeout=float(_os.getenv('NATS_PUBLISH_SHUTDOWN_SECONDS', '5')))
+
+
+@app.on_event("shutdown")
+async def close_websockets():
+    """Tell WebSocket clients the server is restarting (1012) so they reconnect elsewhere"""
+    _WS_CONNECTIONS.stop_heartbeat()
+    closed = await _WS_CONNECTIONS.close_all()
+    if closed:
+        logger.info("ws_closed_for_shutdown", extra={"event": {"connections": closed}})
+
 
 @app.get("/api/daily")
 def get_daily(date: str = "", session: Session = Depends(get_session)):
-    from .cache import get_cached_daily_board, cache_daily_board
+    from .cache import load_daily_board
     
     # Use provided date or default to today
     actual_date = date or game.today_str()
     
-    # Try to get from cache first
-    board = get_cached_daily_board(actual_date)
-    
-    if board is None:
-        # Generate and cache the board
-        board = game.daily_board(actual_date)
-        cache_daily_board(actual_date, board)
+    # Serve from cache, generating and caching the board on a miss
+    board = load_daily_board(actual_date, lambda: game.daily_board(actual_date))
     
-    # Broadcast daily_update event (fire-and-forget)
-    try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(broadcast_event({
-            'type': 'daily_update',
-            'date': date or game.today_str(),
-        }))
-    except RuntimeError:
-        pass
-    return {"board": board}
+    # Broadcast daily_update event (fire-and-forget; repeats per date are coalesced away)
+    _schedule_broadcast({
+        'type': 'daily_update',
+        'date': date or game.today_str(),
+    })
+    return json_response({"board": board})
 
 
 class CompleteRequest(BaseModel):
@@ -574,12 +966,13 @@ def create_player_json(body: PlayerCreate, session: Session = Depends(get_sessio
 
 @app.get("/api/leaderboard")
 def leaderboard(
+    response: Response,
     date: str = "", 
     limit: int = 10, 
     session: Session = Depends(get_session),
     _: None = Depends(rate_limit_dependency(max_requests=20, window_seconds=60))
 ):
-    from .cache import get_cached_leaderboard, cache_leaderboard
+    from .cache import load_leaderboard, get_cached_final_leaderboard, cache_final_leaderboard
     
     # Validate date parameter
     if date and not re.match(r'^\d{4}-\d{2}-\d{2}$', date):
@@ -590,16 +983,22 @@ def leaderboard(
         raise HTTPException(status_code=400, detail="Limit must be between 1 and 100")
     
     actual_date = date or game.today_str()
+
+    # Finished days are served from their immutable end-of-day snapshot when available
+    if actual_date < game.today_str():
+        final = get_cached_final_leaderboard(actual_date)
+        if final is None:
+            final = crud.get_leaderboard_snapshot(session, actual_date)
+            if final is not None:
+                cache_final_leaderboard(actual_date, final)
+        if final is not None:
+            return json_response({"date": actual_date, "leaders": final[:limit]}, response)
     
-    # Try to get from cache first
-    leaders = get_cached_leaderboard(actual_date)
-    
-    if leaders is None:
-        # Get from database and cache
-        leaders = crud.get_leaderboard(session, actual_date, limit)
-        cache_leaderboard(actual_date, leaders, ttl_minutes=5)  # Cache for 5 minutes
+    # Serve from cache, querying the database and caching for 5 minutes on a miss
+    leaders = load_leaderboard(actual_date, lambda: crud.get_leaderboard(session, actual_date, limit), ttl_minutes=5)
     
-    return {"date": actual_date, "leaders": leaders}
+    # Rows are plain JSON types: skip jsonable_encoder (RateLimit-* headers are carried over)
+    return json_response({"date": actual_date, "leaders": leaders}, response)
 
 
 def _validate_username_param(username: str) -> str:
@@ -911,14 +1310,69 @@ def rotate_session(session_id: str, request: Request, response: Response, sessio
     return {"session_id": session_id}
 
 
+async def _handle_ws_control(ws, msg: str) -> Optional[dict]:
+    """Handle ping/subscribe/unsubscribe control messages (same protocol as the Go gateway).
+
+    Returns the reply to send, or None when msg is not a control message.
+    """
+    if not isinstance(msg, str) or not msg.startswith('{'):
+        return None
+    try:
+        data = json.loads(msg)
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    kind = data.get('type')
+    if kind == 'ping':
+        return {"v": 1, "type": "pong"}
+    if kind == 'leaderboard_sync':
+        date = data.get('date')
+        if not isinstance(date, str) or not re.match(r'^\d{4}-\d{2}-\d{2}$', date):
+            return {"v": 1, "type": "error", "error": "invalid date"}
+        try:
+            return await _run_blocking(_leaderboard_snapshot, date)
+        except Exception as e:
+            logger.debug("leaderboard_snapshot_failed", extra={"error": str(e)})
+            return {"v": 1, "type": "error", "error": "snapshot unavailable"}
+    if kind not in ('subscribe', 'unsubscribe'):
+        return None
+    room = data.get('room') or room_for_date(data.get('date'))
+    if kind == 'subscribe':
+        if not _WS_CONNECTIONS.subscribe(ws, room):
+            return {"v": 1, "type": "error", "error": "invalid room or too many subscriptions", "room": room}
+        return {"v": 1, "type": "subscribed", "room": room, "id": data.get('id')}
+    _WS_CONNECTIONS.unsubscribe(ws, room)
+    return {"v": 1, "type": "unsubscribed", "room": room, "id": data.get('id')}
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    await ws.accept()
-    _WS_CONNECTIONS[ws] = {'player_id': None, 'last_sent': 0}
+    client_ip = ws.client.host if ws.client else None
+    # Finish the handshake before registering, so the writer task never sends
+    # on a socket that is not open yet and a failed accept leaves nothing behind
+    try:
+        await ws.accept()
+    except Exception:
+        return
+    refused = _WS_CONNECTIONS.admit(client_ip)
+    if refused is not None:
+        logger.info("ws_connection_refused", extra={"event": {"reason": refused, "client": client_ip}})
+        await ws.close(code=CLOSE_TRY_AGAIN)
+        return
+    _WS_CONNECTIONS.register(ws, {'player_id': None, 'last_sent': 0}, ip=client_ip)
     try:
         while True:
-            # keep connection open; optionally receive pings from client
+            # keep connection open; clients send pings, pongs and room (un)subscriptions
             msg = await ws.receive_text()
+            _WS_CONNECTIONS.touch(ws)
+            reply = await _handle_ws_control(ws, msg)
+            if reply is not None:
+                try:
+                    await ws.send_text(json_dumps(reply))
+                except Exception:
+                    pass
+                continue
             # Test hook: allow triggering a broadcast from a WS message in tests
             try:
                 import os as _os
@@ -1003,27 +1457,25 @@ def _handle_session_completion(session: Session, gs_local):
     except Exception:
         prev_best = None
 
-    crud.record_time(session, gs_local.player_id, gs_local.date, elapsed)
-
-    try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(broadcast_event({
-            'type': 'completion',
+    events = [{
+        'type': 'completion',
+        'player_id': gs_local.player_id,
+        'date': gs_local.date,
+        'seconds': elapsed,
+    }]
+    # If this is a new best (or first) time, broadcast leaderboard_change
+    if prev_best is None or (isinstance(prev_best, (int, float)) and elapsed < prev_best):
+        events.append({
+            'type': 'leaderboard_change',
             'player_id': gs_local.player_id,
             'date': gs_local.date,
             'seconds': elapsed,
-        }))
-        # If this is a new best (or first) time, broadcast leaderboard_change
-        if prev_best is None or (isinstance(prev_best, (int, float)) and elapsed < prev_best):
-            loop.create_task(broadcast_event({
-                'type': 'leaderboard_change',
-                'player_id': gs_local.player_id,
-                'date': gs_local.date,
-                'seconds': elapsed,
-            }))
-    except RuntimeError:
-        # No running event loop, skip broadcast
-        pass
+        })
+    # The events are staged in the realtime outbox in the same transaction
+    crud.record_time(session, gs_local.player_id, gs_local.date, elapsed, events=events)
+
+    for ev in events:
+        _schedule_broadcast(dict(ev))
 
 def _apply_session_changes(session: Session, body: SubmitSetRequest, gs_local, board_local):
     if not gs_local:
@@ -1051,6 +1503,8 @@ def _apply_session_changes(session: Session, body: SubmitSetRequest, gs_local, b
                 created_at=datetime.now(timezone.utc)
             )
             session.add(fs)
+            # Relayed to the gateway once this transaction commits
+            stage_events(session, [{'type': 'set_found', 'player_id': gs_local.player_id, 'date': gs_local.date}])
     except Exception:
         pass
 
@@ -1122,25 +1576,19 @@ def complete_daily(
     player_id = p.id
     if player_id is None:
         raise HTTPException(status_code=500, detail="player has no id")
-    crud.record_time(session, player_id, date, body.seconds)
-    # Fire-and-forget broadcast only if an event loop is running.
-    # Avoid creating the coroutine if create_task would fail (which would trigger
-    # a "coroutine was never awaited" warning under sync request handlers in tests).
+    event = {
+        'type': 'completion',
+        'player_id': player_id,
+        'date': date,
+        'seconds': body.seconds,
+    }
+    crud.record_time(session, player_id, date, body.seconds, events=[event])
+    # Fire-and-forget broadcast (scheduled onto the server loop from this sync handler)
     try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = None
-    if loop is not None:
-        try:
-            loop.create_task(broadcast_event({
-                'type': 'completion',
-                'player_id': player_id,
-                'date': date,
-                'seconds': body.seconds,
-            }))
-        except Exception:
-            # If scheduling fails for any reason, continue without blocking the request
-            pass
+        _schedule_broadcast(dict(event))
+    except Exception:
+        # If scheduling fails for any reason, continue without blocking the request
+        pass
     return {"status": "ok"}
 
 @app.post("/api/__test_broadcast")
@@ -0,0 +1,304 @@
+"""
+Process metrics registry for Daily Set application.
+
+Counters and histograms are recorded into per-thread shards (a plain dict
+owned by the recording thread) and only merged when `/metrics` is scraped,
+so the hot path is a thread-local lookup, a dict update and, for histograms,
+one bisect - no locks. Values that already live elsewhere (WebSocket
+connections, NATS publisher counters, cache hit/miss) are read at scrape
+time by collectors instead of being mirrored on every event.
+
+Output is the Prometheus text exposition format (version 0.0.4).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .logging_utils import get_logger
+
+logger = get_logger("app.metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "daily_set"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Tuple[str, ...]):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+
+class Counter(_Metric):
+    """Monotonic counter; `labels` is a tuple of values in labelnames order"""
+
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), n: float = 1) -> None:
+        shard = self.registry._shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + n
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; each series is [count per bucket..., +Inf count, sum]"""
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames, buckets: Tuple[float, ...]):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        shard = self.registry._shard()
+        key = (self.name, labels)
+        slots = shard.get(key)
+        if slots is None:
+            slots = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        slots[bisect_left(self.buckets, value)] += 1
+        slots[-1] += value
+
+    def time(self, labels: Labels = ()) -> "_Timer":
+        return _Timer(self, labels)
+
+    def snapshot(self, labels: Labels = (), totals: Optional[Dict[tuple, Any]] = None) -> Dict[str, Any]:
+        """Merged series as JSON: cumulative [bound, count] pairs, total count and sum.
+
+        Pass `totals` (from registry.totals()) when snapshotting several series at once.
+        """
+        if totals is None:
+            totals = self.registry.totals()
+        slots = totals.get((self.name, labels)) or [0] * (len(self.buckets) + 1) + [0.0]
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets, slots):
+            running += count
+            cumulative.append([bound, running])
+        return {'buckets': cumulative, 'count': running + slots[-2], 'sum': round(slots[-1], 6)}
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, self.labels)
+
+
+class MetricsRegistry:
+    """Named counters/histograms plus scrape-time collectors"""
+
+    def __init__(self, prefix: str = PREFIX):
+        self.prefix = prefix
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (thread, shard) for each live thread that has recorded. When a
+        # thread exits (AnyIO retires idle workers after 10s) its shard is
+        # folded into _retired, so totals stay monotonic without the list
+        # growing with every worker ever started
+        self._shards: List[Tuple[threading.Thread, Dict[tuple, Any]]] = []
+        self._retired: Dict[tuple, Any] = {}
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Tuple[str, Callable[[], str]]] = []
+
+    def _shard(self) -> Dict[tuple, Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[tuple, Any] = {}
+            with self._lock:
+                self._retire_dead_locked()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def _retire_dead_locked(self) -> None:
+        """Fold shards of exited threads into _retired (caller holds _lock)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                # The owner is gone, so nothing writes this shard any more
+                _merge(self._retired, shard)
+        self._shards = live
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(self, f"{self.prefix}_{name}", help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, f"{self.prefix}_{name}", help, labelnames, buckets))
+
+    def add_collector(self, name: str, collect: Callable[[], str]) -> None:
+        """Register (or replace) a callable returning exposition text, run on every scrape"""
+        with self._lock:
+            self._collectors = [c for c in self._collectors if c[0] != name] + [(name, collect)]
+
+    def totals(self) -> Dict[tuple, Any]:
+        """Merge all shards: (metric name, labels) -> count or histogram slots"""
+        with self._lock:
+            self._retire_dead_locked()
+            shards = [shard for _, shard in self._shards]
+            merged: Dict[tuple, Any] = {}
+            _merge(merged, self._retired)
+        for shard in shards:
+            _merge(merged, shard)
+        return merged
+
+    def value(self, name: str, labels: Labels = ()) -> Any:
+        """Merged value of one series (histograms: per-bucket counts, +Inf count, sum)"""
+        return self.totals().get((f"{self.prefix}_{name}", labels))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        text = self.render_metrics(metrics)
+        for name, collect in collectors:
+            try:
+                text += collect()
+            except Exception as e:
+                logger.warning("metrics_collector_failed", extra={"event": {"collector": name}, "error": str(e)})
+        return text
+
+    def render_metrics(self, metrics: List[_Metric]) -> str:
+        """Exposition text for some of the registered metrics (no collectors)"""
+        totals = self.totals()
+        by_metric: Dict[str, List[Tuple[Labels, Any]]] = {}
+        for (name, labels), value in totals.items():
+            by_metric.setdefault(name, []).append((labels, value))
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in sorted(by_metric.get(metric.name, ()), key=lambda s: s[0]):
+                if isinstance(metric, Histogram):
+                    _render_histogram(lines, metric, labels, value)
+                else:
+                    lines.append(f"{metric.name}{_label_str(metric.labelnames, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(acc: Dict[tuple, Any], shard: Dict[tuple, Any]) -> None:
+    """Add one shard's counters and histogram slots into acc"""
+    # dict() / list() copies are atomic under the GIL, so no lock is needed
+    # against the owning thread writing concurrently
+    for key, value in dict(shard).items():
+        if isinstance(value, list):
+            value = list(value)
+            slots = acc.get(key)
+            if slots is None:
+                acc[key] = value
+            else:
+                for i, v in enumerate(value):
+                    slots[i] += v
+        else:
+            acc[key] = acc.get(key, 0) + value
+
+
+def _render_histogram(lines: List[str], metric: Histogram, labels: Labels, slots: list) -> None:
+    running = 0
+    for bound, count in zip(metric.buckets, slots):
+        running += count
+        le = _label_str(metric.labelnames, labels, f'le="{bound}"')
+        lines.append(f"{metric.name}_bucket{le} {running}")
+    running += slots[len(metric.buckets)]
+    le = _label_str(metric.labelnames, labels, 'le="+Inf"')
+    lines.append(f"{metric.name}_bucket{le} {running}")
+    lines.append(f"{metric.name}_sum{_label_str(metric.labelnames, labels)} {round(slots[-1], 6)}")
+    lines.append(f"{metric.name}_count{_label_str(metric.labelnames, labels)} {running}")
+
+
+def render_gauges(metric: str, help: str, series: Dict[Labels, Any], labelnames: Tuple[str, ...] = (), kind: str = "gauge") -> str:
+    """Exposition text for values read at scrape time (e.g. from a component's stats())"""
+    lines = [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+    for labels in sorted(series):
+        value = series[labels]
+        if isinstance(value, bool):
+            value = int(value)
+        lines.append(f"{metric}{_label_str(labelnames, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Low-cardinality route label: the matched path template, never the raw path"""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    override = scope.get("route_template")
+    if override:
+        return override
+    if "endpoint" in scope:
+        # Mounted apps (StaticFiles) only leave their mount prefix behind
+        return scope.get("root_path") or "mount"
+    return "unmatched"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status (_count is the request count)",
+    ("method", "route", "status"),
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time by statement type (_count is the query count)",
+    ("operation",),
+    QUERY_BUCKETS,
+)
+BROADCAST_FANOUT_SECONDS = REGISTRY.histogram(
+    "broadcast_fanout_duration_seconds",
+    "Time to enqueue one broadcast for NATS, WebSocket and SSE subscribers",
+    ("type",),
+    QUERY_BUCKETS,
+)
+RATE_LIMIT_REJECTIONS = REGISTRY.counter(
+    "rate_limit_rejections_total",
+    "Requests refused with 429 by route template",
+    ("route",),
+)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    REQUEST_SECONDS.observe(seconds, (method, route, str(status)))
+
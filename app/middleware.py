@@ -0,0 +1,193 @@
+"""
+HTTP middleware for Daily Set application.
+
+Both middlewares are plain ASGI callables rather than BaseHTTPMiddleware
+subclasses: they only wrap `send` to add headers to the `http.response.start`
+message, so responses (including streams such as SSE) pass through without
+the extra task, memory stream and Request/Response objects per request.
+Header values are encoded once when the middleware stack is built.
+"""
+
+import os
+import random
+import time
+import uuid
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+from starlette.datastructures import URL
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .logging_utils import get_logger, request_id_ctx
+from .metrics import observe_request, route_template
+from .sqlmon import QUERY_MONITOR
+from .tracing import NOOP_SPAN, start_trace
+
+logger = get_logger("app.middleware")
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+_CSP = b"content-security-policy"
+_REQUEST_ID = b"x-request-id"
+_USER_AGENT = b"user-agent"
+
+
+def csp_connect_sources(realtime_ws_url: Optional[str] = None) -> List[str]:
+    """connect-src origins: self plus the external realtime gateway, if configured"""
+    srcs: List[str] = ["'self'"]
+    try:
+        if realtime_ws_url:
+            p = urlparse(realtime_ws_url)
+            if p.scheme in ('ws', 'wss') and p.hostname:
+                host = p.hostname
+                if p.port:
+                    host = f"{host}:{p.port}"
+                src = f"{p.scheme}://{host}"
+                if src not in srcs:
+                    srcs.append(src)
+    except Exception:
+        pass
+    return srcs
+
+
+def build_csp(realtime_ws_url: Optional[str] = None) -> str:
+    """Strict Content Security Policy"""
+    return "; ".join([
+        "default-src 'self'",
+        "script-src 'self'",
+        "style-src 'self' 'unsafe-inline'",
+        "img-src 'self' data:",
+        "font-src 'self'",
+        f"connect-src {' '.join(csp_connect_sources(realtime_ws_url))}",
+        "object-src 'none'",
+        "base-uri 'self'",
+        "frame-ancestors 'none'",
+        "form-action 'self'",
+        "upgrade-insecure-requests",
+    ])
+
+
+# Added only when the response does not set them itself
+DEFAULT_SECURITY_HEADERS: RawHeaders = [
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"permissions-policy", b"geolocation=(), microphone=(), camera=()"),
+    (b"cross-origin-opener-policy", b"same-origin"),
+    # HSTS is only relevant when behind HTTPS; enabling is generally safe in prod
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+]
+
+
+class SecurityHeadersMiddleware:
+    """Set the CSP (always) and best-practice security headers (unless already set)"""
+
+    def __init__(self, app: ASGIApp, csp: Optional[str] = None):
+        self.app = app
+        if csp is None:
+            csp = build_csp(os.getenv('REALTIME_WS_URL'))
+        self.csp_header = (_CSP, csp.encode("latin-1"))
+        self.defaults = list(DEFAULT_SECURITY_HEADERS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                raw = message.get("headers") or []
+                present = {name.lower() for name, _ in raw}
+                headers = [h for h in raw if h[0].lower() != _CSP] if _CSP in present else list(raw)
+                headers.append(self.csp_header)
+                for name, value in self.defaults:
+                    if name not in present:
+                        headers.append((name, value))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RequestLoggingMiddleware:
+    """Bind a request id (X-Request-ID or a new uuid4), echo it, and log one line per request.
+
+    Every request's latency is recorded by route template (app/metrics.py),
+    its SQL statements are counted (app/sqlmon.py) and, when sampled for
+    tracing, it gets the root span of its trace (app/tracing.py).
+    Successful requests faster than slow_ms are logged with probability
+    sample_rate (their lines carry `sample_rate` so counts can be scaled back);
+    errors (status >= 400, exceptions) and slow requests are always logged.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, slow_ms: int = 500):
+        self.app = app
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid_raw = ua_raw = None
+        for name, value in scope.get("headers") or ():
+            if name == _REQUEST_ID:
+                rid_raw = value
+            elif name == _USER_AGENT:
+                ua_raw = value
+        rid = rid_raw.decode("latin-1") if rid_raw else str(uuid.uuid4())
+        rid_header = (_REQUEST_ID, rid_raw or rid.encode("latin-1"))
+        token = request_id_ctx.set(rid)
+        queries = QUERY_MONITOR.begin_request()
+        trace = start_trace("http.request", rid)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [h for h in message.get("headers") or () if h[0] != _REQUEST_ID]
+                message["headers"].append(rid_header)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception:
+            # Log exception with context
+            logger.exception(
+                "request_error",
+                extra={"path": str(URL(scope=scope)), "method": scope.get("method")},
+            )
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            route = route_template(scope)
+            observe_request(scope.get("method", ""), route, status, elapsed)
+            QUERY_MONITOR.finish_request(queries, route, scope.get("method"))
+            if trace is not NOOP_SPAN:
+                trace.name = f"{scope.get('method')} {route}"
+                trace.set("http.method", scope.get("method"))
+                trace.set("http.path", scope.get("path"))
+                trace.set("http.route", route)
+                trace.set("http.status_code", status)
+                trace.end()
+            duration_ms = int(elapsed * 1000)
+            always = status >= 400 or duration_ms >= self.slow_ms
+            if always or self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+                client = scope.get("client")
+                logger.info(
+                    "request",
+                    extra={
+                        "method": scope.get("method"),
+                        "path": scope.get("path"),
+                        "status": status,
+                        "duration_ms": duration_ms,
+                        "client": client[0] if client else "-",
+                        "user_agent": ua_raw.decode("latin-1") if ua_raw else "-",
+                        "sample_rate": None if always or self.sample_rate >= 1.0 else self.sample_rate,
+                        "db_queries": queries.count,
+                        "db_ms": round(queries.seconds * 1000, 1),
+                    },
+                )
+            request_id_ctx.reset(token)
@@ -140,6 +140,28 @@ def run_migrations():
     """
     apply_migration(engine, "004_foundset", migration_004)
 
+    # Migration 005: Immutable end-of-day leaderboard snapshots
+    migration_005 = """
+    CREATE TABLE IF NOT EXISTS leaderboardsnapshot (
+        date TEXT PRIMARY KEY,
+        leaders_json TEXT NOT NULL,
+        created_at TEXT
+    )
+    """
+    apply_migration(engine, "005_leaderboard_snapshot", migration_005)
+
+    # Migration 006: Outbox of realtime events awaiting relay to NATS
+    migration_006 = """
+    CREATE TABLE IF NOT EXISTS realtimeoutbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        room TEXT NOT NULL,
+        event_json TEXT NOT NULL,
+        created_at TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0
+    )
+    """
+    apply_migration(engine, "006_realtime_outbox", migration_006)
+
 
 if __name__ == "__main__":
     # Configure logging
@@ -36,3 +36,17 @@ class FoundSet(SQLModel, table=True):
     cards_json: str  # JSON array of three cards
     session_id: Optional[str] = None
     created_at: Optional[datetime] = None
+
+
+class LeaderboardSnapshot(SQLModel, table=True):
+    date: str = Field(primary_key=True)  # YYYY-MM-DD
+    leaders_json: str  # JSON array of final leaderboard rows
+    created_at: Optional[datetime] = None
+
+
+class RealtimeOutbox(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    room: str  # e.g. daily-YYYYMMDD
+    event_json: str  # JSON event payload relayed to NATS
+    created_at: Optional[datetime] = None
+    attempts: int = 0
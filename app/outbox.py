@@ -0,0 +1,233 @@
+"""
+Durable outbox for realtime events in Daily Set application.
+
+Events that must reach the Go gateway (completions, leaderboard changes, found
+sets) are staged as `realtimeoutbox` rows in the same transaction as the data
+change that caused them, so a committed completion always has its event on
+disk. A relay task on the NATS publisher thread drains the table in id order:
+it publishes a batch, waits for the broker to acknowledge it (flush), and only
+then deletes the rows. Failed batches stay put and are retried with backoff.
+After a failure rows are sent one at a time, so a row the broker keeps
+rejecting (e.g. an oversized payload) is isolated; after `max_attempts`
+rejections it is dead-lettered: left in the table for inspection, logged
+as `outbox_dead_letter`, and skipped. An unreachable broker does not count
+as an attempt.
+
+Delivery is at-least-once: a crash between publish and delete, or several
+workers relaying the same table, can repeat an event. Envelope ids are
+`outbox-<row id>` so consumers can de-duplicate.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+from . import models
+from .connections import room_for_date
+from .logging_utils import get_logger
+
+logger = get_logger("app.outbox")
+
+# Event types that are persisted and relayed instead of published best-effort
+DURABLE_EVENT_TYPES = ('completion', 'leaderboard_change', 'set_found')
+
+SendFunc = Callable[[List[Tuple[str, Dict[str, Any], str, str]]], Awaitable[None]]
+
+_relay: Optional["OutboxRelay"] = None
+
+
+def stage_events(session: Session, events: Iterable[dict]) -> int:
+    """Add outbox rows to the session's pending transaction (caller commits).
+
+    No-op unless a relay is active, so nothing accumulates without NATS.
+    """
+    relay = _relay
+    if relay is None:
+        return 0
+    now = datetime.now(timezone.utc)
+    n = 0
+    for event in events:
+        room = room_for_date(event.get('date')) or 'broadcast'
+        session.add(models.RealtimeOutbox(room=room, event_json=json.dumps(event), created_at=now))
+        n += 1
+    relay.note_pending(n)
+    return n
+
+
+def is_active() -> bool:
+    return _relay is not None
+
+
+def set_relay(relay: Optional["OutboxRelay"]) -> None:
+    global _relay
+    _relay = relay
+
+
+def get_relay() -> Optional["OutboxRelay"]:
+    return _relay
+
+
+class OutboxRelay:
+    """Drain realtimeoutbox rows to NATS in batches, deleting them once acknowledged.
+
+    The cursor skips rows already relayed by this process whose delete is
+    still pending or failed; it is reset every `rescan_seconds` so rows that
+    committed out of id order (possible on databases other than SQLite) or
+    whose delete failed are picked up again.
+
+    The pending count is kept in memory (staged minus acked or dead-lettered)
+    so stats stay cheap for /metrics and /ready. It is re-read from the table
+    on each rescan, which corrects rolled-back stages and rows other workers
+    staged.
+    """
+
+    def __init__(
+        self,
+        engine_getter: Callable[[], Any],
+        batch_size: int = 100,
+        interval: float = 0.5,
+        backoff_max: float = 30.0,
+        rescan_seconds: float = 60.0,
+        max_attempts: int = 10,
+    ):
+        self._engine = engine_getter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff_max = backoff_max
+        self.rescan_seconds = rescan_seconds
+        self.max_attempts = max_attempts
+        self.cursor = 0
+        self._last_rescan = time.monotonic()
+        self._pending: Optional[int] = None
+        self._pending_lock = threading.Lock()
+        self.stats_counters = {
+            'relayed': 0,
+            'deleted': 0,
+            'failures': 0,
+            'dead_lettered': 0,
+        }
+
+    def _fetch(self) -> List[models.RealtimeOutbox]:
+        with Session(self._engine()) as s:
+            return list(s.exec(
+                select(models.RealtimeOutbox)
+                .where(models.RealtimeOutbox.id > self.cursor)  # type: ignore[operator]
+                .where(models.RealtimeOutbox.attempts < self.max_attempts)  # type: ignore[operator]
+                .order_by(models.RealtimeOutbox.id)  # type: ignore[arg-type]
+                .limit(self.batch_size)
+            ).all())
+
+    def _ack(self, ids: List[int]) -> None:
+        with Session(self._engine()) as s:
+            s.exec(delete(models.RealtimeOutbox).where(models.RealtimeOutbox.id.in_(ids)))  # type: ignore[attr-defined,call-overload]
+            s.commit()
+
+    def _mark_failed(self, ids: List[int]) -> None:
+        with Session(self._engine()) as s:
+            s.exec(  # type: ignore[call-overload]
+                update(models.RealtimeOutbox)
+                .where(models.RealtimeOutbox.id.in_(ids))  # type: ignore[attr-defined]
+                .values(attempts=models.RealtimeOutbox.attempts + 1)
+            )
+            s.commit()
+
+    async def relay_once(self, send: SendFunc) -> int:
+        """Relay one batch; return rows relayed. Raises if the send failed."""
+        if self._pending is None or time.monotonic() - self._last_rescan >= self.rescan_seconds:
+            self._last_rescan = time.monotonic()
+            self.cursor = 0
+            await asyncio.to_thread(self._recount)
+        rows = await asyncio.to_thread(self._fetch)
+        if not rows:
+            return 0
+        if rows[0].attempts > 0:
+            # The head failed before: send it alone so one bad row cannot sink a batch
+            rows = rows[:1]
+        ids = [int(r.id) for r in rows if r.id is not None]
+        batch = []
+        for r in rows:
+            ts = r.created_at.isoformat() if r.created_at else datetime.now(timezone.utc).isoformat()
+            batch.append((r.room, {"event": json.loads(r.event_json)}, f"outbox-{r.id}", ts))
+        try:
+            await send(batch)
+        except ConnectionError:
+            # Broker unreachable: says nothing about the rows, retry them as they are
+            self.stats_counters['failures'] += 1
+            raise
+        except Exception as e:
+            self.stats_counters['failures'] += 1
+            try:
+                await asyncio.to_thread(self._mark_failed, ids)
+            except Exception as mark_error:
+                logger.debug("outbox_mark_failed_error", extra={"error": str(mark_error)})
+            else:
+                if len(rows) == 1 and rows[0].attempts + 1 >= self.max_attempts:
+                    self._dead_letter(rows[0], e)
+            raise
+        self.cursor = max(ids)
+        self.stats_counters['relayed'] += len(ids)
+        await asyncio.to_thread(self._ack, ids)
+        self.stats_counters['deleted'] += len(ids)
+        self.note_pending(-len(ids))
+        return len(ids)
+
+    def _dead_letter(self, row: models.RealtimeOutbox, error: Exception) -> None:
+        self.stats_counters['dead_lettered'] += 1
+        self.note_pending(-1)
+        logger.error(
+            "outbox_dead_letter",
+            extra={"error": str(error), "event": {"id": row.id, "room": row.room, "attempts": row.attempts + 1}},
+        )
+
+    async def run(self, send: SendFunc, stopping: threading.Event) -> None:
+        delay = 0.0
+        while not stopping.is_set():
+            try:
+                n = await self.relay_once(send)
+                delay = 0.0
+            except Exception as e:
+                n = 0
+                delay = min(self.backoff_max, delay * 2 if delay else self.interval)
+                logger.warning("outbox_relay_failed", extra={"error": str(e), "event": {"retry_in": delay}})
+            if n < self.batch_size:
+                await asyncio.sleep(delay or self.interval)
+
+    def count_pending(self) -> int:
+        """Rows still to relay, counted in the table (dead-lettered rows excluded)"""
+        from sqlalchemy import func
+        with Session(self._engine()) as s:
+            return int(s.exec(
+                select(func.count())
+                .select_from(models.RealtimeOutbox)
+                .where(models.RealtimeOutbox.attempts < self.max_attempts)  # type: ignore[operator]
+            ).one())
+
+    def _recount(self) -> None:
+        try:
+            n = self.count_pending()
+        except Exception as e:
+            logger.debug("outbox_count_failed", extra={"error": str(e)})
+            return
+        with self._pending_lock:
+            self._pending = n
+
+    def note_pending(self, delta: int) -> None:
+        """Adjust the in-memory pending count (rows staged or removed)"""
+        with self._pending_lock:
+            if self._pending is not None:
+                self._pending = max(0, self._pending + delta)
+
+    def stats(self) -> Dict[str, Any]:
+        # No query here: this is reached from every /metrics and /ready hit
+        return {
+            **self.stats_counters,
+            'cursor': self.cursor,
+            'pending': self._pending,
+            'max_attempts': self.max_attempts,
+        }
@@ -0,0 +1,329 @@
+"""
+Sampling profiler for production requests in Daily Set application.
+
+A configurable fraction of requests (PROFILE_SAMPLE_RATE), plus any request
+carrying a valid signed `X-Debug-Profile` header, is profiled by a single
+background thread. The thread only runs while such a request is in flight.
+Every PROFILE_INTERVAL_MS it snapshots all thread stacks
+(`sys._current_frames()`) and keeps the ones executing the request's
+endpoint function: the loop thread for async handlers, a threadpool worker
+for sync ones. Each kept stack is cropped at the endpoint frame. Unsampled
+requests pay one random() call; nothing is traced per function call.
+
+Samples from requests slower than PROFILE_SLOW_MS are appended per route to
+`<PROFILE_DIR>/<route>.collapsed` in the collapsed-stack format read by
+flamegraph.pl and speedscope (`frame;frame;frame count`). Header-forced
+requests are always written, to their own `request-<id>.collapsed` file.
+A file that reaches PROFILE_MAX_FILE_MB is rotated to `<name>.1.collapsed`,
+replacing the previous rotation, and only the newest request files are kept.
+
+The header value is `<unix expiry>.<hex HMAC-SHA256(PROFILE_SECRET, "profile:<expiry>")>`
+(see `sign_debug_token`); the same secret guards the admin endpoints.
+"""
+
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .logging_utils import get_logger, request_id_ctx
+from .metrics import route_template
+
+logger = get_logger("app.profiling")
+
+_DEBUG_HEADER = b"x-debug-profile"
+_FILE_NAME = re.compile(r"^[A-Za-z0-9_.-]+\.collapsed$")
+
+
+def sign_debug_token(secret: str, expires: int) -> str:
+    """Value for X-Debug-Profile that forces profiling until `expires` (unix time)"""
+    sig = hmac.new(secret.encode(), f"profile:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{sig}"
+
+
+def verify_debug_token(secret: Optional[str], token: str, now: Optional[float] = None) -> bool:
+    if not secret or "." not in token:
+        return False
+    expires_s, sig = token.split(".", 1)
+    try:
+        expires = int(expires_s)
+    except ValueError:
+        return False
+    if expires < (now if now is not None else time.time()):
+        return False
+    expected = sign_debug_token(secret, expires).split(".", 1)[1]
+    return hmac.compare_digest(expected, sig)
+
+
+def _route_file(route: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")
+    return f"{slug or 'root'}.collapsed"
+
+
+def _request_file(rid: str) -> str:
+    # X-Request-ID is client-supplied: keep only characters _FILE_NAME allows
+    return f"request-{re.sub(r'[^A-Za-z0-9_.-]', '_', rid[:36])}.collapsed"
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+class ProfileSession:
+    """Samples collected for one profiled request"""
+
+    __slots__ = ("scope", "code", "forced", "rid", "samples")
+
+    def __init__(self, scope: Scope, forced: bool, rid: Optional[str]):
+        self.scope = scope
+        self.code = None
+        self.forced = forced
+        self.rid = rid
+        # tuple of code objects (endpoint first) -> sample count
+        self.samples: Dict[tuple, int] = {}
+
+    def endpoint_code(self):
+        if self.code is None:
+            # Known only once routing has run
+            endpoint = self.scope.get("endpoint")
+            self.code = getattr(endpoint, "__code__", None)
+        return self.code
+
+
+class SamplingProfiler:
+    """Stack sampler that is only awake while a profiled request is in flight"""
+
+    def __init__(
+        self,
+        directory: Path,
+        sample_rate: float = 0.0,
+        interval: float = 0.005,
+        slow_ms: float = 200.0,
+        secret: Optional[str] = None,
+        max_concurrent: int = 4,
+        max_request_files: int = 50,
+        max_file_bytes: int = 5 * 1024 * 1024,
+    ):
+        self.directory = Path(directory)
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.interval = interval
+        self.slow_seconds = slow_ms / 1000.0
+        self.secret = secret or None
+        self.max_concurrent = max_concurrent
+        self.max_request_files = max_request_files
+        self.max_file_bytes = max_file_bytes
+        self._active: Dict[int, ProfileSession] = {}
+        self._finished: List[Tuple[ProfileSession, str]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats_counters = {
+            'profiled': 0,
+            'forced': 0,
+            'skipped_busy': 0,
+            'samples': 0,
+            'written': 0,
+            'write_failures': 0,
+            'rotations': 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.secret is not None
+
+    # -- request side ---------------------------------------------------------
+
+    def wants(self, scope: Scope) -> Tuple[bool, bool]:
+        """(profile this request?, forced by a signed header?)"""
+        if self.secret is not None:
+            for name, value in scope.get("headers") or ():
+                if name == _DEBUG_HEADER:
+                    if verify_debug_token(self.secret, value.decode("latin-1")):
+                        return True, True
+                    break
+        return (self.sample_rate > 0 and random.random() < self.sample_rate), False
+
+    def begin(self, scope: Scope, forced: bool = False) -> Optional[ProfileSession]:
+        session = ProfileSession(scope, forced, request_id_ctx.get())
+        with self._lock:
+            if len(self._active) >= self.max_concurrent and not forced:
+                self.stats_counters['skipped_busy'] += 1
+                return None
+            self._active[id(session)] = session
+            self.stats_counters['profiled'] += 1
+            if forced:
+                self.stats_counters['forced'] += 1
+            self._ensure_thread()
+        self._wake.set()
+        return session
+
+    def end(self, session: ProfileSession, route: str, seconds: float) -> None:
+        with self._lock:
+            self._active.pop(id(session), None)
+            if session.samples and (session.forced or seconds >= self.slow_seconds):
+                self._finished.append((session, route))
+        self._wake.set()
+
+    # -- sampler thread -------------------------------------------------------
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    active = list(self._active.values())
+                    finished, self._finished = self._finished, []
+                if finished:
+                    self._write(finished)
+                if not active:
+                    break
+                self._sample(active, own)
+                time.sleep(self.interval)
+
+    def _sample(self, sessions: List[ProfileSession], own: int) -> None:
+        frames = sys._current_frames()
+        for session in sessions:
+            code = session.endpoint_code()
+            if code is None:
+                continue
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                stack = []
+                f = frame
+                while f is not None:
+                    stack.append(f.f_code)
+                    if f.f_code is code:
+                        break
+                    f = f.f_back
+                if f is None:
+                    continue
+                key = tuple(reversed(stack))
+                session.samples[key] = session.samples.get(key, 0) + 1
+                self.stats_counters['samples'] += 1
+
+    def _write(self, finished: List[Tuple[ProfileSession, str]]) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            self.stats_counters['write_failures'] += len(finished)
+            logger.warning("profile_write_failed", extra={"error": str(e)})
+            return
+        for session, route in finished:
+            lines = "".join(
+                ";".join(_frame_label(c) for c in stack) + f" {count}\n" for stack, count in session.samples.items()
+            )
+            targets = [_route_file(route)]
+            if session.forced:
+                targets.append(_request_file(session.rid or str(id(session))))
+            try:
+                for name in targets:
+                    self._append(self.directory / name, lines)
+                self.stats_counters['written'] += 1
+            except OSError as e:
+                self.stats_counters['write_failures'] += 1
+                logger.warning("profile_write_failed", extra={"error": str(e)})
+        self._prune_request_files()
+
+    def _append(self, path: Path, lines: str) -> None:
+        """Append to a profile, first rotating it to <name>.1.collapsed if it is full"""
+        try:
+            full = self.max_file_bytes and path.stat().st_size + len(lines) > self.max_file_bytes
+        except FileNotFoundError:
+            full = False
+        if full:
+            path.replace(path.with_suffix(".1.collapsed"))
+            self.stats_counters['rotations'] += 1
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(lines)
+
+    def _prune_request_files(self) -> None:
+        try:
+            files = sorted(self.directory.glob("request-*.collapsed"), key=lambda p: p.stat().st_mtime)
+            for old in files[: max(0, len(files) - self.max_request_files)]:
+                old.unlink()
+        except OSError:
+            pass
+
+    # -- admin ----------------------------------------------------------------
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Profile files, most recently updated first"""
+        if not self.directory.is_dir():
+            return []
+        out = []
+        for p in self.directory.glob("*.collapsed"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            out.append({'name': p.name, 'bytes': st.st_size, 'modified': int(st.st_mtime)})
+        out.sort(key=lambda e: -e['modified'])
+        return out
+
+    def profile_path(self, name: str) -> Optional[Path]:
+        if not _FILE_NAME.match(name):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'active': len(self._active),
+            'directory': str(self.directory),
+        }
+
+
+class ProfilingMiddleware:
+    """Profile sampled or header-forced requests; streams (SSE) are never profiled"""
+
+    def __init__(self, app: ASGIApp, profiler: SamplingProfiler, exclude_paths: Tuple[str, ...] = ("/api/events",)):
+        self.app = app
+        self.profiler = profiler
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        profile, forced = self.profiler.wants(scope)
+        session = self.profiler.begin(scope, forced) if profile else None
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end(session, route_template(scope), time.perf_counter() - start)
+
+
+def profiler_from_env() -> SamplingProfiler:
+    return SamplingProfiler(
+        Path(os.getenv("PROFILE_DIR", "./profiles")),
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        interval=int(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0,
+        slow_ms=float(os.getenv("PROFILE_SLOW_MS", "200")),
+        secret=os.getenv("PROFILE_SECRET"),
+        max_concurrent=int(os.getenv("PROFILE_MAX_CONCURRENT", "4")),
+        max_file_bytes=int(float(os.getenv("PROFILE_MAX_FILE_MB", "5")) * 1024 * 1024),
+    )
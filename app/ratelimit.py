@@ -0,0 +1,205 @@
+"""
+Rate limiting for Daily Set application.
+
+Uses a sliding-window counter: each key keeps the request count of the current
+and previous fixed window, and the previous count is weighted by how much of it
+still overlaps the sliding window. Checks are O(1) regardless of the limit.
+
+Two stores are available:
+- SlidingWindowRateLimiter: process-local, lock-striped, with idle-key
+  eviction and a hard cap on tracked keys
+- SQLiteRateLimiter: a SQLite file shared by all workers on one host, so limits
+  hold across processes
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List
+
+from .logging_utils import get_logger
+
+logger = get_logger("app.ratelimit")
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate-limit check, with the data for RateLimit-* headers"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+
+    def headers(self) -> Dict[str, str]:
+        """IETF draft RateLimit-* response headers"""
+        return {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset_seconds),
+        }
+
+
+def _evaluate(now: float, limit: int, window: int, state: List[float]) -> RateLimitResult:
+    """Advance a [window_start, current, previous, last_seen] state and count a hit.
+
+    Shared by the in-memory and SQLite stores so both apply identical math.
+    """
+    window_start = math.floor(now / window) * window
+    if state[0] != window_start:
+        # Roll forward: the old current window becomes previous only if adjacent
+        state[2] = state[1] if window_start - state[0] == window else 0
+        state[1] = 0
+        state[0] = window_start
+    elapsed = now - window_start
+    weight = 1.0 - elapsed / window
+    estimate = state[2] * weight + state[1]
+    reset = max(1, int(math.ceil(window - elapsed)))
+    state[3] = now
+    if estimate >= limit:
+        return RateLimitResult(False, limit, 0, reset)
+    state[1] += 1
+    remaining = max(0, int(limit - (estimate + 1)))
+    return RateLimitResult(True, limit, remaining, reset)
+
+
+class _Shard:
+    __slots__ = ('entries', 'lock', 'last_sweep', 'evictions')
+
+    def __init__(self):
+        # key -> [window_start, current, previous, last_seen], in LRU order
+        self.entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.last_sweep = 0.0
+        self.evictions = 0
+
+
+class SlidingWindowRateLimiter:
+    """Thread-safe in-memory sliding-window counter with bounded memory.
+
+    Keys are striped across shards, each an LRU-ordered dict under its own
+    lock. Keys idle for longer than `idle_seconds` are swept from the LRU end
+    at most every `sweep_interval` seconds, and each shard holds at most
+    `max_keys / shards` keys, evicting the least recently seen on overflow.
+    """
+
+    def __init__(self, max_keys: int = 50000, idle_seconds: int = 600, shards: int = 16, sweep_interval: float = 5.0):
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._shards = [_Shard() for _ in range(shards)]
+        self._per_shard_cap = max(1, max_keys // shards)
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _sweep(self, shard: _Shard, now: float) -> None:
+        if now - shard.last_sweep < self.sweep_interval:
+            return
+        shard.last_sweep = now
+        cutoff = now - self.idle_seconds
+        entries = shard.entries
+        while entries:
+            key, state = next(iter(entries.items()))
+            if state[3] >= cutoff:
+                break
+            entries.popitem(last=False)
+            shard.evictions += 1
+
+    def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        """Count one request for key and report whether it is allowed"""
+        now = time.time()
+        shard = self._shard(key)
+        with shard.lock:
+            self._sweep(shard, now)
+            state = shard.entries.get(key)
+            if state is None:
+                if len(shard.entries) >= self._per_shard_cap:
+                    shard.entries.popitem(last=False)
+                    shard.evictions += 1
+                state = [0.0, 0, 0, now]
+                shard.entries[key] = state
+            else:
+                shard.entries.move_to_end(key)
+            return _evaluate(now, limit, window, state)
+
+    def clear(self) -> None:
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+
+    @property
+    def evictions(self) -> int:
+        return sum(shard.evictions for shard in self._shards)
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+
+class SQLiteRateLimiter:
+    """Sliding-window counter stored in a SQLite file shared by all workers on a host"""
+
+    def __init__(self, path: str, idle_seconds: int = 600, sweep_interval: float = 30.0):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, window_start REAL NOT NULL, current INTEGER NOT NULL, "
+            "previous INTEGER NOT NULL, last_seen REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        now = time.time()
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, current, previous, last_seen FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            state = list(row) if row else [0.0, 0, 0, now]
+            result = _evaluate(now, limit, window, state)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_start, current, previous, last_seen) VALUES (?, ?, ?, ?, ?)",
+                (key, state[0], state[1], state[2], state[3]),
+            )
+            if now - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = now
+                conn.execute("DELETE FROM rate_limits WHERE last_seen < ?", (now - self.idle_seconds,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM rate_limits")
+
+    def __len__(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0])
+
+
+def create_rate_limiter_from_env():
+    """Build a limiter from RATE_LIMIT_BACKEND (memory|sqlite) and related settings"""
+    kind = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if kind == "sqlite":
+        path = os.getenv("RATE_LIMIT_SQLITE_PATH", "./ratelimit.sqlite3")
+        try:
+            return SQLiteRateLimiter(path)
+        except Exception as e:
+            logger.warning("rate_limit_backend_failed", extra={"error": str(e)})
+    return SlidingWindowRateLimiter(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "50000")))
@@ -0,0 +1,240 @@
+"""
+Readiness probes for Daily Set application.
+
+`/health` only says the process is up. `/ready` says whether this instance
+should receive traffic. It times a DB read, times how long it takes to get
+SQLite's writer lock, and checks that today's board is cached. It also looks
+at the realtime publisher's queue and connection, at event-loop lag over a
+recent window and at threadpool queueing (as sampled by the loop monitor),
+and at startup failures (migrations, cache warm-up).
+
+Each check grades itself `ok`, `degraded` or `not_ready` against warn/fail
+thresholds, and the worst grade wins. `degraded` still answers 200, so the
+instance keeps serving while someone looks. `not_ready` answers 503, so the
+load balancer's health check takes the instance out of rotation, but only
+after `fail_after` consecutive failing checks. Until then the report says
+`degraded`, so one slow lock wait cannot pull the only machine.
+
+The database and cache probes block, so they run on a dedicated thread with a
+timeout rather than on the default threadpool whose saturation they report.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from .logging_utils import get_logger
+
+logger = get_logger("app.readiness")
+
+OK = "ok"
+DEGRADED = "degraded"
+NOT_READY = "not_ready"
+_RANK = {OK: 0, DEGRADED: 1, NOT_READY: 2}
+
+# Probes run off the loop by probe_blocking()
+BLOCKING_CHECKS = ('db_read', 'db_write_lock', 'board_cache')
+
+
+@dataclass
+class Threshold:
+    """Latency bounds in milliseconds: >= warn is degraded, >= fail is not ready"""
+    warn_ms: float
+    fail_ms: float
+
+    def grade(self, ms: float) -> str:
+        if ms >= self.fail_ms:
+            return NOT_READY
+        if ms >= self.warn_ms:
+            return DEGRADED
+        return OK
+
+
+def _env_threshold(name: str, warn: float, fail: float) -> Threshold:
+    return Threshold(
+        float(os.getenv(f"READY_{name}_WARN_MS", str(warn))),
+        float(os.getenv(f"READY_{name}_FAIL_MS", str(fail))),
+    )
+
+
+def probe_db_read(engine: Any, threshold: Threshold) -> Dict[str, Any]:
+    from sqlalchemy import text
+
+    if engine is None:
+        return {'status': NOT_READY, 'error': 'database not initialized'}
+    started = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return {'status': NOT_READY, 'error': str(e)}
+    ms = (time.perf_counter() - started) * 1000
+    return {'status': threshold.grade(ms), 'latency_ms': round(ms, 2)}
+
+
+def probe_write_lock(engine: Any, threshold: Threshold) -> Dict[str, Any]:
+    """Time acquiring SQLite's writer lock (BEGIN IMMEDIATE, then ROLLBACK).
+
+    Gives up after the fail threshold. Other databases do not serialize
+    writers on one lock, so the check is skipped there.
+    """
+    if engine is None:
+        return {'status': NOT_READY, 'error': 'database not initialized'}
+    if engine.dialect.name != "sqlite":
+        return {'status': OK, 'skipped': True}
+    started = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            previous = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {int(threshold.fail_ms)}")
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                conn.exec_driver_sql("ROLLBACK")
+            finally:
+                conn.exec_driver_sql(f"PRAGMA busy_timeout = {int(previous or 0)}")
+    except Exception as e:
+        ms = (time.perf_counter() - started) * 1000
+        return {'status': NOT_READY, 'wait_ms': round(ms, 2), 'error': str(e).splitlines()[0]}
+    ms = (time.perf_counter() - started) * 1000
+    return {'status': threshold.grade(ms), 'wait_ms': round(ms, 2)}
+
+
+def probe_board_cache(date: str) -> Dict[str, Any]:
+    """Today's board should be in the cache (warmed at startup and by the rollover scheduler)"""
+    from .cache import get_cached_daily_board
+
+    try:
+        cached = get_cached_daily_board(date) is not None
+    except Exception as e:
+        return {'status': DEGRADED, 'date': date, 'error': str(e)}
+    return {'status': OK if cached else DEGRADED, 'date': date, 'cached': cached}
+
+
+def probe_publisher(stats: Dict[str, Any], warn_fraction: float) -> Dict[str, Any]:
+    """Realtime is optional: a backed-up or disconnected publisher only degrades"""
+    if not stats.get('enabled'):
+        return {'status': OK, 'enabled': False}
+    depth, limit = stats.get('queue_depth', 0), stats.get('max_queue') or 1
+    status = OK
+    if not stats.get('connected') or depth / limit >= warn_fraction:
+        status = DEGRADED
+    return {'status': status, 'connected': bool(stats.get('connected')), 'queue_depth': depth, 'max_queue': limit}
+
+
+def probe_loop(snapshot: Dict[str, Any], threshold: Threshold) -> Dict[str, Any]:
+    """Grade the p90 lag over the monitor's recent window, not one sample"""
+    lag_ms = snapshot.get('recent_lag_p90_seconds', 0.0) * 1000
+    waiting = snapshot.get('threadpool', {}).get('waiting', 0)
+    status = threshold.grade(lag_ms)
+    if waiting and status == OK:
+        status = DEGRADED
+    return {'status': status, 'lag_p90_ms': round(lag_ms, 2), 'threadpool_waiting': waiting}
+
+
+def probe_startup(startup: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Failed startup steps degrade: restarting elsewhere would not fix them"""
+    failed = {step: err for step, err in startup.items() if err}
+    if not failed:
+        return {'status': OK}
+    return {'status': DEGRADED, 'failed': failed}
+
+
+class ReadinessChecker:
+    """Run every probe and combine them into one report"""
+
+    def __init__(
+        self,
+        db_read: Threshold,
+        write_lock: Threshold,
+        loop_lag: Threshold,
+        publisher_queue_warn: float = 0.5,
+        fail_after: int = 3,
+    ):
+        self.db_read = db_read
+        self.write_lock = write_lock
+        self.loop_lag = loop_lag
+        self.publisher_queue_warn = publisher_queue_warn
+        self.fail_after = max(1, fail_after)
+        # Consecutive checks with a not_ready probe
+        self.failing = 0
+
+    def probe_blocking(self, engine: Any, today: str) -> Dict[str, Dict[str, Any]]:
+        """Database and cache probes (blocking; run off the event loop)"""
+        return {
+            'db_read': probe_db_read(engine, self.db_read),
+            'db_write_lock': probe_write_lock(engine, self.write_lock),
+            'board_cache': probe_board_cache(today),
+        }
+
+    def evaluate(
+        self,
+        checks: Dict[str, Dict[str, Any]],
+        publisher_stats: Dict[str, Any],
+        loop_snapshot: Dict[str, Any],
+        startup: Optional[Dict[str, Optional[str]]] = None,
+    ) -> Dict[str, Any]:
+        checks = dict(checks)
+        checks['publisher'] = probe_publisher(publisher_stats, self.publisher_queue_warn)
+        checks['event_loop'] = probe_loop(loop_snapshot, self.loop_lag)
+        if startup:
+            checks['startup'] = probe_startup(startup)
+
+        worst = max((c['status'] for c in checks.values()), key=_RANK.__getitem__)
+        self.failing = self.failing + 1 if worst == NOT_READY else 0
+        if worst == NOT_READY and self.failing < self.fail_after:
+            # Not out of rotation yet: a single bad check may be transient
+            worst = DEGRADED
+        overall = {OK: "ready", DEGRADED: "degraded", NOT_READY: "not_ready"}[worst]
+        if worst != OK:
+            logger.warning(
+                "readiness_" + overall,
+                extra={"event": {
+                    "failing": self.failing,
+                    **{name: c for name, c in checks.items() if c['status'] != OK},
+                }},
+            )
+        return {'status': overall, 'failing': self.failing, 'checks': checks}
+
+    def check(
+        self,
+        engine: Any,
+        today: str,
+        publisher_stats: Callable[[], Dict[str, Any]],
+        loop_snapshot: Callable[[], Dict[str, Any]],
+        startup: Optional[Dict[str, Optional[str]]] = None,
+    ) -> Dict[str, Any]:
+        """Run every probe on the calling thread"""
+        return self.evaluate(self.probe_blocking(engine, today), publisher_stats(), loop_snapshot(), startup)
+
+    async def check_async(
+        self,
+        engine: Any,
+        today: str,
+        publisher_stats: Callable[[], Dict[str, Any]],
+        loop_snapshot: Callable[[], Dict[str, Any]],
+        startup: Optional[Dict[str, Optional[str]]] = None,
+        executor: Optional[Executor] = None,
+        timeout: float = 3.0,
+    ) -> Dict[str, Any]:
+        """Run the blocking probes on `executor`; any not done within `timeout` are not ready"""
+        loop = asyncio.get_running_loop()
+        try:
+            checks = await asyncio.wait_for(
+                loop.run_in_executor(executor, self.probe_blocking, engine, today), timeout
+            )
+        except asyncio.TimeoutError:
+            checks = {name: {'status': NOT_READY, 'error': f"timed out after {timeout}s"} for name in BLOCKING_CHECKS}
+        return self.evaluate(checks, publisher_stats(), loop_snapshot(), startup)
+
+
+def checker_from_env() -> ReadinessChecker:
+    return ReadinessChecker(
+        db_read=_env_threshold("DB_READ", 100, 1000),
+        write_lock=_env_threshold("WRITE_LOCK", 250, 2000),
+        loop_lag=_env_threshold("LOOP_LAG", 100, 1000),
+        publisher_queue_warn=float(os.getenv("READY_PUBLISHER_QUEUE_WARN", "0.5")),
+        fail_after=int(os.getenv("READY_FAIL_AFTER", "3")),
+    )
@@ -1,63 +1,313 @@
 """
 Realtime publisher: Publishes events to NATS for the Go realtime gateway.
 If NATS is not configured, all functions are safe no-ops.
+
+Publishing never touches the network on the caller's thread or loop. Messages
+go into a bounded in-memory buffer that a single long-lived background thread
+(with its own event loop and NATS connection) drains in batches: every
+`flush_interval` it publishes whatever is buffered and flushes once per batch.
+When the buffer is full new messages are dropped and counted; when the broker
+is unreachable the thread reconnects with exponential backoff and retries the
+unsent batch.
+
+An attached outbox relay (app/outbox.py) runs as a second task on the same
+loop and connection, relaying durable events with at-least-once delivery.
 """
 from __future__ import annotations
 
 import asyncio
-import json
 import os
+import random
+import threading
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from .fastjson import dumps_bytes
+from .logging_utils import get_logger
+from .tracing import span
 
-_nc = None  # type: ignore
+logger = get_logger("app.realtime_publisher")
 
 try:
     import nats
 except Exception:  # pragma: no cover - optional dep
     nats = None  # type: ignore
 
+# (room, payload, id, ts) - serialized on the publisher thread
+_Item = Tuple[str, Dict[str, Any], str, str]
+ConnectFunc = Callable[[str], Awaitable[Any]]
 
-async def _connect_once() -> None:
-    global _nc
-    if _nc or not nats:
-        return
-    url = os.getenv("NATS_URL")
-    if not url:
-        return
-    try:
-        _nc = await nats.connect(url, name="daily-set-python")
-    except Exception:
-        _nc = None
 
+async def _nats_connect(url: str):
+    return await nats.connect(  # type: ignore[union-attr]
+        url,
+        name="daily-set-python",
+        connect_timeout=2,
+        allow_reconnect=True,
+        max_reconnect_attempts=-1,
+    )
 
-async def publish_room_update(room: str, payload: dict[str, Any]) -> None:
-    """Publish an update message to a room subject.
 
-    Subject: room.<room>.update
-    """
-    await _connect_once()
-    if not _nc:
-        return
+def _envelope(room: str, payload: Dict[str, Any], msg_id: str, ts: str) -> bytes:
     env = {
         "v": 1,
         "type": "update",
         "room": room,
-        "id": payload.get("id") or os.urandom(8).hex(),
-        "ts": datetime.now(timezone.utc).isoformat(),
+        "id": msg_id,
+        "ts": ts,
         "payload": payload,
     }
-    try:
-        await _nc.publish(f"room.{room}.update", json.dumps(env).encode("utf-8"))
-    except Exception:
-        pass
+    return dumps_bytes(env)
+
+
+class RealtimePublisher:
+    """Background NATS publisher fed by a bounded buffer"""
+
+    def __init__(
+        self,
+        url: Optional[str],
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+        flush_timeout: float = 2.0,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 30.0,
+        connect: Optional[ConnectFunc] = None,
+    ):
+        self.url = url
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_timeout = flush_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self._connect = connect or (_nats_connect if nats else None)
+        self._buffer: Deque[_Item] = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._nc = None
+        self._connected_once = False
+        self.outbox = None
+        self.stats_counters = {
+            'enqueued': 0,
+            'published': 0,
+            'dropped': 0,
+            'batches': 0,
+            'failures': 0,
+            'reconnects': 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url) and self._connect is not None
+
+    # --- producer side (any thread, never blocks) ---
+
+    def publish(self, room: str, payload: Dict[str, Any]) -> bool:
+        """Buffer a room update; return False if publishing is off or the buffer is full"""
+        if not self.enabled:
+            return False
+        with span("nats.publish", room=room) as sp:
+            item = (room, payload, payload.get("id") or os.urandom(8).hex(), datetime.now(timezone.utc).isoformat())
+            with self._lock:
+                if len(self._buffer) >= self.max_queue:
+                    self.stats_counters['dropped'] += 1
+                    sp.set("dropped", True)
+                    return False
+                self._buffer.append(item)
+                self.stats_counters['enqueued'] += 1
+                sp.set("queue_depth", len(self._buffer))
+            self._ensure_started()
+            return True
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="nats-publisher", daemon=True)
+            self._thread.start()
+
+    def start(self) -> None:
+        if self.enabled:
+            self._ensure_started()
+
+    def attach_outbox(self, relay) -> None:
+        """Run an OutboxRelay on the publisher thread (takes effect on next start)"""
+        self.outbox = relay
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Drain what is buffered (best effort within timeout) and stop the thread"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    # --- publisher thread ---
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._main())
+        except Exception as e:  # pragma: no cover - defensive
+            logger.warning("nats_publisher_crashed", extra={"error": str(e)})
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            n = min(self.batch_size, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(n)]
+
+    def _requeue(self, batch: list) -> None:
+        """Put an unsent batch back at the front, dropping what no longer fits"""
+        with self._lock:
+            room = self.max_queue - len(self._buffer)
+            keep = batch[:max(0, room)]
+            self.stats_counters['dropped'] += len(batch) - len(keep)
+            self._buffer.extendleft(reversed(keep))
+
+    async def _ensure_connected(self, backoff: float) -> float:
+        """Connect if needed; return the next backoff delay (0 once connected)"""
+        if self._nc is not None and not getattr(self._nc, "is_closed", False):
+            return 0.0
+        assert self._connect is not None and self.url
+        try:
+            self._nc = await self._connect(self.url)
+            if self._connected_once:
+                self.stats_counters['reconnects'] += 1
+            self._connected_once = True
+            logger.info("nats_publisher_connected")
+            return 0.0
+        except Exception as e:
+            self._nc = None
+            delay = min(self.backoff_max, backoff * 2 if backoff else self.backoff_initial)
+            logger.warning("nats_publisher_connect_failed", extra={"error": str(e), "event": {"retry_in": delay}})
+            return delay
+
+    async def _send(self, batch: list) -> None:
+        nc = self._nc
+        for room, payload, msg_id, ts in batch:
+            await nc.publish(f"room.{room}.update", _envelope(room, payload, msg_id, ts))
+        # One flush (PING/PONG round trip) per batch instead of per message
+        await nc.flush(timeout=self.flush_timeout)
+
+    async def send_now(self, batch: list) -> None:
+        """Publish and flush a batch on the publisher loop, raising if it is not acknowledged"""
+        if await self._ensure_connected(0.0):
+            raise ConnectionError("NATS unavailable")
+        try:
+            await self._send(batch)
+        except Exception:
+            await self._close_quietly()
+            raise
+        self.stats_counters['published'] += len(batch)
+        self.stats_counters['batches'] += 1
+
+    async def _main(self) -> None:
+        relay_task = None
+        if self.outbox is not None:
+            relay_task = asyncio.get_running_loop().create_task(self.outbox.run(self.send_now, self._stopping))
+        try:
+            await self._drain_buffer()
+        finally:
+            if relay_task is not None:
+                relay_task.cancel()
+                try:
+                    await relay_task
+                except BaseException:
+                    pass
+            await self._close_quietly()
+
+    async def _drain_buffer(self) -> None:
+        backoff = 0.0
+        while True:
+            if self._stopping.is_set() and not self._buffer:
+                break
+            if not self._buffer:
+                await asyncio.sleep(self.flush_interval)
+                continue
+            backoff = await self._ensure_connected(backoff)
+            if backoff:
+                if self._stopping.is_set():
+                    break
+                await asyncio.sleep(backoff * (0.5 + random.random() / 2))
+                continue
+            batch = self._take_batch()
+            try:
+                await self._send(batch)
+            except Exception as e:
+                self.stats_counters['failures'] += 1
+                logger.warning("nats_publish_failed", extra={"error": str(e), "event": {"batch": len(batch)}})
+                self._requeue(batch)
+                await self._close_quietly()
+                if self._stopping.is_set():
+                    break
+                backoff = self.backoff_initial
+                continue
+            self.stats_counters['published'] += len(batch)
+            self.stats_counters['batches'] += 1
+            if len(self._buffer) < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+
+    async def _close_quietly(self) -> None:
+        nc, self._nc = self._nc, None
+        if nc is None:
+            return
+        try:
+            await nc.close()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            'enabled': self.enabled,
+            'connected': self._nc is not None,
+            'queue_depth': len(self._buffer),
+            'max_queue': self.max_queue,
+            'outbox': self.outbox.stats() if self.outbox is not None else None,
+        }
+
+
+_publisher: Optional[RealtimePublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher() -> RealtimePublisher:
+    """Process-wide publisher configured from NATS_URL and NATS_PUBLISH_* settings"""
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = RealtimePublisher(
+                    os.getenv("NATS_URL"),
+                    max_queue=int(os.getenv("NATS_PUBLISH_QUEUE_SIZE", "10000")),
+                    batch_size=int(os.getenv("NATS_PUBLISH_BATCH_SIZE", "256")),
+                    flush_interval=int(os.getenv("NATS_PUBLISH_FLUSH_MS", "50")) / 1000.0,
+                )
+    return _publisher
+
+
+def configure_publisher(publisher: Optional[RealtimePublisher]) -> None:
+    """Replace the process-wide publisher (stopping the old one); None resets to env config"""
+    global _publisher
+    with _publisher_lock:
+        old, _publisher = _publisher, publisher
+    if old is not None and old is not publisher:
+        old.stop(timeout=1.0)
+
+
+async def publish_room_update(room: str, payload: dict[str, Any]) -> None:
+    """Publish an update message to a room subject.
+
+    Subject: room.<room>.update
+    """
+    get_publisher().publish(room, payload)
 
 
 def publish_room_update_sync(room: str, payload: dict[str, Any]) -> None:
-    """Sync helper that runs the async publisher. Safe if no loop or NATS."""
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        asyncio.run(publish_room_update(room, payload))
-        return
-    loop.create_task(publish_room_update(room, payload))
+    """Buffer an update for the background publisher. Safe if no loop or NATS."""
+    get_publisher().publish(room, payload)
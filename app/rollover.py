@@ -0,0 +1,187 @@
+"""
+Daily rollover scheduler for Daily Set application.
+Warms the next UTC day's board ahead of midnight, resets per-day state when the
+day changes and snapshots the finished day's final leaderboard.
+"""
+
+import os
+import threading
+from datetime import date as date_cls, datetime, time as dtime, timedelta, timezone
+from typing import Callable, List, Optional, Set, Tuple
+
+from .logging_utils import get_logger
+
+logger = get_logger("app.rollover")
+
+# Hooks called as hook(finished_date, new_date) when the UTC day changes
+RolloverHook = Callable[[str, str], None]
+_ROLLOVER_HOOKS: List[RolloverHook] = []
+
+
+def register_rollover_hook(hook: RolloverHook) -> None:
+    """Register a callback that resets per-day in-memory state at UTC midnight"""
+    if hook not in _ROLLOVER_HOOKS:
+        _ROLLOVER_HOOKS.append(hook)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _midnight(day: date_cls) -> datetime:
+    return datetime.combine(day, dtime.min, tzinfo=timezone.utc)
+
+
+def prewarm_day(date: str) -> None:
+    """Generate and cache the board for an upcoming date"""
+    from .cache import warm_daily_board_cache
+
+    warm_daily_board_cache([date])
+    logger.info("rollover_prewarm", extra={"event": {"date": date}})
+
+
+def rollover_day(finished_date: str, new_date: str) -> None:
+    """Drop the finished day's hot keys and reset per-day in-memory structures"""
+    from .cache import (
+        invalidate_daily_board_cache,
+        invalidate_leaderboard_cache,
+        cleanup_cache_periodically,
+        warm_daily_board_cache,
+    )
+
+    # Make sure the new day is warm even if the prewarm window was missed
+    warm_daily_board_cache([new_date])
+    invalidate_leaderboard_cache(finished_date)
+    invalidate_daily_board_cache(finished_date)
+    cleanup_cache_periodically()
+    for hook in list(_ROLLOVER_HOOKS):
+        try:
+            hook(finished_date, new_date)
+        except Exception as e:
+            logger.warning("rollover_hook_failed", extra={"error": str(e)})
+    logger.info("rollover_day", extra={"event": {"finished": finished_date, "new": new_date}})
+
+
+def finalize_day(date: str) -> Optional[list]:
+    """Snapshot the final leaderboard for a finished date into the DB and cache"""
+    from sqlmodel import Session as SQLSession
+    from . import crud
+    from .cache import cache_final_leaderboard, invalidate_leaderboard_cache
+
+    if crud.engine is None:
+        return None
+    with SQLSession(crud.engine) as s:
+        leaders = crud.get_leaderboard_snapshot(s, date)
+        if leaders is None:
+            leaders = crud.get_leaderboard(s, date, limit=None)
+            crud.save_leaderboard_snapshot(s, date, leaders)
+    cache_final_leaderboard(date, leaders)
+    invalidate_leaderboard_cache(date)
+    logger.info("rollover_finalize", extra={"event": {"date": date, "rows": len(leaders)}})
+    return leaders
+
+
+class RolloverScheduler:
+    """In-process scheduler driving the UTC-midnight rollover jobs.
+
+    - prewarm: cache tomorrow's board `prewarm_lead_seconds` before midnight
+    - rollover: at midnight, drop yesterday's hot keys and run rollover hooks
+    - finalize: `finalize_grace_seconds` after midnight, snapshot yesterday's
+      leaderboard (the grace period lets in-flight sessions finish)
+    """
+
+    def __init__(
+        self,
+        prewarm_lead_seconds: int = 300,
+        finalize_grace_seconds: int = 3600,
+        clock: Callable[[], datetime] = _utc_now,
+    ):
+        self.prewarm_lead_seconds = prewarm_lead_seconds
+        self.finalize_grace_seconds = finalize_grace_seconds
+        self._clock = clock
+        self._done: Set[Tuple[str, str]] = set()
+        self._current_day: Optional[date_cls] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run_once(self, job: str, date: str, fn: Callable[[], object]) -> None:
+        key = (job, date)
+        if key in self._done:
+            return
+        try:
+            fn()
+            self._done.add(key)
+        except Exception as e:
+            logger.warning("rollover_job_failed", extra={"error": str(e), "event": {"job": job, "date": date}})
+
+    def tick(self, now: Optional[datetime] = None) -> float:
+        """Run any due jobs; return seconds until the next job is due"""
+        now = now or self._clock()
+        today = now.date()
+        tomorrow = today + timedelta(days=1)
+        yesterday = today - timedelta(days=1)
+        next_midnight = _midnight(tomorrow)
+        prewarm_at = next_midnight - timedelta(seconds=self.prewarm_lead_seconds)
+        finalize_at = _midnight(today) + timedelta(seconds=self.finalize_grace_seconds)
+
+        if self._current_day is not None and self._current_day != today:
+            finished = self._current_day
+            self._run_once("rollover", today.isoformat(), lambda: rollover_day(finished.isoformat(), today.isoformat()))
+        self._current_day = today
+
+        if now >= prewarm_at:
+            self._run_once("prewarm", tomorrow.isoformat(), lambda: prewarm_day(tomorrow.isoformat()))
+        if now >= finalize_at:
+            self._run_once("finalize", yesterday.isoformat(), lambda: finalize_day(yesterday.isoformat()))
+
+        # Forget bookkeeping for days that can no longer be scheduled
+        self._done = {k for k in self._done if k[1] >= yesterday.isoformat()}
+
+        upcoming = [t for t in (prewarm_at, next_midnight, finalize_at) if t > now]
+        return max(0.0, (min(upcoming) - now).total_seconds())
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                wait = self.tick()
+            except Exception as e:
+                logger.warning("rollover_tick_failed", extra={"error": str(e)})
+                wait = 60.0
+            # Wake at least once a minute so clock jumps are noticed promptly
+            self._stop.wait(min(wait, 60.0) + 0.01)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="daily-rollover", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+_scheduler: Optional[RolloverScheduler] = None
+
+
+def start_rollover_scheduler() -> Optional[RolloverScheduler]:
+    """Start the global rollover scheduler unless disabled via DAILY_ROLLOVER=0"""
+    global _scheduler
+    if os.getenv("DAILY_ROLLOVER", "1") in ("0", "false", "False"):
+        return None
+    if _scheduler is None:
+        _scheduler = RolloverScheduler(
+            prewarm_lead_seconds=int(os.getenv("ROLLOVER_PREWARM_SECONDS", "300")),
+            finalize_grace_seconds=int(os.getenv("ROLLOVER_FINALIZE_GRACE_SECONDS", "3600")),
+        )
+    _scheduler.start()
+    return _scheduler
+
+
+def stop_rollover_scheduler() -> None:
+    """Stop the global rollover scheduler if running"""
+    if _scheduler is not None:
+        _scheduler.stop()
@@ -0,0 +1,234 @@
+"""
+SQL statement instrumentation for Daily Set application.
+
+SQLAlchemy cursor-execute hooks on the engine time every statement. Each one
+feeds the `daily_set_db_query_duration_seconds` histogram and, while an HTTP
+request is in flight, that request's query count and time. The request's
+record lives in a context variable, not a table keyed by the client-supplied
+X-Request-ID, so concurrent requests never share one (sync handlers run in
+the threadpool with a copy of the request's context, so it is visible there).
+
+RequestLoggingMiddleware opens the per-request record with `begin_request()`
+and closes it with `finish_request()`, which adds `db_queries`/`db_ms` to the
+request log line, flags requests over the query budget and reports
+statements repeated within one request (the usual N+1 shape). Statements
+slower than the slow-query threshold are folded into normalized fingerprints
+(literals replaced by `?`), kept in a bounded table for `/api/db/stats`.
+"""
+
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from .logging_utils import get_logger
+from .metrics import DB_QUERY_SECONDS, REGISTRY
+from .tracing import record_span
+
+logger = get_logger("app.sqlmon")
+
+QUERIES_PER_REQUEST = REGISTRY.histogram(
+    "db_queries_per_request",
+    "SQL statements executed per HTTP request by route template",
+    ("route",),
+    (1, 2, 5, 10, 20, 50, 100),
+)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a statement so executions differing only in literals compare equal"""
+    fp = _STRING.sub("?", statement)
+    fp = _NUMBER.sub("?", fp)
+    fp = _IN_LIST.sub("(?+)", fp)
+    return _SPACE.sub(" ", fp).strip()
+
+
+def _operation(statement: str) -> str:
+    head = statement.lstrip()[:8].split(None, 1)
+    op = head[0].lower() if head else ""
+    return op if op in ("select", "insert", "update", "delete", "with") else "other"
+
+
+class RequestQueries:
+    """Statements executed on behalf of one request"""
+
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # statement text -> executions; identical text means the same query
+        # with different bound parameters
+        self.statements: Dict[str, int] = {}
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, threshold: int) -> List[Dict[str, Any]]:
+        return [
+            {"fingerprint": fingerprint(stmt), "count": n}
+            for stmt, n in sorted(self.statements.items(), key=lambda kv: -kv[1])
+            if n >= threshold
+        ]
+
+
+class QueryMonitor:
+    """Engine hooks plus the per-request and slow-query bookkeeping behind them"""
+
+    def __init__(
+        self,
+        query_budget: int = 25,
+        repeat_threshold: int = 5,
+        slow_ms: float = 0.0,
+        max_fingerprints: int = 200,
+    ):
+        self.query_budget = query_budget
+        self.repeat_threshold = repeat_threshold
+        self.slow_seconds = slow_ms / 1000.0
+        self.max_fingerprints = max_fingerprints
+        self._current: ContextVar[Optional[RequestQueries]] = ContextVar("sql_request_queries", default=None)
+        self._in_flight = 0
+        self._slow: Dict[str, Dict[str, Any]] = {}
+        self._slow_lock = threading.Lock()
+        self.stats_counters = {
+            'requests_over_budget': 0,
+            'requests_with_repeats': 0,
+            'slow_queries': 0,
+            'slow_fingerprints_dropped': 0,
+        }
+
+    # -- engine hooks ---------------------------------------------------------
+
+    def instrument(self, engine: Any) -> None:
+        """Attach cursor-execute hooks to an engine (idempotent)"""
+        from sqlalchemy import event
+
+        if getattr(engine, "_daily_set_sqlmon", False):
+            return
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        engine._daily_set_sqlmon = True
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._daily_set_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started: Optional[float] = getattr(context, "_daily_set_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        operation = _operation(statement)
+        DB_QUERY_SECONDS.observe(elapsed, (operation,))
+        record_span("db.query", elapsed, operation=operation, statement=statement[:300])
+        current = self._current.get()
+        if current is not None:
+            current.record(statement, elapsed)
+        if self.slow_seconds and elapsed >= self.slow_seconds:
+            self._record_slow(statement, elapsed)
+
+    def _record_slow(self, statement: str, elapsed: float) -> None:
+        fp = fingerprint(statement)
+        with self._slow_lock:
+            self.stats_counters['slow_queries'] += 1
+            entry = self._slow.get(fp)
+            if entry is None:
+                if len(self._slow) >= self.max_fingerprints:
+                    self.stats_counters['slow_fingerprints_dropped'] += 1
+                    return
+                entry = self._slow[fp] = {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            entry['count'] += 1
+            entry['total_seconds'] += elapsed
+            if elapsed > entry['max_seconds']:
+                entry['max_seconds'] = elapsed
+        logger.warning(
+            "slow_query",
+            extra={"event": {"fingerprint": fp, "duration_ms": round(elapsed * 1000, 1)}},
+        )
+
+    # -- per-request lifecycle ------------------------------------------------
+
+    def begin_request(self) -> RequestQueries:
+        """Start counting statements executed in the current context (and copies of it)"""
+        queries = RequestQueries()
+        self._current.set(queries)
+        self._in_flight += 1
+        return queries
+
+    def finish_request(self, queries: RequestQueries, route: str, method: Optional[str] = None) -> RequestQueries:
+        """Close the request's record; warn if it blew the budget or repeated statements"""
+        if self._current.get() is queries:
+            self._current.set(None)
+        self._in_flight -= 1
+        if queries.count == 0:
+            return queries
+        QUERIES_PER_REQUEST.observe(queries.count, (route,))
+        over_budget = self.query_budget and queries.count > self.query_budget
+        repeated = queries.repeated(self.repeat_threshold) if self.repeat_threshold else []
+        if over_budget:
+            self.stats_counters['requests_over_budget'] += 1
+        if repeated:
+            self.stats_counters['requests_with_repeats'] += 1
+        if over_budget or repeated:
+            logger.warning(
+                "query_budget_exceeded" if over_budget else "repeated_queries",
+                extra={
+                    "method": method,
+                    "event": {
+                        "route": route,
+                        "queries": queries.count,
+                        "db_ms": round(queries.seconds * 1000, 1),
+                        "budget": self.query_budget,
+                        "repeated": repeated[:5],
+                    },
+                },
+            )
+        return queries
+
+    def slow_queries(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._slow_lock:
+            items = [(fp, dict(v)) for fp, v in self._slow.items()]
+        items.sort(key=lambda kv: -kv[1]['total_seconds'])
+        return [
+            {
+                'fingerprint': fp,
+                'count': v['count'],
+                'total_ms': round(v['total_seconds'] * 1000, 1),
+                'max_ms': round(v['max_seconds'] * 1000, 1),
+            }
+            for fp, v in items[:limit]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            'in_flight_requests': self._in_flight,
+            'query_budget': self.query_budget,
+            'repeat_threshold': self.repeat_threshold,
+            'slow_query_ms': self.slow_seconds * 1000,
+            'slow_fingerprints': len(self._slow),
+        }
+
+
+def _monitor_from_env() -> QueryMonitor:
+    return QueryMonitor(
+        query_budget=int(os.getenv("SQL_QUERY_BUDGET", "25")),
+        repeat_threshold=int(os.getenv("SQL_REPEAT_THRESHOLD", "5")),
+        slow_ms=float(os.getenv("SQL_SLOW_QUERY_MS", "0")),
+    )
+
+
+QUERY_MONITOR = _monitor_from_env()
+
+
+def instrument_engine(engine: Any) -> None:
+    """Time every statement executed through a SQLAlchemy engine (idempotent)"""
+    QUERY_MONITOR.instrument(engine)
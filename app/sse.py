@@ -0,0 +1,220 @@
+"""
+Server-Sent Events fan-out for Daily Set application.
+
+`/api/events` is a receive-only alternative to `/ws`: the same broadcast
+pipeline that feeds WebSocket clients also appends every message to an
+SSEHub. The hub keeps a ring buffer of recent messages so a reconnecting
+client that sends `Last-Event-ID` gets what it missed instead of refetching;
+if the id is too old (or from another process, see `epoch`) it gets a `reset`
+event and should refetch.
+
+Subscribers get a bounded queue like WebSocket connections do; one that falls
+too far behind has its stream ended and resumes from the ring buffer on its
+automatic reconnect. Admission is capped globally and per client IP with the
+same limits as WebSocket connections, so streams cannot be used to get around
+them.
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from .logging_utils import get_logger
+
+logger = get_logger("app.sse")
+
+# (seq, room, data)
+_Entry = Tuple[int, Optional[str], str]
+
+
+class _Subscriber:
+    __slots__ = ('room', 'ip', 'pending', 'wakeup', 'overflowed')
+
+    def __init__(self, room: Optional[str], ip: Optional[str] = None):
+        self.room = room
+        self.ip = ip
+        self.pending: Deque[_Entry] = deque()
+        self.wakeup = asyncio.Event()
+        self.overflowed = False
+
+
+class SSEHub:
+    """Room-scoped SSE subscribers plus a ring buffer of recent messages for resume"""
+
+    def __init__(self, history: int = 512, queue_size: int = 256, max_subscribers: int = 0, max_per_ip: int = 0):
+        self.queue_size = queue_size
+        # Admission caps (0 = unlimited)
+        self.max_subscribers = max_subscribers
+        self.max_per_ip = max_per_ip
+        self._per_ip: Dict[str, int] = {}
+        # Ids restart with the process; the epoch prefix makes stale ids detectable
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._history: Deque[_Entry] = deque(maxlen=history)
+        self._subs: Dict[Optional[str], Set[_Subscriber]] = {}
+        # room -> last seq at the time its history was dropped (resume before it resets)
+        self._dropped: Dict[str, int] = {}
+        self.stats_counters = {
+            'published': 0,
+            'delivered': 0,
+            'overflows': 0,
+            'resumes': 0,
+            'resets': 0,
+            'rejected_global': 0,
+            'rejected_per_ip': 0,
+        }
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.epoch}-{seq}"
+
+    def publish(self, data: str, room: Optional[str] = None) -> int:
+        """Record a pre-serialized message and wake matching subscribers; return its seq"""
+        self._seq += 1
+        entry = (self._seq, room, data)
+        self._history.append(entry)
+        self.stats_counters['published'] += 1
+        targets = list(self._subs.get(None, ()))
+        if room is not None:
+            targets.extend(self._subs.get(room, ()))
+        else:
+            # Undated events go to everyone
+            for r, subs in self._subs.items():
+                if r is not None:
+                    targets.extend(subs)
+        for sub in targets:
+            if len(sub.pending) >= self.queue_size:
+                if not sub.overflowed:
+                    sub.overflowed = True
+                    self.stats_counters['overflows'] += 1
+                sub.wakeup.set()
+                continue
+            sub.pending.append(entry)
+            sub.wakeup.set()
+        return self._seq
+
+    def admit(self, ip: Optional[str]) -> Optional[str]:
+        """Reason a new stream from ip must be refused, or None to accept it.
+
+        Call subscribe() without awaiting in between so the caps cannot be raced.
+        """
+        if self.max_subscribers and self.subscriber_count() >= self.max_subscribers:
+            self.stats_counters['rejected_global'] += 1
+            return "global_limit"
+        if self.max_per_ip and ip and self._per_ip.get(ip, 0) >= self.max_per_ip:
+            self.stats_counters['rejected_per_ip'] += 1
+            return "per_ip_limit"
+        return None
+
+    def subscribe(self, room: Optional[str], ip: Optional[str] = None) -> _Subscriber:
+        sub = _Subscriber(room, ip)
+        self._subs.setdefault(room, set()).add(sub)
+        if ip:
+            self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        """Remove a subscriber (safe to call more than once)"""
+        subs = self._subs.get(sub.room)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subs[sub.room]
+        if sub.ip:
+            left = self._per_ip.get(sub.ip, 0) - 1
+            if left > 0:
+                self._per_ip[sub.ip] = left
+            else:
+                self._per_ip.pop(sub.ip, None)
+
+    def replay(self, last_event_id: str, room: Optional[str]) -> Optional[List[_Entry]]:
+        """Entries after last_event_id visible to room, or None if they are no longer available"""
+        epoch, _, seq_s = last_event_id.partition('-')
+        try:
+            seq = int(seq_s)
+        except ValueError:
+            return None
+        if epoch != self.epoch or seq > self._seq:
+            return None
+        if self._history and seq < self._history[0][0] - 1:
+            return None
+        if any(seq < dropped_at for r, dropped_at in self._dropped.items() if room in (None, r)):
+            return None
+        return [e for e in self._history if e[0] > seq and (room is None or e[1] in (None, room))]
+
+    def drop_room(self, room: str) -> int:
+        """Drop a finished room's messages from the resume buffer; returns how many"""
+        kept = deque((e for e in self._history if e[1] != room), maxlen=self._history.maxlen)
+        dropped = len(self._history) - len(kept)
+        self._history = kept
+        self._dropped[room] = self._seq
+        while len(self._dropped) > 8:
+            del self._dropped[next(iter(self._dropped))]
+        return dropped
+
+    def format(self, entry: _Entry) -> str:
+        return f"id: {self.event_id(entry[0])}\ndata: {entry[2]}\n\n"
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            'subscribers': self.subscriber_count(),
+            'history': len(self._history),
+            'last_id': self.event_id(self._seq),
+            'max_subscribers': self.max_subscribers,
+            'max_per_ip': self.max_per_ip,
+        }
+
+
+async def sse_stream(
+    hub: SSEHub,
+    room: Optional[str],
+    last_event_id: Optional[str] = None,
+    heartbeat_seconds: float = 15.0,
+    retry_ms: int = 3000,
+    sub: Optional[_Subscriber] = None,
+) -> AsyncIterator[str]:
+    """Yield SSE frames for one client: resume, then live messages with heartbeat comments.
+
+    Pass `sub` when the caller subscribed already (to admit before responding);
+    it is unsubscribed when the stream ends either way.
+    """
+    if sub is None:
+        sub = hub.subscribe(room)
+    try:
+        yield f"retry: {retry_ms}\n\n"
+        replayed = 0
+        if last_event_id:
+            missed = hub.replay(last_event_id, room)
+            if missed is None:
+                hub.stats_counters['resets'] += 1
+                yield "event: reset\ndata: {}\n\n"
+            else:
+                hub.stats_counters['resumes'] += 1
+                for entry in missed:
+                    replayed = entry[0]
+                    yield hub.format(entry)
+        while True:
+            if not sub.pending and not sub.overflowed:
+                sub.wakeup.clear()
+                try:
+                    await asyncio.wait_for(sub.wakeup.wait(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+            while sub.pending:
+                entry = sub.pending.popleft()
+                if entry[0] <= replayed:
+                    continue
+                hub.stats_counters['delivered'] += 1
+                yield hub.format(entry)
+            if sub.overflowed:
+                # Too far behind: end the stream; the client resumes via Last-Event-ID
+                logger.info("sse_subscriber_overflow", extra={"event": {"room": room}})
+                return
+    finally:
+        hub.unsubscribe(sub)
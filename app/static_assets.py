@@ -0,0 +1,265 @@
+"""
+In-memory static asset serving for Daily Set application.
+
+At startup the built frontend (`static/dist`) and the root files next to it
+(icons, robots.txt, sitemap.xml, manifests, styles.css) are read into memory
+once, together with precompressed gzip and (if the optional `brotli` package
+is installed) brotli variants of text assets. Prebuilt `.gz`/`.br` files next
+to an asset are used as-is. A pure-ASGI middleware answers GET/HEAD for
+those paths straight from memory: no disk access, no per-hit compression,
+no routing. Nothing is read on the request path: until the startup load
+succeeds, requests go to the regular routes.
+
+Caching: content-hashed files under `dist/assets/` are `immutable` for a
+year; everything else (index.html, icons, manifests) revalidates with its
+ETag, and `If-None-Match` gets a body-less 304.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .logging_utils import get_logger
+
+logger = get_logger("app.static_assets")
+
+try:
+    import brotli
+except Exception:  # pragma: no cover - optional dep
+    brotli = None  # type: ignore
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+SHORT = "public, max-age=86400"
+
+# Worth compressing; everything else (images, fonts, .ico) is served as-is
+_COMPRESSIBLE = {
+    "text/html", "text/css", "text/javascript", "application/javascript", "application/json",
+    "application/manifest+json", "application/xml", "text/xml", "text/plain", "image/svg+xml",
+}
+_MEDIA_TYPES = {
+    ".webmanifest": "application/manifest+json",
+    ".ico": "image/x-icon",
+    ".js": "text/javascript",
+    ".mjs": "text/javascript",
+    ".map": "application/json",
+    ".xml": "application/xml",
+}
+# Root-level URLs served by the explicit routes in main.py -> file under static/
+ROOT_FILES = {
+    "/robots.txt": ("robots.txt",),
+    "/sitemap.xml": ("sitemap.xml",),
+    "/site.webmanifest": ("site.webmanifest",),
+    "/manifest.webmanifest": ("manifest.webmanifest", "site.webmanifest"),
+    "/android-chrome-192x192.png": ("android-chrome-192x192.png",),
+    "/android-chrome-512x512.png": ("android-chrome-512x512.png",),
+    "/apple-touch-icon.png": ("apple-touch-icon.png",),
+    "/favicon-16x16.png": ("favicon-16x16.png",),
+    "/favicon-32x32.png": ("favicon-32x32.png",),
+    "/favicon.ico": ("favicon.ico",),
+}
+
+
+def media_type_for(path: Path) -> str:
+    mt = _MEDIA_TYPES.get(path.suffix.lower()) or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if mt.startswith("text/") or mt in ("application/javascript", "application/json", "application/manifest+json", "application/xml"):
+        return f"{mt}; charset=utf-8"
+    return mt
+
+
+class StaticAsset:
+    """One file's bytes, compressed variants and precomputed response headers"""
+
+    __slots__ = ('variants', 'etags', 'not_modified_headers')
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str,
+                 gz: Optional[bytes] = None, br: Optional[bytes] = None):
+        tag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        compressible = gz is not None or br is not None
+        common: RawHeaders = [(b"cache-control", cache_control.encode("latin-1"))]
+        if compressible:
+            common.append((b"vary", b"Accept-Encoding"))
+        # encoding -> (body, headers); "" is the identity representation
+        self.variants: Dict[str, Tuple[bytes, RawHeaders]] = {}
+        self.etags = set()
+        for encoding, data in (("br", br), ("gzip", gz), ("", body)):
+            if data is None:
+                continue
+            etag = f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+            self.etags.add(etag)
+            headers = [
+                (b"content-type", media_type.encode("latin-1")),
+                (b"content-length", str(len(data)).encode("latin-1")),
+                (b"etag", etag.encode("latin-1")),
+                *common,
+            ]
+            if encoding:
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+            self.variants[encoding] = (data, headers)
+        self.not_modified_headers = common
+
+    def select(self, accept_encoding: str) -> Tuple[bytes, RawHeaders]:
+        if len(self.variants) > 1 and accept_encoding:
+            accepted = _accepted_encodings(accept_encoding)
+            for encoding in ("br", "gzip"):
+                if encoding in self.variants and encoding in accepted:
+                    return self.variants[encoding]
+        return self.variants[""]
+
+    def matches(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in self.etags:
+                return True
+        return False
+
+
+def _accepted_encodings(header: str) -> set:
+    """Content codings the client accepts (q > 0); '*' stands for any"""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(name.strip().lower())
+    if "*" in accepted:
+        accepted.update(("br", "gzip"))
+    return accepted
+
+
+class StaticAssetCache:
+    """URL path -> StaticAsset, loaded from the static directory"""
+
+    def __init__(self, root: Path, min_compress_size: int = 512, max_file_bytes: int = 5 * 1024 * 1024):
+        self.root = Path(root)
+        self.min_compress_size = min_compress_size
+        self.max_file_bytes = max_file_bytes
+        self.assets: Dict[str, StaticAsset] = {}
+        self.loaded = False
+        self.total_bytes = 0
+
+    def _compress(self, path: Path, body: bytes, media_type: str) -> Tuple[Optional[bytes], Optional[bytes]]:
+        if media_type.split(";")[0] not in _COMPRESSIBLE or len(body) < self.min_compress_size:
+            return None, None
+        gz_path, br_path = path.with_name(path.name + ".gz"), path.with_name(path.name + ".br")
+        gz = gz_path.read_bytes() if gz_path.is_file() else gzip.compress(body, compresslevel=9, mtime=0)
+        br: Optional[bytes] = None
+        if br_path.is_file():
+            br = br_path.read_bytes()
+        elif brotli is not None:
+            br = brotli.compress(body, quality=11)
+        # Keep a variant only if it actually saves bytes
+        return (gz if len(gz) < len(body) else None), (br if br is not None and len(br) < len(body) else None)
+
+    def _load_file(self, path: Path, cache_control: str) -> Optional[StaticAsset]:
+        try:
+            if path.stat().st_size > self.max_file_bytes:
+                return None
+            body = path.read_bytes()
+        except OSError:
+            return None
+        media_type = media_type_for(path)
+        gz, br = self._compress(path, body, media_type)
+        self.total_bytes += len(body) + len(gz or b"") + len(br or b"")
+        return StaticAsset(body, media_type, cache_control, gz, br)
+
+    def load(self) -> int:
+        """(Re)load every servable file; return how many paths are cached"""
+        assets: Dict[str, StaticAsset] = {}
+        self.total_bytes = 0
+        if self.root.is_dir():
+            for path in sorted(self.root.rglob("*")):
+                if not path.is_file() or path.suffix in (".gz", ".br"):
+                    continue
+                rel = path.relative_to(self.root).as_posix()
+                if rel.startswith("dist/assets/"):
+                    cache_control = IMMUTABLE
+                elif rel.endswith(".html"):
+                    cache_control = REVALIDATE
+                else:
+                    cache_control = SHORT
+                asset = self._load_file(path, cache_control)
+                if asset is not None:
+                    assets[f"/static/{rel}"] = asset
+            index = assets.get("/static/dist/index.html")
+            if index is not None:
+                assets["/"] = index
+            for url, candidates in ROOT_FILES.items():
+                for name in candidates:
+                    asset = assets.get(f"/static/{name}")
+                    if asset is not None:
+                        assets[url] = asset
+                        break
+        self.assets = assets
+        self.loaded = True
+        logger.info("static_assets_loaded", extra={"event": {"paths": len(assets), "bytes": self.total_bytes}})
+        return len(assets)
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'paths': len(self.assets),
+            'bytes': self.total_bytes,
+            'brotli': brotli is not None,
+        }
+
+
+class StaticAssetMiddleware:
+    """Answer GET/HEAD for cached static paths from memory; pass everything else through"""
+
+    def __init__(self, app: ASGIApp, cache: StaticAssetCache, enabled: bool = True):
+        self.app = app
+        self.cache = cache
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.enabled or scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        # Loaded once at startup; reading files here would block the event loop,
+        # so an unloaded cache (no lifespan, or a failed load) leaves every path
+        # to the app's own routes
+        asset = self.cache.get(scope["path"]) if self.cache.loaded else None
+        if asset is None:
+            await self.app(scope, receive, send)
+            return
+        if_none_match = accept_encoding = ""
+        for name, value in scope.get("headers") or ():
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+            elif name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        scope["route_template"] = "static"
+        if if_none_match and asset.matches(if_none_match):
+            body, headers = asset.select(accept_encoding)
+            etag = [h for h in headers if h[0] == b"etag"]
+            await send({"type": "http.response.start", "status": 304, "headers": etag + asset.not_modified_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        body, headers = asset.select(accept_encoding)
+        await send({"type": "http.response.start", "status": 200, "headers": list(headers)})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+
+def static_cache_enabled() -> bool:
+    return os.getenv("STATIC_CACHE", "1") not in ("0", "false", "False")
@@ -0,0 +1,321 @@
+"""
+Lightweight request tracing for Daily Set application.
+
+Spans are kept in a context variable, so a span opened in the middleware is
+the parent of spans opened further down the same request: in dependencies,
+crud, the cache, and the broadcast path. That includes sync handlers, which
+run in the threadpool with a copy of the request's context. A trace id is
+derived from the request id in `request_id_ctx`, so traces and log lines
+correlate. Finished spans are written by a background thread to TRACE_FILE
+as Zipkin v2 JSON, one span per line. To load them into Zipkin, post them
+as one array:
+
+    jq -s . traces.jsonl | curl -H 'Content-Type: application/json' \\
+        --data @- http://localhost:9411/api/v2/spans
+
+Tracing is off unless TRACE_FILE is set. When it is off, or when a request
+was not sampled (TRACE_SAMPLE_RATE), every helper returns a shared no-op
+span after a single context-variable lookup.
+"""
+
+import atexit
+import functools
+import hashlib
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+
+from .fastjson import dumps
+from .logging_utils import get_logger
+
+logger = get_logger("app.tracing")
+
+SERVICE_NAME = "daily-set"
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def trace_id_for(request_id: str) -> str:
+    """32-hex trace id: the request id itself when it is a UUID, else a hash of it"""
+    try:
+        return uuid.UUID(request_id).hex
+    except ValueError:
+        return hashlib.sha256(request_id.encode()).hexdigest()[:32]
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+class Span:
+    """One timed operation; use as a context manager or call end() explicitly"""
+
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "kind", "timestamp_us",
+                 "duration_us", "tags", "_t0", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], tags: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.kind: Optional[str] = None
+        self.timestamp_us = time.time_ns() // 1000
+        self.duration_us: Optional[int] = None
+        self.tags = tags
+        self._t0 = time.perf_counter()
+        self._token = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.tags[key] = value
+
+    def activate(self) -> "Span":
+        """Make this the current span (children attach to it) until end()"""
+        self._token = _current.set(self)
+        return self
+
+    def end(self) -> None:
+        if self.duration_us is not None:
+            return
+        self.duration_us = max(1, int((time.perf_counter() - self._t0) * 1_000_000))
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Ended from another context (e.g. a different worker thread)
+                pass
+            self._token = None
+        self.tracer.export(self)
+
+    def __enter__(self) -> "Span":
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.tags["error"] = exc_type.__name__
+        self.end()
+
+    def to_zipkin(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": self.timestamp_us,
+            "duration": self.duration_us,
+            "localEndpoint": {"serviceName": self.tracer.service},
+            "tags": {k: str(v) for k, v in self.tags.items() if v is not None},
+        }
+        if self.parent_id:
+            out["parentId"] = self.parent_id
+        if self.kind:
+            out["kind"] = self.kind
+        return out
+
+
+class _NoopSpan:
+    """Stand-in when the request is not traced"""
+
+    __slots__ = ()
+
+    name = ""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def activate(self) -> "_NoopSpan":
+        return self
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+AnySpan = Union[Span, _NoopSpan]
+
+
+class FileSpanExporter:
+    """Queue finished spans and append them to a file from a background thread"""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            span = self._queue.get()
+            if span is None:
+                return
+            batch = [span]
+            # Write whatever else is already queued in the same call
+            while len(batch) < 512:
+                try:
+                    span = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._write(batch)
+                    return
+                batch.append(span)
+            self._write(batch)
+
+    def _write(self, batch) -> None:
+        try:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write("".join(dumps(s.to_zipkin()) + "\n" for s in batch))
+            self.written += len(batch)
+        except OSError as e:
+            self.dropped += len(batch)
+            logger.warning("trace_export_failed", extra={"error": str(e)})
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Flush queued spans and stop the writer thread"""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+
+
+class Tracer:
+    """Creates spans; exports them when an exporter is configured"""
+
+    def __init__(self, exporter: Optional[Any] = None, sample_rate: float = 1.0, service: str = SERVICE_NAME):
+        self.exporter = exporter
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.service = service
+        self.stats_counters = {'traces': 0, 'spans': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def export(self, span: Span) -> None:
+        self.stats_counters['spans'] += 1
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def start_trace(self, name: str, request_id: str) -> AnySpan:
+        """Root span for a request (already current), or NOOP_SPAN if not sampled"""
+        if self.exporter is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        self.stats_counters['traces'] += 1
+        root = Span(self, name, trace_id_for(request_id), None, {"request_id": request_id})
+        root.kind = "SERVER"
+        return root.activate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'dropped': getattr(self.exporter, 'dropped', 0),
+            'written': getattr(self.exporter, 'written', 0),
+        }
+
+    def close(self) -> None:
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def configure_tracer(tracer: Tracer) -> Tracer:
+    """Swap the process-wide tracer (closing the old one's exporter)"""
+    global _tracer
+    old, _tracer = _tracer, tracer
+    if old is not tracer:
+        old.close()
+    return tracer
+
+
+def tracer_from_env() -> Tracer:
+    """TRACE_FILE enables tracing; TRACE_SAMPLE_RATE picks the fraction of requests traced"""
+    path = os.getenv("TRACE_FILE")
+    if not path:
+        return Tracer()
+    exporter = FileSpanExporter(path, max_queue=int(os.getenv("TRACE_QUEUE_SIZE", "10000")))
+    return Tracer(exporter, sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1")))
+
+
+atexit.register(lambda: _tracer.close())
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_trace(name: str, request_id: str) -> AnySpan:
+    return _tracer.start_trace(name, request_id)
+
+
+def span(name: str, parent: Optional[Span] = None, **tags: Any) -> AnySpan:
+    """Child span of `parent` (default: the current span).
+
+    As a context manager it is current for the with-block. Otherwise it is
+    never made current and must be end()ed explicitly. That suits spans
+    opened and closed in different contexts, such as generator dependencies,
+    whose setup and teardown run as separate threadpool calls.
+    """
+    parent = parent or _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.tracer, name, parent.trace_id, parent.span_id, tags)
+
+
+def record_span(name: str, seconds: float, **tags: Any) -> None:
+    """Record an already-finished child span that ended just now"""
+    parent = _current.get()
+    if parent is None:
+        return
+    s = Span(parent.tracer, name, parent.trace_id, parent.span_id, tags)
+    s.timestamp_us -= int(seconds * 1_000_000)
+    s.duration_us = max(1, int(seconds * 1_000_000))
+    parent.tracer.export(s)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator: run the function inside a child span (named module.function by default)"""
+
+    def decorate(fn: F) -> F:
+        label = name or f"{fn.__module__.rpartition('.')[2]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None:
+                return fn(*args, **kwargs)
+            with Span(parent.tracer, label, parent.trace_id, parent.span_id, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
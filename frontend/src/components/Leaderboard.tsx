@@ -2,6 +2,8 @@ import React, { useCallback, useEffect, useRef, useState } from 'react'
 import type { Leader, LeaderboardResponse, FoundSetsResponse } from '../lib/api'
 import { loadLeaderboard, loadFoundSets } from '../lib/api'
 import { FoundSetsGallery } from './FoundSetsGallery'
+import { applyLeaderboardOps } from '../lib/leaderboardDelta'
+import type { LeaderboardDelta, LeaderboardSnapshot } from '../lib/leaderboardDelta'
 
 export function Leaderboard({ date, limit = 8, realtime = true }: { readonly date?: string; readonly limit?: number; readonly realtime?: boolean }) {
     const [data, setData] = useState<LeaderboardResponse | null>(null)
@@ -46,7 +48,6 @@ export function Leaderboard({ date, limit = 8, realtime = true }: { readonly dat
                 fetchNow()
             }, 300) as unknown as number
         }
-        const usingGateway = Boolean((import.meta as any)?.env?.VITE_REALTIME_WS_URL)
         const getWsUrl = () => {
             const envUrl = (import.meta as any)?.env?.VITE_REALTIME_WS_URL as string | undefined
             if (envUrl?.startsWith('ws')) return envUrl
@@ -58,6 +59,26 @@ export function Leaderboard({ date, limit = 8, realtime = true }: { readonly dat
             if (!d) return null
             return `daily-${String(d).replace(/-/g, '')}`
         }
+        // Versioned live board: snapshots reset it, deltas apply only on top of the version they extend
+        const liveDate = date ?? new Date().toISOString().slice(0, 10)
+        let live: { epoch: string; seq: number; topN: number; rows: Leader[] } | null = null
+        const requestSnapshot = () => {
+            try { ws?.send(JSON.stringify({ v: 1, type: 'leaderboard_sync', date: liveDate })) } catch { /* noop */ }
+        }
+        const applyLive = (m: LeaderboardSnapshot | LeaderboardDelta) => {
+            if (m.type === 'leaderboard_snapshot') {
+                live = { epoch: m.epoch, seq: m.seq, topN: m.top_n, rows: m.rows }
+            } else if (live && live.epoch === m.epoch && live.seq === m.base) {
+                live = { ...live, seq: m.seq, rows: applyLeaderboardOps(live.rows, m.ops, m.size) }
+            } else {
+                // Missed a version (or the server restarted): resync, and refetch in case sync is unsupported
+                live = null
+                requestSnapshot()
+                scheduleRefetch()
+                return
+            }
+            if (limit <= live.topN) setData({ date: liveDate, leaders: live.rows.slice(0, limit) })
+        }
         const connect = () => {
             try {
                 ws = new WebSocket(getWsUrl())
@@ -70,12 +91,13 @@ export function Leaderboard({ date, limit = 8, realtime = true }: { readonly dat
             }
             ws.onopen = () => {
                 retryDelay = 800
-                if (usingGateway) {
-                    const room = roomForDate(date)
-                    if (room) {
-                        try { ws?.send(JSON.stringify({ v: 1, type: 'subscribe', room })) } catch { /* noop */ }
-                    }
+                live = null
+                // Both the gateway and the app's /ws scope events to daily rooms (UTC date)
+                const room = roomForDate(liveDate)
+                if (room) {
+                    try { ws?.send(JSON.stringify({ v: 1, type: 'subscribe', room })) } catch { /* noop */ }
                 }
+                requestSnapshot()
             }
             ws.onmessage = (ev) => {
                 try {
@@ -83,12 +105,23 @@ export function Leaderboard({ date, limit = 8, realtime = true }: { readonly dat
                     if (!msg) return
                     // Support both direct events (Python WS) and broker envelopes (Go gateway)
                     const t = msg.type
+                    if (t === 'ping') {
+                        // Server heartbeat: answer so the connection is not reaped as idle
+                        try { ws?.send(JSON.stringify({ v: 1, type: 'pong' })) } catch { /* noop */ }
+                        return
+                    }
                     const payloadEvent = msg?.payload?.event
                     const it = payloadEvent?.type
+                    const ev = payloadEvent ?? msg
+                    if ((ev.type === 'leaderboard_snapshot' || ev.type === 'leaderboard_delta') && ev.date === liveDate) {
+                        applyLive(ev)
+                        return
+                    }
                     if (t === 'leaderboard_change' || t === 'completion' || it === 'leaderboard_change' || it === 'completion') {
-                        // If a specific date is requested, only refetch when it matches
+                        // If a specific date is requested, only refetch when it matches;
+                        // with a live versioned board the following delta carries the change
                         const msgDate = msg.date || payloadEvent?.date
-                        if (!date || msgDate === date) scheduleRefetch()
+                        if ((!date || msgDate === date) && !(live && limit <= live.topN)) scheduleRefetch()
                     }
                 } catch { /* ignore */ }
             }
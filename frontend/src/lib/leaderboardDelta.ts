@@ -0,0 +1,41 @@
+/* Client side of the versioned live leaderboard (see app/leaderboard_feed.py) */
+import type { Leader } from './api'
+
+export type LeaderboardOp =
+    | { op: 'remove'; key: string }
+    | { op: 'upsert'; key: string; index: number; row: Leader }
+    | { op: 'move'; key: string; index: number }
+
+export type LeaderboardDelta = {
+    type: 'leaderboard_delta'; date: string; epoch: string; seq: number; base: number; size: number; top_n: number; ops: LeaderboardOp[]
+}
+export type LeaderboardSnapshot = {
+    type: 'leaderboard_snapshot'; date: string; epoch: string; seq: number; top_n: number; rows: Leader[]
+}
+
+/** Apply a delta: explicit ops go to their index, untouched rows fill the rest in their previous order */
+export function applyLeaderboardOps(old: Leader[], ops: LeaderboardOp[], size: number): Leader[] {
+    const byKey = new Map(old.map((r) => [r.username, r]))
+    const placed = new Map<number, Leader>()
+    const touched = new Set<string>()
+    for (const op of ops) {
+        touched.add(op.key)
+        if (op.op === 'remove') {
+            byKey.delete(op.key)
+        } else if (op.op === 'upsert') {
+            byKey.set(op.key, op.row)
+            placed.set(op.index, op.row)
+        } else {
+            const row = byKey.get(op.key)
+            if (row) placed.set(op.index, row)
+        }
+    }
+    const rest = old.filter((r) => !touched.has(r.username))
+    const out: Leader[] = []
+    let j = 0
+    for (let i = 0; i < size; i++) {
+        const row = placed.get(i) ?? rest[j++]
+        if (row) out.push(row)
+    }
+    return out
+}
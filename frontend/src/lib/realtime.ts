@@ -43,6 +43,11 @@ export class RealtimeClient {
         this.ws.onmessage = (ev) => {
             try {
                 const data = JSON.parse(ev.data);
+                if (data?.type === "ping") {
+                    // Server heartbeat; any reply keeps the connection from being reaped
+                    this.send({ type: "pong" });
+                    return;
+                }
                 this.opts.onMessage?.(data);
             } catch { }
         };
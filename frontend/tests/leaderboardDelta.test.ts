@@ -0,0 +1,22 @@
+import { describe, it, expect } from 'vitest'
+import { applyLeaderboardOps } from '../src/lib/leaderboardDelta'
+import type { Leader } from '../src/lib/api'
+
+const rows = (...names: string[]): Leader[] => names.map((username, i) => ({ username, best: i }))
+
+describe('leaderboard deltas', () => {
+    it('applies an insert at the top with the last row falling off', () => {
+        const old = rows('a', 'b', 'c')
+        const next = applyLeaderboardOps(old, [
+            { op: 'remove', key: 'c' },
+            { op: 'upsert', key: 'z', index: 0, row: { username: 'z', best: 0 } },
+        ], 3)
+        expect(next.map((r) => r.username)).toEqual(['z', 'a', 'b'])
+    })
+
+    it('moves a row while untouched rows keep their order', () => {
+        const old = rows('a', 'b', 'c', 'd')
+        const next = applyLeaderboardOps(old, [{ op: 'move', key: 'd', index: 0 }], 4)
+        expect(next.map((r) => r.username)).toEqual(['d', 'a', 'b', 'c'])
+    })
+})
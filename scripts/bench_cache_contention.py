@@ -0,0 +1,115 @@
+"""
+Cache contention benchmark.
+
+Compares the sharded MemoryCache against a single-RLock baseline (the
+previous implementation) with 8-64 threads hammering daily_board/leaderboard
+style keys at a ~95% read mix. Run on a regular and a free-threaded CPython
+build (e.g. python3.13t) to compare:
+
+    python scripts/bench_cache_contention.py
+    python3.13t -X gil=0 scripts/bench_cache_contention.py --seconds 3
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.cache import MemoryCache  # noqa: E402
+
+
+class GlobalLockCache:
+    """Single-RLock cache with a shared stats dict (the pre-sharding design)"""
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires_at = entry
+            if time.time() > expires_at:
+                del self._cache[key]
+                self._stats['misses'] += 1
+                self._stats['evictions'] += 1
+                return None
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl_seconds=3600):
+        with self._lock:
+            self._cache[key] = (value, time.time() + ttl_seconds)
+            self._stats['sets'] += 1
+
+
+def _keys(n: int = 64):
+    keys = []
+    for i in range(n // 2):
+        keys.append(f"daily_board:2099-01-{i % 28 + 1:02d}-{i}")
+        keys.append(f"leaderboard:2099-01-{i % 28 + 1:02d}-{i}")
+    return keys
+
+
+def run(cache, threads: int, seconds: float, write_ratio: float) -> float:
+    keys = _keys()
+    for k in keys:
+        cache.set(k, [[0, 1, 2, 1]] * 12)
+    stop = threading.Event()
+    start_barrier = threading.Barrier(threads + 1)
+    counts = [0] * threads
+
+    def worker(idx: int):
+        rng = random.Random(idx)
+        local_keys = keys
+        n = 0
+        start_barrier.wait()
+        while not stop.is_set():
+            for _ in range(256):
+                k = local_keys[rng.randrange(len(local_keys))]
+                if rng.random() < write_ratio:
+                    cache.set(k, n)
+                else:
+                    cache.get(k)
+                n += 1
+        counts[idx] = n
+
+    ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in ts:
+        t.start()
+    start_barrier.wait()
+    t0 = time.perf_counter()
+    time.sleep(seconds)
+    stop.set()
+    for t in ts:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return sum(counts) / elapsed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--threads", type=int, nargs="*", default=[8, 16, 32, 64])
+    ap.add_argument("--write-ratio", type=float, default=0.05)
+    args = ap.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"python {sys.version.split()[0]}  gil={'on' if gil else 'off'}  write_ratio={args.write_ratio}")
+    print(f"{'threads':>8} {'global-lock ops/s':>20} {'sharded ops/s':>16} {'speedup':>8}")
+    for n in args.threads:
+        base = run(GlobalLockCache(), n, args.seconds, args.write_ratio)
+        sharded = run(MemoryCache(), n, args.seconds, args.write_ratio)
+        print(f"{n:>8} {base:>20,.0f} {sharded:>16,.0f} {sharded / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+JSON response encoding benchmark.
+
+Renders a /api/leaderboard payload with 100 rows the way FastAPI does by
+default (jsonable_encoder + stdlib JSONResponse) and through app/fastjson.py
+(shared encoder with and without the jsonable_encoder pass), and reports
+per-response time. Install orjson to compare the optional fast backend:
+
+    python scripts/bench_json.py
+    python scripts/bench_json.py --rows 100 --iterations 5000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.fastjson import BACKEND, FastJSONResponse, json_response  # noqa: E402
+
+
+def _payload(rows: int) -> dict:
+    return {
+        "date": "2099-01-01",
+        "leaders": [
+            {
+                "username": f"player_{i:03d}",
+                "best": 60 + i,
+                "completed_at": f"2099-01-01T12:{i % 60:02d}:00",
+                "sets_found": i % 7,
+                "effective": (60 + i) * 0.88 ** max(0, i % 7 - 1),
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def _time(fn, iterations: int) -> float:
+    for _ in range(min(200, iterations)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=3000)
+    args = parser.parse_args()
+    payload = _payload(args.rows)
+
+    cases = (
+        ("FastAPI default", lambda: JSONResponse(jsonable_encoder(payload))),
+        (f"default class ({BACKEND})", lambda: FastJSONResponse(jsonable_encoder(payload))),
+        (f"json_response ({BACKEND})", lambda: json_response(payload)),
+    )
+    results = {}
+    for label, fn in cases:
+        results[label] = _time(fn, args.iterations)
+        print(f"{label:28s} {results[label] * 1e6:9.1f} us/response")
+    base = results["FastAPI default"]
+    fast = results[cases[-1][0]]
+    print(f"{args.rows} rows: {base / fast:.1f}x faster with the fast path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+HTTP middleware overhead benchmark.
+
+Drives a trivial route directly through the ASGI interface (no sockets) with
+the security-header and request-logging middlewares implemented as
+BaseHTTPMiddleware subclasses (the previous implementation) and as the pure
+ASGI versions in app/middleware.py, and reports per-request time:
+
+    python scripts/bench_middleware.py
+    python scripts/bench_middleware.py --requests 50000
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import PlainTextResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.logging_utils import request_id_ctx  # noqa: E402
+from app.middleware import (  # noqa: E402
+    RequestLoggingMiddleware,
+    SecurityHeadersMiddleware,
+    build_csp,
+    csp_connect_sources,
+)
+
+log = logging.getLogger("bench")
+
+
+class BaseHTTPSecurityHeaders(BaseHTTPMiddleware):
+    """Previous design: CSP rebuilt (and env re-read) on every response"""
+
+    async def dispatch(self, request, call_next):
+        import os
+        response = await call_next(request)
+        csp_connect_sources(os.getenv('REALTIME_WS_URL'))
+        response.headers['Content-Security-Policy'] = build_csp(os.getenv('REALTIME_WS_URL'))
+        response.headers.setdefault('Referrer-Policy', 'strict-origin-when-cross-origin')
+        response.headers.setdefault('X-Content-Type-Options', 'nosniff')
+        response.headers.setdefault('X-Frame-Options', 'DENY')
+        response.headers.setdefault('Permissions-Policy', 'geolocation=(), microphone=(), camera=()')
+        response.headers.setdefault('Cross-Origin-Opener-Policy', 'same-origin')
+        response.headers.setdefault('Strict-Transport-Security', 'max-age=31536000; includeSubDomains')
+        return response
+
+
+class BaseHTTPRequestLogging(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        rid = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        token = request_id_ctx.set(rid)
+        start = time.time()
+        response = None
+        try:
+            response = await call_next(request)
+            return response
+        finally:
+            log.info("request", extra={
+                "method": request.method,
+                "path": request.url.path,
+                "status": getattr(response, "status_code", 500),
+                "duration_ms": int((time.time() - start) * 1000),
+                "client": request.client.host if request.client else "-",
+                "user_agent": request.headers.get("user-agent", "-"),
+            })
+            if response is not None:
+                response.headers["X-Request-ID"] = rid
+            request_id_ctx.reset(token)
+
+
+def _build(security, logging_mw) -> Starlette:
+    app = Starlette(routes=[Route("/ping", lambda request: PlainTextResponse("pong"))])
+    if security is not None:
+        app.add_middleware(security)
+        app.add_middleware(logging_mw)
+    return app
+
+
+async def _drive(app, n: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+
+    async def one() -> None:
+        body_sent = False
+        done = asyncio.Event()
+
+        async def receive():
+            # Like uvicorn: the body once, then http.disconnect once the response is complete
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                done.set()
+
+        await app(dict(scope), receive, send)
+
+    for _ in range(200):  # warm-up
+        await one()
+    started = time.perf_counter()
+    for _ in range(n):
+        await one()
+    return (time.perf_counter() - started) / n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    # Measure middleware cost, not log formatting/output
+    logging.getLogger().handlers = [logging.NullHandler()]
+    logging.getLogger("app.middleware").setLevel(logging.WARNING)
+    log.setLevel(logging.WARNING)
+
+    results = {}
+    for label, security, logging_mw in (
+        ("no middleware", None, None),
+        ("BaseHTTPMiddleware", BaseHTTPSecurityHeaders, BaseHTTPRequestLogging),
+        ("pure ASGI", SecurityHeadersMiddleware, RequestLoggingMiddleware),
+    ):
+        per_request = asyncio.run(_drive(_build(security, logging_mw), args.requests))
+        results[label] = per_request
+        print(f"{label:20s} {per_request * 1e6:8.1f} us/request")
+    base = results["no middleware"]
+    before = results["BaseHTTPMiddleware"] - base
+    after = results["pure ASGI"] - base
+    print(f"middleware overhead: {before * 1e6:.1f} us -> {after * 1e6:.1f} us per request "
+          f"({before / after if after > 0 else float('inf'):.1f}x less)")
+
+
+if __name__ == "__main__":
+    main()
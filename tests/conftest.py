@@ -13,6 +13,8 @@ def reset_rate_limiter():
 	try:
 		import app.main as app_main
 		app_main._RATE_LIMIT_STORE.clear()
+		app_main._BROADCAST_COALESCER.reset()
+		app_main._LEADERBOARD_FEED.clear()
 	except Exception:
 		pass
 	yield
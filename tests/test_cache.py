@@ -27,3 +27,23 @@ def test_cache_helpers_leaderboard_and_board():
     assert get_cached_leaderboard(date) == lb
     invalidate_leaderboard_cache(date)
     assert get_cached_leaderboard(date) is None
+
+
+def test_memory_cache_stats_aggregate_across_threads():
+    import threading
+    c = MemoryCache(shards=4)
+    c.set('daily_board:x', [1])
+
+    def worker():
+        for _ in range(500):
+            c.get('daily_board:x')
+            c.get('leaderboard:missing')
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = c.get_stats()
+    assert stats['hits'] == 4000 and stats['misses'] == 4000 and stats['sets'] == 1
+    assert stats['cache_size'] == 1 and stats['shards'] == 4
@@ -0,0 +1,76 @@
+import time
+import app.cache as cache_mod
+from app.cache import SQLiteCache, TieredCache, MemoryCache, configure_cache, get_cache, cache_leaderboard, get_cached_leaderboard, invalidate_leaderboard_cache
+
+
+def test_sqlite_cache_roundtrip_and_expiry(tmp_path, monkeypatch):
+    c = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    c.set('daily_board:2099-01-01', [[0, 1, 2, 1]], ttl_seconds=60)
+    assert c.get('daily_board:2099-01-01') == [[0, 1, 2, 1]]
+    assert c.get('missing') is None
+
+    orig_time = time.time
+    monkeypatch.setattr(time, "time", lambda: orig_time() + 120)
+    assert c.get('daily_board:2099-01-01') is None
+    stats = c.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['evictions'] == 1
+    assert stats['cache_size'] == 0
+
+
+def test_tiered_caches_share_values_and_invalidations(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    # Two tiers over the same file behave like two worker processes
+    worker_a = TieredCache(SQLiteCache(path))
+    worker_b = TieredCache(SQLiteCache(path))
+
+    worker_a.set('leaderboard:2099-01-01', [{"username": "alice"}], ttl_seconds=300)
+    assert worker_b.get('leaderboard:2099-01-01') == [{"username": "alice"}]
+
+    # b now holds a local copy; an invalidation in a must reach it
+    worker_a.delete('leaderboard:2099-01-01')
+    assert worker_b.get('leaderboard:2099-01-01') is None
+
+    worker_b.set('leaderboard:2099-01-01', [{"username": "bob"}], ttl_seconds=300)
+    assert worker_a.get('leaderboard:2099-01-01') == [{"username": "bob"}]
+    worker_b.clear()
+    assert worker_a.get('leaderboard:2099-01-01') is None
+
+
+def test_helpers_use_configured_backend(tmp_path):
+    original = get_cache()
+    try:
+        configure_cache(TieredCache(SQLiteCache(str(tmp_path / 'cache.sqlite3'))))
+        cache_leaderboard('2099-01-02', [{"username": "carol"}])
+        assert get_cached_leaderboard('2099-01-02') == [{"username": "carol"}]
+        invalidate_leaderboard_cache('2099-01-02')
+        assert get_cached_leaderboard('2099-01-02') is None
+        assert get_cache().get_stats()['backend'] == 'tiered'
+    finally:
+        configure_cache(original)
+
+
+def test_create_cache_from_env(tmp_path, monkeypatch):
+    monkeypatch.delenv("CACHE_BACKEND", raising=False)
+    assert isinstance(cache_mod.create_cache_from_env(), MemoryCache)
+    monkeypatch.setenv("CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("CACHE_SQLITE_PATH", str(tmp_path / 'env.sqlite3'))
+    assert isinstance(cache_mod.create_cache_from_env(), TieredCache)
+
+
+def test_tier_clears_local_copies_when_every_missed_invalidation_was_pruned(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a = TieredCache(SQLiteCache(path))
+    worker_b = TieredCache(SQLiteCache(path))
+    worker_a.set('leaderboard:2099-01-01', [{"username": "alice"}], ttl_seconds=300)
+    worker_a.set('daily_board:2099-01-01', [[0, 1, 2, 1]], ttl_seconds=300)
+    assert worker_b.get('leaderboard:2099-01-01') == [{"username": "alice"}]
+    seen = worker_b._seen_seq
+
+    worker_a.delete('leaderboard:2099-01-01')
+    # Retention pruned the log before b looked at it
+    worker_a.shared.invalidation_retention_seconds = -1
+    worker_a.shared.cleanup_expired()
+    latest, keys, gap = worker_b.shared.invalidations_since(seen)
+    assert keys == [] and gap and latest > seen
+    assert worker_b.get('leaderboard:2099-01-01') is None
+    assert worker_b.shared.invalidations_since(latest) == (latest, [], False)
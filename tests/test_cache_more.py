@@ -32,3 +32,44 @@ def test_warm_daily_board_cache_and_recent():
     warm_cache_for_today_and_recent()
     # We can't know today's date here without importing date; just check cache not empty
     assert c.get_stats()["cache_size"] >= 1
+
+
+def test_namespace_stats_loader_latency_and_eviction_age():
+    from app.cache import CACHE_LOAD_SECONDS, MemoryCache
+    c = MemoryCache()
+    # The histograms are process-wide registry metrics; other tests record too
+    loads_before = CACHE_LOAD_SECONDS.snapshot(("memory", "daily_board"))['count']
+    assert c.get_or_load('daily_board:2099-01-01', lambda: [[1, 1, 1, 1]]) == [[1, 1, 1, 1]]
+    assert c.get_or_load('daily_board:2099-01-01', lambda: 1 / 0) == [[1, 1, 1, 1]]
+    c.get('leaderboard:2099-01-01')
+    c.set('leaderboard:2099-01-01', [], ttl_seconds=60)
+    assert c.delete('leaderboard:2099-01-01') is True
+
+    ns = c.get_stats()['namespaces']
+    board = ns['daily_board']
+    assert board['hits'] == 1 and board['misses'] == 1 and board['sets'] == 1
+    assert board['load_seconds']['count'] == loads_before + 1
+    lb = ns['leaderboard']
+    assert lb['misses'] == 1 and lb['invalidations'] == 1
+    assert lb['entry_age_seconds']['invalidated']['count'] >= 1
+
+    text = c.metrics.render_prometheus()
+    assert 'daily_set_cache_hits_total{namespace="daily_board"} 1' in text
+    assert f'daily_set_cache_load_seconds_count{{backend="memory",namespace="daily_board"}} {loads_before + 1}' in text
+    assert 'daily_set_cache_entry_age_seconds_bucket{backend="memory",namespace="leaderboard",reason="invalidated",le="+Inf"}' in text
+    # /metrics renders the histograms from the registry, the collector only the counters
+    assert "daily_set_cache_load_seconds" not in c.metrics.render_counters()
+
+
+def test_cache_metrics_endpoint():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    cache_daily_board("2099-01-03", [1, 2, 3])
+    get_cached_daily_board("2099-01-03")
+    client = TestClient(app)
+    r = client.get('/api/cache/metrics')
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/plain')
+    assert 'daily_set_cache_hits_total{namespace="daily_board"}' in r.text
+    stats = client.get('/api/cache/stats').json()['cache_stats']
+    assert 'daily_board' in stats['namespaces']
@@ -0,0 +1,108 @@
+import asyncio
+import anyio
+from app.coalesce import EventCoalescer, merge_events
+
+
+def _collector():
+    delivered = []
+
+    async def deliver(ev):
+        delivered.append(ev)
+
+    return delivered, deliver
+
+
+def test_burst_of_completions_is_merged_into_one_trailing_event():
+    delivered, deliver = _collector()
+    co = EventCoalescer(deliver, window_seconds=0.05)
+
+    async def run():
+        for i in range(10):
+            await co.submit({"type": "completion", "date": "2099-01-01", "player_id": i, "seconds": 30 + i})
+        await asyncio.sleep(0.1)
+
+    anyio.run(run)
+    # Leading event immediately, the other nine merged at the window end
+    assert len(delivered) == 2
+    assert delivered[0]["player_id"] == 0
+    trailing = delivered[1]
+    assert trailing["player_id"] == 9 and trailing["coalesced"] == 9
+    assert [c["player_id"] for c in trailing["completions"]] == list(range(1, 10))
+    assert co.stats()["merged"] == 8
+
+
+def test_groups_are_independent_per_room_and_type():
+    delivered, deliver = _collector()
+    co = EventCoalescer(deliver, window_seconds=10)
+
+    async def run():
+        await co.submit({"type": "completion", "date": "2099-01-01", "player_id": 1})
+        await co.submit({"type": "completion", "date": "2099-01-02", "player_id": 2})
+        await co.submit({"type": "leaderboard_change", "date": "2099-01-01", "player_id": 1})
+
+    anyio.run(run)
+    assert len(delivered) == 3
+
+
+def test_repeated_daily_updates_are_suppressed():
+    delivered, deliver = _collector()
+    co = EventCoalescer(deliver, window_seconds=0.01, type_windows={"daily_update": 0.02})
+
+    async def run():
+        for _ in range(50):
+            await co.submit({"type": "daily_update", "date": "2099-01-01"})
+        await asyncio.sleep(0.05)
+
+    anyio.run(run)
+    assert delivered == [{"type": "daily_update", "date": "2099-01-01"}]
+    assert co.stats()["suppressed"] == 49
+
+
+def test_held_events_flush_when_timer_loop_is_gone():
+    delivered, deliver = _collector()
+    co = EventCoalescer(deliver, window_seconds=0.01)
+
+    async def first():
+        await co.submit({"type": "x", "date": None, "n": 1})
+        await co.submit({"type": "x", "date": None, "n": 2})
+
+    anyio.run(first)  # loop closes before the window timer fires
+    assert [e["n"] for e in delivered] == [1]
+
+    async def later():
+        await asyncio.sleep(0.02)
+        await co.submit({"type": "x", "date": None, "n": 3})
+
+    anyio.run(later)
+    assert delivered[-1]["n"] == 3 and delivered[-1]["coalesced"] == 2
+
+
+def test_merge_single_event_is_a_copy():
+    ev = {"type": "completion", "player_id": 1}
+    merged = merge_events([ev])
+    assert merged == ev and merged is not ev
+
+
+def test_merged_completion_enrichment_resolves_all_usernames(tmp_path):
+    from sqlmodel import SQLModel, Session, create_engine
+    from app import crud, models
+    from app.main import _enrich_event
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'co.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    crud.engine = engine
+    with Session(engine) as s:
+        a = models.Player(username="ann", password_hash="x")
+        b = models.Player(username="bob", password_hash="x")
+        s.add(a)
+        s.add(b)
+        s.commit()
+        ids = (a.id, b.id)
+
+    ev = merge_events([
+        {"type": "completion", "date": "2099-01-01", "player_id": ids[0], "seconds": 5},
+        {"type": "completion", "date": "2099-01-01", "player_id": ids[1], "seconds": 6},
+    ])
+    _enrich_event(ev)
+    assert ev["username"] == "bob"
+    assert [c["username"] for c in ev["completions"]] == ["ann", "bob"]
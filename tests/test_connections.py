@@ -0,0 +1,198 @@
+import asyncio
+import anyio
+from app.connections import ConnectionManager
+
+
+class FastWS:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, msg: str):
+        await asyncio.sleep(0)
+        self.sent.append(msg)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+class StuckWS(FastWS):
+    async def send_text(self, msg: str):
+        await asyncio.sleep(3600)
+
+
+def test_slow_client_does_not_delay_others_and_is_disconnected():
+    mgr = ConnectionManager(queue_size=4)
+    fast, slow = FastWS(), StuckWS()
+    mgr.register(fast)
+    mgr.register(slow)
+
+    async def run():
+        for i in range(10):
+            # broadcast never awaits network I/O; yield so writers can run
+            mgr.broadcast(f"m{i}")
+            await asyncio.sleep(0.001)
+        await mgr.flush(timeout=0.5)
+        await asyncio.sleep(0)
+
+    anyio.run(run)
+    assert fast.sent == [f"m{i}" for i in range(10)]
+    assert slow not in mgr and fast in mgr
+    assert slow.closed_with == 1013
+    stats = mgr.stats()
+    assert stats['slow_disconnects'] == 1 and stats['dropped'] == 1
+    assert stats['connections'] == 1
+
+
+def test_drop_oldest_policy_keeps_latest_messages():
+    mgr = ConnectionManager(queue_size=2, overflow_policy="drop_oldest")
+    slow = StuckWS()
+    conn = mgr.register(slow)
+
+    async def run():
+        for i in range(5):
+            mgr.broadcast(f"m{i}")
+        # the queue kept only the newest two; the writer then takes m3 in flight
+        assert conn.messages() == ["m3", "m4"]
+        await asyncio.sleep(0)
+        assert conn.messages() == ["m4"]
+        mgr.clear()
+
+    anyio.run(run)
+    assert mgr.stats()['dropped'] >= 2
+
+
+def test_failed_send_unregisters_connection():
+    class BoomWS(FastWS):
+        async def send_text(self, msg: str):
+            raise RuntimeError("gone")
+
+    mgr = ConnectionManager()
+    ws = BoomWS()
+    mgr[ws] = {"player_id": None}
+
+    async def run():
+        mgr.broadcast("hello")
+        await mgr.flush()
+
+    anyio.run(run)
+    assert ws not in mgr
+    assert mgr.stats()['send_failures'] == 1
+
+
+def test_room_scoped_broadcast_reaches_only_subscribers_and_legacy_clients():
+    mgr = ConnectionManager()
+    today, other, legacy = FastWS(), FastWS(), FastWS()
+    for ws in (today, other, legacy):
+        mgr.register(ws)
+    assert mgr.subscribe(today, "daily-20990101")
+    assert mgr.subscribe(other, "daily-20990102")
+    assert not mgr.subscribe(other, "bad room!")
+    assert mgr.subscribers("daily-20990101") == 2
+
+    async def run():
+        assert mgr.broadcast("a", room="daily-20990101") == 2
+        assert mgr.broadcast("b") == 3
+        await mgr.flush()
+
+    anyio.run(run)
+    assert today.sent == ["a", "b"]
+    assert other.sent == ["b"]
+    assert legacy.sent == ["a", "b"]
+
+    # Unsubscribing keeps the client scoped; forgetting it cleans the index
+    assert mgr.unsubscribe(other, "daily-20990102")
+    assert mgr.subscribers("daily-20990101") == 2
+    mgr.pop(today)
+    stats = mgr.stats()
+    assert stats['rooms'] == 0 and stats['unscoped_connections'] == 1
+
+
+def test_subscription_cap_per_connection():
+    mgr = ConnectionManager(max_rooms_per_connection=2)
+    ws = FastWS()
+    mgr.register(ws)
+    assert mgr.subscribe(ws, "r1") and mgr.subscribe(ws, "r2")
+    assert not mgr.subscribe(ws, "r3")
+    assert mgr.subscribe(ws, "r1")
+
+
+def test_paced_socket_receives_latest_state_per_kind():
+    mgr = ConnectionManager(min_interval=0.05)
+    ws = FastWS()
+    conn = mgr.register(ws)
+
+    async def run():
+        mgr.broadcast("lb-1", kind="leaderboard_change")
+        await asyncio.sleep(0.001)  # first message goes out and opens the pacing window
+        for i in range(2, 6):
+            mgr.broadcast(f"lb-{i}", kind="leaderboard_change")
+        mgr.broadcast("daily", kind="daily_update")
+        mgr.broadcast("raw-1")
+        mgr.broadcast("raw-2")
+        assert conn.messages() == ["lb-5", "daily", "raw-1", "raw-2"]
+        await mgr.flush(timeout=1.0)
+
+    anyio.run(run)
+    # Nothing newer was skipped: the final leaderboard state is delivered
+    assert ws.sent == ["lb-1", "lb-5", "daily", "raw-1", "raw-2"]
+    assert mgr.stats()["coalesced"] == 3
+
+
+def test_heartbeat_pings_quiet_clients_and_reaps_silent_ones():
+    mgr = ConnectionManager(ping_interval=10, idle_timeout=30)
+    chatty, quiet, dead = FastWS(), FastWS(), FastWS()
+    for ws in (chatty, quiet, dead):
+        mgr.register(ws)
+
+    async def run():
+        now = mgr.get(chatty).last_seen
+        mgr.get(dead).last_seen = now - 31
+        mgr.get(quiet).last_seen = now - 11
+        pinged, reaped = mgr.heartbeat(now=now)
+        # Already pinged within the interval: not pinged again
+        assert mgr.heartbeat(now=now + 1) == (0, 0)
+        await mgr.flush(timeout=0.5)
+        await asyncio.sleep(0)
+        return pinged, reaped
+
+    assert anyio.run(run) == (1, 1)
+    assert chatty.sent == [] and '"type":"ping"' in quiet.sent[0]
+    assert dead not in mgr and dead.closed_with == 1001
+    assert mgr.stats()["reaped"] == {"idle_timeout": 1}
+
+
+def test_touch_keeps_connection_alive():
+    mgr = ConnectionManager(idle_timeout=30)
+    ws = FastWS()
+    conn = mgr.register(ws)
+    conn.last_seen -= 31
+    mgr.touch(ws)
+    assert mgr.heartbeat() == (0, 0) and ws in mgr
+
+
+def test_admission_caps_per_ip_and_global():
+    mgr = ConnectionManager(max_connections=3, max_per_ip=2)
+    a1, a2 = FastWS(), FastWS()
+    assert mgr.admit("1.1.1.1") is None
+    mgr.register(a1, ip="1.1.1.1")
+    mgr.register(a2, ip="1.1.1.1")
+    assert mgr.admit("1.1.1.1") == "per_ip_limit"
+    mgr.register(FastWS(), ip="2.2.2.2")
+    assert mgr.admit("3.3.3.3") == "global_limit"
+    # Leaving frees the per-IP slot
+    mgr.pop(a1)
+    assert mgr.admit("1.1.1.1") is None
+    stats = mgr.stats()
+    assert stats["rejected_per_ip"] == 1 and stats["rejected_global"] == 1 and stats["unique_ips"] == 2
+
+
+def test_close_all_closes_with_service_restart():
+    mgr = ConnectionManager()
+    sockets = [FastWS(), FastWS()]
+    for ws in sockets:
+        mgr.register(ws, ip="1.1.1.1")
+
+    assert anyio.run(mgr.close_all) == 2
+    assert [ws.closed_with for ws in sockets] == [1012, 1012]
+    assert len(mgr) == 0 and mgr.stats()["reaped"] == {"shutdown": 2} and mgr.stats()["unique_ips"] == 0
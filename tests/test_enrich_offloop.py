@@ -0,0 +1,77 @@
+import json
+import threading
+import time
+import anyio
+import asyncio
+
+import app.main as app_main
+from app.loopmon import LoopLagMonitor
+
+
+class FakeWS:
+    def __init__(self):
+        self.texts = []
+
+    async def send_text(self, s: str):
+        self.texts.append(s)
+
+
+def _deliver(event):
+    async def run():
+        await app_main._deliver_event(event)
+        await app_main._WS_CONNECTIONS.flush()
+    anyio.run(run)
+
+
+def test_enrichment_runs_off_the_event_loop(monkeypatch):
+    seen = {}
+
+    def fake_enrich(e):
+        seen['thread'] = threading.current_thread().name
+        e['username'] = 'bob'
+
+    monkeypatch.setattr(app_main, '_enrich_event', fake_enrich)
+    monkeypatch.setattr(app_main, '_update_live_leaderboard', lambda e: None)
+    ws = FakeWS()
+    app_main._WS_CONNECTIONS.clear()
+    app_main._WS_CONNECTIONS[ws] = {'player_id': None, 'last_sent': 0}
+    try:
+        _deliver({"type": "completion", "player_id": 1, "date": "2099-01-01", "seconds": 3})
+    finally:
+        app_main._WS_CONNECTIONS.clear()
+    assert seen['thread'].startswith('enrich')
+    assert json.loads(ws.texts[0])["username"] == "bob"
+
+
+def test_enrichment_timeout_delivers_unenriched_event(monkeypatch):
+    def slow_enrich_and_diff(e):
+        time.sleep(0.3)
+        e['username'] = 'late'
+
+    monkeypatch.setattr(app_main, '_enrich_and_diff', slow_enrich_and_diff)
+    monkeypatch.setattr(app_main, '_ENRICH_TIMEOUT', 0.05)
+    ws = FakeWS()
+    app_main._WS_CONNECTIONS.clear()
+    app_main._WS_CONNECTIONS[ws] = {'player_id': None, 'last_sent': 0}
+    before = app_main._BROADCAST_STATS['enrich_timeouts']
+    try:
+        _deliver({"type": "completion", "player_id": 1, "date": "2099-01-01", "seconds": 3})
+    finally:
+        app_main._WS_CONNECTIONS.clear()
+    assert len(ws.texts) == 1 and 'late' not in ws.texts[0]
+    assert app_main._BROADCAST_STATS['enrich_timeouts'] == before + 1
+
+
+def test_loop_lag_monitor_detects_blocking():
+    mon = LoopLagMonitor(interval=0.01, warn_seconds=10)
+
+    async def run():
+        mon.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)  # block the loop
+        await asyncio.sleep(0.03)
+        mon.stop()
+
+    anyio.run(run)
+    assert mon.max_lag >= 0.05
+    assert mon.snapshot()['histogram']['count'] >= 2
@@ -0,0 +1,51 @@
+import json
+
+from fastapi import Response
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import crud, fastjson, models
+from app.fastjson import dumps, dumps_bytes, json_response
+
+
+def test_dumps_matches_stdlib_semantics():
+    payload = {"a": [1, 2.5, None, True], "name": "é✓", "nested": {"k": "v"}}
+    assert json.loads(dumps(payload)) == payload
+    assert json.loads(dumps_bytes(payload)) == payload
+    assert "é✓" in dumps(payload)  # no ASCII escaping, like the log formatter always did
+    # Values only stdlib can encode still work (orjson falls back)
+    assert json.loads(dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+
+
+def test_json_response_carries_dependency_headers():
+    sub = Response()
+    del sub.headers["content-length"]
+    sub.headers["RateLimit-Remaining"] = "7"
+    out = json_response({"ok": True}, sub)
+    assert out.body == dumps_bytes({"ok": True})
+    assert out.headers["ratelimit-remaining"] == "7"
+    assert out.headers["content-type"] == "application/json"
+    assert out.status_code == 200
+
+
+def test_leaderboard_endpoint_fast_path_keeps_ratelimit_headers(tmp_path):
+    from app.main import app
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'lb.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    crud.engine = engine
+    with Session(engine) as s:
+        p = models.Player(username="fastjson", password_hash="x")
+        s.add(p)
+        s.commit()
+        s.refresh(p)
+        crud.record_time(s, p.id, "2099-03-01", 42)
+
+    r = TestClient(app).get("/api/leaderboard?date=2099-03-01&limit=5")
+    assert r.status_code == 200
+    assert r.json()["leaders"][0]["username"] == "fastjson"
+    assert "ratelimit-remaining" in r.headers and "ratelimit-limit" in r.headers
+
+
+def test_backend_reported():
+    assert fastjson.BACKEND in ("orjson", "json")
@@ -0,0 +1,110 @@
+import json
+import random
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import crud
+from app.leaderboard_feed import LeaderboardFeed, apply_ops, diff_rows
+from app.main import app
+
+
+def _rows(*names):
+    return [{"username": n, "best": i} for i, n in enumerate(names)]
+
+
+def test_insert_at_top_sends_one_upsert_and_one_remove():
+    old = _rows(*"abcde")
+    new = [{"username": "z", "best": -1}] + old[:4]
+    ops = diff_rows(old, new)
+    assert ops == [
+        {"op": "remove", "key": "e"},
+        {"op": "upsert", "key": "z", "index": 0, "row": {"username": "z", "best": -1}},
+    ]
+    assert apply_ops(old, ops, len(new)) == new
+
+
+def test_diff_roundtrips_random_boards():
+    rng = random.Random(7)
+    pool = [f"u{i}" for i in range(15)]
+    for _ in range(500):
+        old = [{"username": k, "best": rng.randint(0, 2)} for k in rng.sample(pool, rng.randint(0, 10))]
+        new = [{"username": k, "best": rng.randint(0, 2)} for k in rng.sample(pool, rng.randint(0, 10))]
+        assert apply_ops(old, diff_rows(old, new), len(new)) == new
+
+
+def test_feed_versions_and_snapshot():
+    feed = LeaderboardFeed(top_n=3)
+    first = feed.publish("2099-01-01", _rows("a", "b", "c", "d"))
+    assert first["seq"] == 1 and first["base"] == 0 and first["size"] == 3
+    assert feed.publish("2099-01-01", _rows("a", "b", "c")) is None
+
+    second = feed.publish("2099-01-01", _rows("b", "a", "c"))
+    assert second["base"] == 1 and second["seq"] == 2
+    assert second["ops"] == [{"op": "upsert", "key": "b", "index": 0, "row": {"username": "b", "best": 0}},
+                             {"op": "upsert", "key": "a", "index": 1, "row": {"username": "a", "best": 1}}]
+    snap = feed.snapshot("2099-01-01")
+    assert snap["seq"] == 2 and snap["epoch"] == second["epoch"]
+    assert [r["username"] for r in snap["rows"]] == ["b", "a", "c"]
+
+
+def test_ws_leaderboard_sync_returns_snapshot(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'lf.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    crud.engine = engine
+    with Session(engine) as s:
+        p = crud.create_player(s, "carol", "GoodPass1")
+        crud.record_time(s, int(p.id), "2099-01-01", 40)
+
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"type": "leaderboard_sync", "date": "2099-01-01"}))
+        snap = json.loads(ws.receive_text())
+        assert snap["type"] == "leaderboard_snapshot" and snap["seq"] == 1
+        assert [r["username"] for r in snap["rows"]] == ["carol"]
+
+
+def test_stale_delta_is_not_sent_after_a_newer_one():
+    feed = LeaderboardFeed(top_n=3)
+    first = feed.publish("2099-01-01", _rows("a", "b"))
+    second = feed.publish("2099-01-01", _rows("b", "a"))
+    # The second delivery finished enrichment first
+    assert feed.mark_sent(second) is True
+    assert feed.mark_sent(first) is False
+    assert feed.mark_sent(second) is False
+    third = feed.publish("2099-01-01", _rows("c", "b", "a"))
+    assert feed.mark_sent(third) is True
+    # A dropped date starts over
+    feed.drop("2099-01-01")
+    assert feed.mark_sent(feed.publish("2099-01-01", _rows("a"))) is True
+
+
+def test_concurrent_updates_publish_in_read_order(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    import app.main as m
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'lf.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(crud, "engine", engine)
+    boards = iter([_rows("a"), _rows("b", "a")])
+    first_read = threading.Event()
+
+    def get_leaderboard(session, date, limit):
+        rows = next(boards)
+        if rows == _rows("a"):
+            first_read.set()
+            # The older read is slow; without the date lock the newer one would publish first
+            time.sleep(0.1)
+        return rows
+
+    monkeypatch.setattr(m.crud, "get_leaderboard", get_leaderboard)
+    event = {"type": "completion", "date": "2099-01-01"}
+    results = []
+    slow = threading.Thread(target=lambda: results.append(m._update_live_leaderboard(dict(event))))
+    slow.start()
+    first_read.wait(1)
+    results.append(m._update_live_leaderboard(dict(event)))
+    slow.join()
+    assert sorted(d["seq"] for d in results) == [1, 2]
+    assert [r["username"] for r in m._LEADERBOARD_FEED.snapshot("2099-01-01")["rows"]] == ["b", "a"]
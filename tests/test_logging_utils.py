@@ -0,0 +1,97 @@
+import io
+import json
+import logging
+import queue
+import time
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import logging_utils
+from app.logging_utils import JsonFormatter, _QueueHandler, request_id_ctx
+from app.middleware import RequestLoggingMiddleware
+
+
+def test_queue_handler_keeps_request_id_for_background_formatting():
+    q = queue.Queue()
+    handler = _QueueHandler(q)
+    stream = io.StringIO()
+    out = logging.StreamHandler(stream)
+    out.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(q, out)
+    listener.start()
+    log = logging.getLogger("test.queue")
+    log.propagate = False
+    log.addHandler(handler)
+    try:
+        token = request_id_ctx.set("rid-42")
+        log.warning("hello %s", "world", extra={"event": {"n": 1}})
+        request_id_ctx.reset(token)
+    finally:
+        listener.stop()
+        log.removeHandler(handler)
+    line = json.loads(stream.getvalue())
+    assert line["message"] == "hello world"
+    assert line["request_id"] == "rid-42" and line["event"] == {"n": 1}
+
+
+def test_queue_handler_drops_instead_of_blocking_when_full():
+    handler = _QueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "m", None, None)
+    handler.handle(record)
+    handler.handle(record)
+    assert handler.dropped == 1
+
+
+def test_setup_logging_uses_background_listener(monkeypatch):
+    monkeypatch.setenv("LOG_ASYNC", "1")
+    monkeypatch.setenv("LOG_FORMAT", "json")
+    try:
+        logging_utils.setup_logging(logging.INFO)
+        assert isinstance(logging.getLogger("uvicorn").handlers[0], _QueueHandler)
+        assert logging_utils.logging_stats()["async"] is True
+    finally:
+        logging_utils.setup_logging(logging.INFO)
+
+
+def _sampled_app(sample_rate, slow_ms=500):
+    app = FastAPI()
+
+    @app.get("/ok")
+    def ok():
+        return {"ok": True}
+
+    @app.get("/bad")
+    def bad():
+        raise HTTPException(status_code=404)
+
+    @app.get("/slow")
+    def slow():
+        time.sleep(0.02)
+        return {"ok": True}
+
+    app.add_middleware(RequestLoggingMiddleware, sample_rate=sample_rate, slow_ms=slow_ms)
+    return TestClient(app)
+
+
+def _request_lines(caplog):
+    return [r for r in caplog.records if r.name == "app.middleware" and r.getMessage() == "request"]
+
+
+def test_fast_successes_are_sampled_but_errors_and_slow_requests_always_logged(caplog):
+    caplog.set_level(logging.INFO, logger="app.middleware")
+    client = _sampled_app(sample_rate=0.0, slow_ms=10)
+    for _ in range(5):
+        client.get("/ok")
+    client.get("/bad")
+    client.get("/slow")
+    paths = [r.path for r in _request_lines(caplog)]
+    assert paths == ["/bad", "/slow"]
+
+
+def test_sampled_lines_carry_the_rate(caplog, monkeypatch):
+    caplog.set_level(logging.INFO, logger="app.middleware")
+    monkeypatch.setattr("app.middleware.random.random", lambda: 0.1)
+    _sampled_app(sample_rate=0.25).get("/ok")
+    lines = _request_lines(caplog)
+    assert len(lines) == 1 and lines[0].sample_rate == 0.25
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import anyio
+import anyio.to_thread
+
+from app.loopmon import LoopLagMonitor, configure_threadpool
+from app.metrics import REGISTRY
+
+
+def test_threadpool_in_use_and_waiting_are_sampled():
+    mon = LoopLagMonitor(interval=0.01, warn_seconds=10, saturation_warn_interval=0)
+
+    async def run():
+        assert configure_threadpool(2) == 2
+        try:
+            mon.start()
+            async with anyio.create_task_group() as tg:
+                for _ in range(4):
+                    tg.start_soon(anyio.to_thread.run_sync, time.sleep, 0.1)
+                await asyncio.sleep(0.05)
+                mon.sample_threadpool()
+        finally:
+            mon.stop()
+            configure_threadpool(40)
+
+    anyio.run(run)
+    tp = mon.snapshot()["threadpool"]
+    assert tp["size"] == 2
+    assert tp["max_in_use"] == 2 and tp["max_waiting"] == 2
+    assert tp["saturated_ticks"] >= 1
+
+
+def test_slow_callbacks_are_counted_and_exported():
+    mon = LoopLagMonitor(interval=0.01, warn_seconds=10, slow_callback_seconds=0.05)
+    before = REGISTRY.value("event_loop_slow_callbacks_total") or 0
+
+    async def run():
+        mon.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.08)  # one blocking callback
+        await asyncio.sleep(0.03)
+        mon.stop()
+
+    anyio.run(run)
+    assert mon.slow_callbacks >= 1
+    assert REGISTRY.value("event_loop_slow_callbacks_total") == before + mon.slow_callbacks
+    text = mon.render_prometheus()
+    assert "daily_set_threadpool_size 40" in text
+    assert "# TYPE daily_set_threadpool_waiting gauge" in text
+
+
+def test_metrics_endpoint_includes_loop_and_threadpool():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    out = TestClient(app).get("/metrics").text
+    assert "# TYPE daily_set_event_loop_lag_seconds histogram" in out
+    assert "daily_set_threadpool_in_use" in out
+
+
+def test_snapshot_histogram_comes_from_the_registry():
+    mon = LoopLagMonitor(interval=0.01, warn_seconds=10)
+    before = mon.snapshot()["histogram"]
+    mon.observe(0.02)
+    after = mon.snapshot()["histogram"]
+    assert after["count"] == before["count"] + 1
+    assert after == REGISTRY.histogram("event_loop_lag_seconds", "").snapshot()
+    assert [b for b, _ in after["buckets"]] == [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+    bucket_25ms = dict((b, n) for b, n in after["buckets"])[0.025]
+    assert bucket_25ms == dict((b, n) for b, n in before["buckets"])[0.025] + 1
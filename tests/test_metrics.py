@@ -0,0 +1,134 @@
+import asyncio
+import threading
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import create_engine
+
+from app.metrics import MetricsRegistry, REGISTRY, route_template
+from app.sqlmon import instrument_engine
+
+
+def test_shards_merge_across_threads_and_render():
+    reg = MetricsRegistry(prefix="t")
+    hits = reg.counter("hits_total", "Hits", ("ns",))
+    lat = reg.histogram("latency_seconds", "Latency", ("route",), buckets=(0.01, 0.1))
+
+    def work():
+        for _ in range(1000):
+            hits.inc(("a",))
+        lat.observe(0.05, ("/x",))
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    lat.observe(0.5, ("/x",))
+
+    assert reg.value("hits_total", ("a",)) == 4000
+    text_out = reg.render()
+    assert '# TYPE t_latency_seconds histogram' in text_out
+    assert 't_hits_total{ns="a"} 4000' in text_out
+    assert 't_latency_seconds_bucket{route="/x",le="0.01"} 0' in text_out
+    assert 't_latency_seconds_bucket{route="/x",le="0.1"} 4' in text_out
+    assert 't_latency_seconds_bucket{route="/x",le="+Inf"} 5' in text_out
+    assert 't_latency_seconds_count{route="/x"} 5' in text_out
+
+
+def test_exited_threads_shards_are_folded_not_kept():
+    reg = MetricsRegistry(prefix="t")
+    c = reg.counter("jobs_total", "Jobs")
+    h = reg.histogram("job_seconds", "Job time", buckets=(0.1, 1.0))
+
+    def work():
+        c.inc()
+        h.observe(0.5)
+
+    for _ in range(50):
+        t = threading.Thread(target=work)
+        t.start()
+        t.join()
+        assert len(reg._shards) <= 2
+    assert reg.value("jobs_total") == 50
+    assert reg.value("job_seconds") == [0, 50, 0, 25.0]
+    assert len(reg._shards) == 0
+
+
+def test_collectors_and_label_escaping():
+    reg = MetricsRegistry(prefix="t")
+    reg.counter("odd_total", "Odd labels", ("v",)).inc(('a"b\\c',))
+    reg.add_collector("broken", lambda: 1 / 0)
+    reg.add_collector("gauge", lambda: "t_up 1\n")
+    out = reg.render()
+    assert 't_odd_total{v="a\\"b\\\\c"} 1' in out
+    assert out.endswith("t_up 1\n")
+
+
+def test_route_template_never_uses_raw_path():
+    class _Route:
+        path = "/api/items/{item_id}"
+
+    assert route_template({"route": _Route(), "path": "/api/items/42"}) == "/api/items/{item_id}"
+    assert route_template({"route_template": "static", "path": "/favicon.ico"}) == "static"
+    assert route_template({"endpoint": object(), "root_path": "/static"}) == "/static"
+    assert route_template({"path": "/random/123"}) == "unmatched"
+
+
+def test_engine_statements_are_timed(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'm.db'}")
+    instrument_engine(engine)
+    instrument_engine(engine)  # idempotent
+    before = REGISTRY.value("db_query_duration_seconds", ("select",)) or [0]
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    after = REGISTRY.value("db_query_duration_seconds", ("select",))
+    assert sum(after[:-1]) == sum(before[:-1]) + 1
+
+
+def test_metrics_endpoint_reports_routes_rate_limits_and_realtime():
+    from app.main import app
+
+    client = TestClient(app)
+    client.get("/health")
+    for _ in range(12):
+        client.post("/api/submit_set", json={})
+    body = client.get("/metrics")
+    assert body.headers["content-type"].startswith("text/plain; version=0.0.4")
+    out = body.text
+    assert 'daily_set_http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in out
+    assert 'daily_set_rate_limit_rejections_total{route="/api/submit_set"}' in out
+    assert "daily_set_ws_connections 0" in out
+    assert 'daily_set_nats_publish_total{outcome="published"}' in out
+    assert "# TYPE daily_set_cache_hits_total counter" in out
+    assert out.count("# TYPE daily_set_cache_load_seconds histogram") == 1
+
+
+def test_metrics_endpoint_renders_on_the_loop_even_when_the_threadpool_is_full():
+    import anyio
+    import anyio.to_thread
+    import httpx
+
+    import app.main as m
+
+    assert asyncio.iscoroutinefunction(m.metrics)
+
+    async def run():
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        saved = limiter.total_tokens
+        limiter.total_tokens = 1
+        release = threading.Event()
+        try:
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(anyio.to_thread.run_sync, release.wait)
+                await anyio.sleep(0.05)
+                async with httpx.AsyncClient(app=m.app, base_url="http://t") as client:
+                    with anyio.fail_after(2):
+                        r = await client.get("/metrics")
+                release.set()
+        finally:
+            limiter.total_tokens = saved
+        return r
+
+    r = anyio.run(run)
+    assert r.status_code == 200 and "daily_set_ws_connections" in r.text
@@ -0,0 +1,60 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.logging_utils import request_id_ctx
+from app.middleware import RequestLoggingMiddleware, SecurityHeadersMiddleware, build_csp
+
+
+def _app(**security_kwargs):
+    app = FastAPI()
+
+    @app.get("/plain")
+    def plain():
+        return PlainTextResponse("ok", headers={"X-Frame-Options": "SAMEORIGIN", "Content-Security-Policy": "x"})
+
+    @app.get("/rid")
+    async def rid():
+        return {"rid": request_id_ctx.get()}
+
+    @app.get("/stream")
+    async def stream():
+        async def gen():
+            yield "a"
+            yield "b"
+        return StreamingResponse(gen(), media_type="text/plain")
+
+    app.add_middleware(SecurityHeadersMiddleware, **security_kwargs)
+    app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+def test_csp_is_replaced_and_defaults_do_not_override_response_headers():
+    r = TestClient(_app()).get("/plain")
+    assert r.headers["content-security-policy"] == build_csp()
+    assert r.headers["x-frame-options"] == "SAMEORIGIN"
+    assert r.headers["x-content-type-options"] == "nosniff"
+    assert r.headers["strict-transport-security"].startswith("max-age=")
+
+
+def test_csp_includes_realtime_gateway_origin(monkeypatch):
+    monkeypatch.setenv("REALTIME_WS_URL", "wss://rt.example.com:8443/ws")
+    r = TestClient(_app()).get("/plain")
+    assert "connect-src 'self' wss://rt.example.com:8443;" in r.headers["content-security-policy"]
+
+
+def test_request_id_is_bound_for_handler_and_echoed():
+    client = TestClient(_app())
+    r = client.get("/rid", headers={"X-Request-ID": "abc-123"})
+    assert r.json() == {"rid": "abc-123"}
+    assert r.headers["x-request-id"] == "abc-123"
+    generated = client.get("/rid")
+    assert generated.headers["x-request-id"] == generated.json()["rid"]
+    assert len(generated.headers["x-request-id"]) == 36
+    assert request_id_ctx.get() is None
+
+
+def test_streaming_response_passes_through_with_headers():
+    r = TestClient(_app()).get("/stream")
+    assert r.text == "ab"
+    assert "content-security-policy" in r.headers and "x-request-id" in r.headers
@@ -0,0 +1,142 @@
+import json
+import time
+
+import anyio
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app import crud, models, outbox
+from app.outbox import OutboxRelay
+from app.realtime_publisher import RealtimePublisher
+
+
+@pytest.fixture
+def engine(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(eng)
+    crud.engine = eng
+    yield eng
+    outbox.set_relay(None)
+
+
+def _rows(engine):
+    with Session(engine) as s:
+        return s.exec(select(models.RealtimeOutbox)).all()
+
+
+def _record(engine, seconds=42):
+    with Session(engine) as s:
+        crud.record_time(s, 1, "2099-01-01", seconds, events=[
+            {"type": "completion", "player_id": 1, "date": "2099-01-01", "seconds": seconds},
+        ])
+
+
+def test_events_are_staged_with_the_completion_only_when_relay_active(engine):
+    _record(engine)
+    assert _rows(engine) == []
+
+    outbox.set_relay(OutboxRelay(lambda: engine))
+    _record(engine, 40)
+    [row] = _rows(engine)
+    assert row.room == "daily-20990101"
+    assert json.loads(row.event_json)["seconds"] == 40
+    with Session(engine) as s:
+        assert len(s.exec(select(models.Completion)).all()) == 2
+
+
+def test_relay_deletes_only_after_ack_and_retries_failures(engine):
+    relay = OutboxRelay(lambda: engine, batch_size=10)
+    outbox.set_relay(relay)
+    _record(engine, 1)
+    _record(engine, 2)
+    sent = []
+
+    async def unreachable(batch):
+        raise ConnectionError("NATS unavailable")
+
+    async def failing(batch):
+        raise RuntimeError("flush timeout")
+
+    async def ok(batch):
+        sent.extend(batch)
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await relay.relay_once(unreachable)
+        assert [r.attempts for r in _rows(engine)] == [0, 0]
+        with pytest.raises(RuntimeError):
+            await relay.relay_once(failing)
+        assert [r.attempts for r in _rows(engine)] == [1, 1]
+        assert relay.stats()["pending"] == 2
+        # Rows that failed before are retried one at a time
+        assert await relay.relay_once(ok) == 1
+        assert await relay.relay_once(ok) == 1
+        assert await relay.relay_once(ok) == 0
+
+    anyio.run(run)
+    assert _rows(engine) == []
+    assert [item[1]["event"]["seconds"] for item in sent] == [1, 2]
+    assert sent[0][2].startswith("outbox-")
+    assert relay.stats()["relayed"] == 2 and relay.stats()["pending"] == 0
+
+
+def test_rejected_row_is_dead_lettered_without_blocking_the_rest(engine):
+    relay = OutboxRelay(lambda: engine, batch_size=10, max_attempts=3)
+    outbox.set_relay(relay)
+    for seconds in (1, 2, 3):
+        _record(engine, seconds)
+    sent = []
+
+    async def reject_two(batch):
+        if any(item[1]["event"]["seconds"] == 2 for item in batch):
+            raise ValueError("maximum payload exceeded")
+        sent.extend(batch)
+
+    async def run():
+        for _ in range(10):
+            try:
+                await relay.relay_once(reject_two)
+            except ValueError:
+                pass
+
+    anyio.run(run)
+    assert [item[1]["event"]["seconds"] for item in sent] == [1, 3]
+    [dead] = _rows(engine)
+    assert json.loads(dead.event_json)["seconds"] == 2 and dead.attempts == 3
+    stats = relay.stats()
+    assert stats["dead_lettered"] == 1 and stats["pending"] == 0
+    assert relay.count_pending() == 0
+
+
+def test_publisher_relays_outbox_through_fake_nats(engine):
+    received = []
+
+    class FakeNATS:
+        is_closed = False
+
+        async def publish(self, subject, data):
+            received.append((subject, json.loads(data)))
+
+        async def flush(self, timeout=None):
+            pass
+
+        async def close(self):
+            pass
+
+    async def connect(url):
+        return FakeNATS()
+
+    relay = OutboxRelay(lambda: engine, interval=0.01)
+    outbox.set_relay(relay)
+    _record(engine, 7)
+
+    pub = RealtimePublisher("nats://fake", connect=connect)
+    pub.attach_outbox(relay)
+    pub.start()
+    deadline = time.time() + 2
+    while time.time() < deadline and (not received or _rows(engine)):
+        time.sleep(0.01)
+    pub.stop()
+    assert received[0][0] == "room.daily-20990101.update"
+    assert received[0][1]["payload"]["event"]["seconds"] == 7
+    assert _rows(engine) == []
@@ -0,0 +1,124 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware import RequestLoggingMiddleware
+from app.profiling import ProfilingMiddleware, SamplingProfiler, sign_debug_token, verify_debug_token
+
+
+def _busy(seconds: float) -> int:
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def _app(profiler: SamplingProfiler) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/work/{item}")
+    def work(item: str):
+        return {"n": _busy(0.05)}
+
+    @app.get("/async-work")
+    async def async_work():
+        return {"n": _busy(0.05)}
+
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    return TestClient(app)
+
+
+def _wait_for(path, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if path.exists() and path.read_text():
+            return path.read_text()
+        time.sleep(0.02)
+    raise AssertionError(f"{path} not written")
+
+
+def test_debug_token_signature_and_expiry():
+    token = sign_debug_token("s3cret", 2000)
+    assert verify_debug_token("s3cret", token, now=1000)
+    assert not verify_debug_token("s3cret", token, now=3000)
+    assert not verify_debug_token("other", token, now=1000)
+    assert not verify_debug_token(None, token, now=1000)
+    assert not verify_debug_token("s3cret", "2000.deadbeef", now=1000)
+    assert not verify_debug_token("s3cret", "garbage", now=1000)
+
+
+def test_sampled_slow_requests_are_collapsed_per_route(tmp_path):
+    profiler = SamplingProfiler(tmp_path, sample_rate=1.0, interval=0.001, slow_ms=10)
+    client = _app(profiler)
+    assert client.get("/work/1").status_code == 200
+    assert client.get("/async-work").status_code == 200
+
+    sync_profile = _wait_for(tmp_path / "work_item.collapsed")
+    line = sync_profile.splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert int(count) >= 1
+    # Stacks are rooted at the endpoint function, not the threadpool machinery
+    assert stack.startswith("test_profiling.py:_app.<locals>.work")
+    assert "test_profiling.py:_busy" in sync_profile
+    assert "test_profiling.py:_busy" in _wait_for(tmp_path / "async_work.collapsed")
+    assert profiler.stats()["profiled"] == 2 and profiler.stats()["active"] == 0
+
+
+def test_fast_requests_are_not_written_and_sample_rate_zero_skips(tmp_path):
+    profiler = SamplingProfiler(tmp_path, sample_rate=1.0, interval=0.001, slow_ms=10_000)
+    _app(profiler).get("/work/1")
+    time.sleep(0.1)
+    assert profiler.list_profiles() == []
+
+    idle = SamplingProfiler(tmp_path, sample_rate=0.0, secret="s3cret")
+    _app(idle).get("/work/1", headers={"X-Debug-Profile": "1.bad"})
+    assert idle.stats()["profiled"] == 0
+
+
+def test_signed_header_forces_a_per_request_profile(tmp_path):
+    profiler = SamplingProfiler(tmp_path, sample_rate=0.0, interval=0.001, slow_ms=10_000, secret="s3cret")
+    token = sign_debug_token("s3cret", int(time.time()) + 60)
+    r = _app(profiler).get("/work/1", headers={"X-Debug-Profile": token, "X-Request-ID": "req-abc"})
+    assert r.status_code == 200
+    _wait_for(tmp_path / "work_item.collapsed")
+    assert profiler.stats()["forced"] == 1
+    names = [p["name"] for p in profiler.list_profiles()]
+    assert any(n.startswith("request-") for n in names)
+
+
+def test_request_file_name_is_sanitized_and_files_rotate(tmp_path):
+    profiler = SamplingProfiler(tmp_path, sample_rate=0.0, interval=0.001, slow_ms=10_000, secret="s3cret")
+    token = sign_debug_token("s3cret", int(time.time()) + 60)
+    client = _app(profiler)
+    client.app.add_middleware(RequestLoggingMiddleware)  # sets the request id the profiler reads
+    r = client.get("/work/1", headers={"X-Debug-Profile": token, "X-Request-ID": "../etc/x y"})
+    assert r.status_code == 200
+    text = _wait_for(tmp_path / "request-.._etc_x_y.collapsed")
+    assert profiler.profile_path("request-.._etc_x_y.collapsed") is not None
+    assert "request-.._etc_x_y.collapsed" in [p["name"] for p in profiler.list_profiles()]
+
+    profiler.max_file_bytes = len(text) + 1
+    route_file = tmp_path / "work_item.collapsed"
+    _wait_for(route_file)
+    profiler._append(route_file, text)
+    assert (tmp_path / "work_item.1.collapsed").is_file() and route_file.read_text() == text
+    assert profiler.stats()["rotations"] == 1
+
+
+def test_admin_endpoints_require_the_secret(tmp_path, monkeypatch):
+    from app import main
+
+    profiler = SamplingProfiler(tmp_path, secret="s3cret")
+    (tmp_path / "api_daily.collapsed").write_text("a;b 3\n")
+    monkeypatch.setattr(main, "_PROFILER", profiler)
+    client = TestClient(main.app)
+
+    assert client.get("/api/admin/profiles").status_code == 404
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Token": "nope"}).status_code == 404
+    listing = client.get("/api/admin/profiles", headers={"X-Admin-Token": "s3cret"}).json()
+    assert [p["name"] for p in listing["profiles"]] == ["api_daily.collapsed"]
+    r = client.get("/api/admin/profiles/api_daily.collapsed", headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200 and r.text == "a;b 3\n"
+    assert client.get("/api/admin/profiles/..%2Fset.db", headers={"X-Admin-Token": "s3cret"}).status_code == 404
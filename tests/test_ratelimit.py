@@ -0,0 +1,91 @@
+import threading
+import time
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine
+
+from app import crud
+from app.main import app
+from app.ratelimit import SlidingWindowRateLimiter, SQLiteRateLimiter
+
+
+def test_sliding_window_weights_previous_window(monkeypatch):
+    t = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: t[0])
+    rl = SlidingWindowRateLimiter()
+    results = [rl.hit('ip', 4, 10) for _ in range(5)]
+    assert [r.allowed for r in results] == [True, True, True, True, False]
+    assert [r.remaining for r in results[:4]] == [3, 2, 1, 0]
+
+    # Halfway through the next window half of the previous count still applies
+    t[0] = 1015.0
+    assert rl.hit('ip', 4, 10).allowed is True
+    assert rl.hit('ip', 4, 10).allowed is True
+    assert rl.hit('ip', 4, 10).allowed is False
+
+
+def test_idle_keys_are_evicted_and_memory_is_capped(monkeypatch):
+    t = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: t[0])
+    rl = SlidingWindowRateLimiter(max_keys=32, idle_seconds=60, shards=4, sweep_interval=0)
+    for i in range(100):
+        rl.hit(f'ip-{i}', 10, 60)
+    assert len(rl) <= 32
+    assert rl.evictions >= 68
+
+    t[0] += 61
+    rl.hit('fresh', 10, 60)
+    # Sweeping happens per shard as it is touched; touch them all
+    i = 0
+    while not all(shard.last_sweep == t[0] for shard in rl._shards):
+        rl.hit(f'fresh-{i}', 10, 60)
+        i += 1
+    assert all(not k.startswith('ip-') for shard in rl._shards for k in shard.entries)
+
+
+def test_concurrent_hits_never_exceed_limit():
+    rl = SlidingWindowRateLimiter()
+    allowed = []
+
+    def worker():
+        for _ in range(50):
+            if rl.hit('shared', 100, 3600).allowed:
+                allowed.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert len(allowed) == 100
+
+
+def test_sqlite_limiter_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'rl.sqlite3')
+    worker_a = SQLiteRateLimiter(path)
+    worker_b = SQLiteRateLimiter(path)
+    assert worker_a.hit('ip', 2, 3600).allowed is True
+    assert worker_b.hit('ip', 2, 3600).allowed is True
+    assert worker_a.hit('ip', 2, 3600).allowed is False
+    worker_b.clear()
+    assert len(worker_a) == 0
+
+
+def test_ratelimit_headers_on_success_and_429(tmp_path):
+    db = tmp_path / 'rl.db'
+    engine = create_engine(f'sqlite:///{db}', connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    crud.engine = engine
+    client = TestClient(app)
+
+    r = client.get('/api/leaderboard', params={"date": "2099-01-01"})
+    assert r.status_code == 200
+    assert r.headers['RateLimit-Limit'] == '20'
+    assert r.headers['RateLimit-Remaining'] == '19'
+    assert int(r.headers['RateLimit-Reset']) >= 1
+
+    for _ in range(19):
+        client.get('/api/leaderboard', params={"date": "2099-01-01"})
+    r = client.get('/api/leaderboard', params={"date": "2099-01-01"})
+    assert r.status_code == 429
+    assert r.headers['RateLimit-Remaining'] == '0'
+    assert 'Retry-After' in r.headers
@@ -0,0 +1,127 @@
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import anyio
+from fastapi.testclient import TestClient
+from sqlmodel import create_engine
+
+from app.cache import cache_daily_board, invalidate_daily_board_cache
+from app.readiness import DEGRADED, NOT_READY, OK, ReadinessChecker, Threshold, probe_publisher
+
+DATE = "2099-06-01"
+_IDLE_LOOP = {'recent_lag_p90_seconds': 0.0, 'threadpool': {'waiting': 0}}
+
+
+def _checker(**overrides):
+    kwargs = dict(db_read=Threshold(500, 2000), write_lock=Threshold(150, 200), loop_lag=Threshold(100, 1000), fail_after=1)
+    kwargs.update(overrides)
+    return ReadinessChecker(**kwargs)
+
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'ready.db'}", connect_args={"check_same_thread": False})
+
+
+def test_ready_when_warm_and_degraded_on_cold_board_cache(tmp_path):
+    engine = _engine(tmp_path)
+    cache_daily_board(DATE, [[0, 1, 2, 0]])
+    try:
+        report = _checker().check(engine, DATE, lambda: {'enabled': False}, lambda: _IDLE_LOOP)
+    finally:
+        invalidate_daily_board_cache(DATE)
+    assert report['status'] == "ready"
+    assert report['checks']['db_read']['status'] == OK and report['checks']['db_write_lock']['wait_ms'] >= 0
+
+    cold = _checker().check(engine, DATE, lambda: {'enabled': False}, lambda: _IDLE_LOOP)
+    assert cold['status'] == "degraded"
+    assert cold['checks']['board_cache'] == {'status': DEGRADED, 'date': DATE, 'cached': False}
+
+
+def test_held_writer_lock_is_not_ready(tmp_path):
+    engine = _engine(tmp_path)
+    with engine.begin():
+        pass
+    holder = sqlite3.connect(str(tmp_path / 'ready.db'), isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        report = _checker().check(engine, DATE, lambda: {'enabled': False}, lambda: _IDLE_LOOP)
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+    lock = report['checks']['db_write_lock']
+    assert report['status'] == "not_ready"
+    assert lock['status'] == NOT_READY and "locked" in lock['error'] and lock['wait_ms'] >= 150
+    # The probe restores the connection's own busy timeout
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_publisher_and_startup_grading(tmp_path):
+    assert probe_publisher({'enabled': True, 'connected': True, 'queue_depth': 10, 'max_queue': 100}, 0.5)['status'] == OK
+    assert probe_publisher({'enabled': True, 'connected': True, 'queue_depth': 60, 'max_queue': 100}, 0.5)['status'] == DEGRADED
+    assert probe_publisher({'enabled': True, 'connected': False, 'queue_depth': 0, 'max_queue': 100}, 0.5)['status'] == DEGRADED
+
+    engine = _engine(tmp_path)
+    checker = _checker()
+    warm_failed = checker.check(engine, DATE, lambda: {'enabled': False}, lambda: _IDLE_LOOP, {'migrations': None, 'cache_warm': "boom"})
+    assert warm_failed['checks']['startup'] == {'status': DEGRADED, 'failed': {'cache_warm': "boom"}}
+    # A restart would not fix a failed migration, so it must not pull the machine
+    migrations_failed = checker.check(engine, DATE, lambda: {'enabled': False}, lambda: _IDLE_LOOP, {'migrations': "no such column"})
+    assert migrations_failed['status'] == "degraded"
+    assert migrations_failed['checks']['startup']['status'] == DEGRADED
+
+
+def test_not_ready_only_after_consecutive_failures(tmp_path):
+    engine = _engine(tmp_path)
+    checker = _checker(fail_after=3)
+    stalled = {'recent_lag_p90_seconds': 2.0, 'threadpool': {'waiting': 0}}
+    statuses = [checker.check(engine, DATE, lambda: {'enabled': False}, lambda: stalled)['status'] for _ in range(3)]
+    assert statuses == ["degraded", "degraded", "not_ready"]
+    assert checker.check(engine, DATE, lambda: {'enabled': False}, lambda: _IDLE_LOOP)['failing'] == 0
+
+
+def test_blocking_probes_time_out_off_the_loop(tmp_path, monkeypatch):
+    checker = _checker()
+    monkeypatch.setattr(checker, "probe_blocking", lambda engine, today: time.sleep(0.5))
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run():
+        return await checker.check_async(
+            None, DATE, lambda: {'enabled': False}, lambda: _IDLE_LOOP, executor=executor, timeout=0.05
+        )
+
+    try:
+        report = anyio.run(run)
+    finally:
+        executor.shutdown(wait=True)
+    assert report['status'] == "not_ready"
+    assert report['checks']['db_read'] == {'status': NOT_READY, 'error': "timed out after 0.05s"}
+
+
+def test_ready_endpoint_returns_503_on_loop_lag(tmp_path, monkeypatch):
+    import app.main as m
+
+    monkeypatch.setattr(m.crud, "engine", _engine(tmp_path))
+    cache_daily_board(m.game.today_str(), [[0, 1, 2, 0]])
+    client = TestClient(m.app)
+    try:
+        r = client.get("/ready")
+        assert r.status_code == 200 and r.json()['status'] in ("ready", "degraded")
+        assert set(r.json()['checks']) >= {'db_read', 'db_write_lock', 'board_cache', 'publisher', 'event_loop'}
+
+        # One stalled tick is outside the p90, so it does not count
+        monkeypatch.setattr(m._LOOP_LAG, "_recent", deque([0.0] * 19 + [5.0], maxlen=20))
+        assert client.get("/ready").json()['checks']['event_loop']['status'] == OK
+
+        monkeypatch.setattr(m._LOOP_LAG, "_recent", deque([5.0] * 20, maxlen=20))
+        monkeypatch.setattr(m._READINESS, "failing", 0)
+        for _ in range(m._READINESS.fail_after - 1):
+            r = client.get("/ready")
+            assert r.status_code == 200 and r.json()['status'] == "degraded"
+        r = client.get("/ready")
+        assert r.status_code == 503 and r.json()['status'] == "not_ready"
+        assert r.json()['checks']['event_loop']['status'] == NOT_READY
+    finally:
+        invalidate_daily_board_cache(m.game.today_str())
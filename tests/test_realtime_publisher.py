@@ -0,0 +1,89 @@
+import json
+import time
+
+from app.realtime_publisher import RealtimePublisher, get_publisher, publish_room_update_sync
+
+
+class FakeNATS:
+    def __init__(self, fail_publishes=0):
+        self.messages = []
+        self.flushes = 0
+        self.fail_publishes = fail_publishes
+        self.is_closed = False
+
+    async def publish(self, subject, data):
+        if self.fail_publishes:
+            self.fail_publishes -= 1
+            raise ConnectionError("broker gone")
+        self.messages.append((subject, json.loads(data)))
+
+    async def flush(self, timeout=None):
+        self.flushes += 1
+
+    async def close(self):
+        self.is_closed = True
+
+
+def _wait_for(cond, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_publishes_in_batches_from_background_thread():
+    nc = FakeNATS()
+
+    async def connect(url):
+        return nc
+
+    pub = RealtimePublisher("nats://fake", flush_interval=0.05, connect=connect)
+    for i in range(20):
+        assert pub.publish("daily-20990101", {"event": {"n": i}})
+    assert _wait_for(lambda: len(nc.messages) == 20)
+    pub.stop()
+    subject, env = nc.messages[0]
+    assert subject == "room.daily-20990101.update"
+    assert env["type"] == "update" and env["payload"] == {"event": {"n": 0}}
+    # Buffered before the first drain, so a single flush covers the batch
+    assert nc.flushes < 20
+    stats = pub.stats()
+    assert stats["published"] == 20 and stats["queue_depth"] == 0
+
+
+def test_bounded_buffer_drops_and_counts():
+    async def never_connect(url):
+        raise ConnectionError("down")
+
+    pub = RealtimePublisher("nats://fake", max_queue=5, backoff_initial=10, connect=never_connect)
+    accepted = [pub.publish("r", {"i": i}) for i in range(8)]
+    assert accepted == [True] * 5 + [False] * 3
+    stats = pub.stats()
+    assert stats["dropped"] == 3 and stats["queue_depth"] == 5 and stats["connected"] is False
+    pub.stop(timeout=0.1)
+
+
+def test_failed_batch_is_retried_after_reconnect():
+    clients = [FakeNATS(fail_publishes=1), FakeNATS()]
+    attempts = []
+
+    async def connect(url):
+        attempts.append(url)
+        return clients[min(len(attempts) - 1, 1)]
+
+    pub = RealtimePublisher("nats://fake", flush_interval=0.01, backoff_initial=0.01, connect=connect)
+    pub.publish("r", {"i": 1})
+    pub.publish("r", {"i": 2})
+    assert _wait_for(lambda: len(clients[1].messages) == 2)
+    pub.stop()
+    assert [env["payload"]["i"] for _, env in clients[1].messages] == [1, 2]
+    assert pub.stats()["failures"] == 1 and pub.stats()["reconnects"] == 1
+
+
+def test_disabled_without_nats_url(monkeypatch):
+    monkeypatch.delenv("NATS_URL", raising=False)
+    publish_room_update_sync("r", {"x": 1})
+    assert get_publisher().stats()["enabled"] is False
+    assert get_publisher().stats()["enqueued"] == 0
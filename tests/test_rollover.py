@@ -0,0 +1,118 @@
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, create_engine, Session
+
+from app import crud, models, rollover
+from app.cache import (
+    get_cache,
+    get_cached_daily_board,
+    get_cached_final_leaderboard,
+    cache_leaderboard,
+    get_cached_leaderboard,
+)
+from app.main import app
+
+
+def setup_db(tmp_path):
+    db = tmp_path / 'rollover.db'
+    engine = create_engine(f'sqlite:///{db}', connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    crud.engine = engine
+    return engine
+
+
+def test_prewarm_runs_before_utc_midnight(tmp_path):
+    setup_db(tmp_path)
+    get_cache().clear()
+    sched = rollover.RolloverScheduler(prewarm_lead_seconds=300, finalize_grace_seconds=3600)
+
+    # Well before the prewarm window: nothing cached, next wake is the prewarm time
+    wait = sched.tick(datetime(2099, 3, 1, 12, 0, tzinfo=timezone.utc))
+    assert get_cached_daily_board('2099-03-02') is None
+    assert 0 < wait <= 12 * 3600 - 300
+
+    sched.tick(datetime(2099, 3, 1, 23, 56, tzinfo=timezone.utc))
+    assert get_cached_daily_board('2099-03-02') is not None
+
+
+def test_rollover_drops_hot_keys_and_runs_hooks(tmp_path, monkeypatch):
+    setup_db(tmp_path)
+    monkeypatch.setattr(rollover, "_ROLLOVER_HOOKS", [])
+    get_cache().clear()
+    calls = []
+    rollover.register_rollover_hook(lambda finished, new: calls.append((finished, new)))
+    sched = rollover.RolloverScheduler(prewarm_lead_seconds=300, finalize_grace_seconds=3600)
+
+    sched.tick(datetime(2099, 3, 1, 23, 59, tzinfo=timezone.utc))
+    cache_leaderboard('2099-03-01', [{"username": "x"}])
+    sched.tick(datetime(2099, 3, 2, 0, 0, 1, tzinfo=timezone.utc))
+
+    assert get_cached_leaderboard('2099-03-01') is None
+    assert get_cached_daily_board('2099-03-01') is None
+    assert get_cached_daily_board('2099-03-02') is not None
+    assert ('2099-03-01', '2099-03-02') in calls
+
+
+def test_finalize_snapshots_leaderboard_immutably(tmp_path):
+    engine = setup_db(tmp_path)
+    get_cache().clear()
+    with Session(engine) as s:
+        p = models.Player(username='alice', password_hash='x')
+        s.add(p); s.commit(); s.refresh(p)
+        assert p.id is not None
+        pid = int(p.id)
+        crud.record_time(s, pid, '2099-03-01', 30)
+
+    sched = rollover.RolloverScheduler(prewarm_lead_seconds=300, finalize_grace_seconds=3600)
+    # Within the grace period the day is not finalized yet
+    sched.tick(datetime(2099, 3, 2, 0, 30, tzinfo=timezone.utc))
+    with Session(engine) as s:
+        assert crud.get_leaderboard_snapshot(s, '2099-03-01') is None
+
+    sched.tick(datetime(2099, 3, 2, 1, 0, 1, tzinfo=timezone.utc))
+    with Session(engine) as s:
+        snap = crud.get_leaderboard_snapshot(s, '2099-03-01')
+        assert snap and snap[0]['username'] == 'alice'
+        # Later completions do not alter an existing snapshot
+        crud.record_time(s, pid, '2099-03-01', 10)
+        crud.save_leaderboard_snapshot(s, '2099-03-01', crud.get_leaderboard(s, '2099-03-01', limit=None))
+        assert crud.get_leaderboard_snapshot(s, '2099-03-01')[0]['best'] == 30
+    assert get_cached_final_leaderboard('2099-03-01') == snap
+
+
+def test_leaderboard_endpoint_serves_final_snapshot_for_past_dates(tmp_path):
+    engine = setup_db(tmp_path)
+    get_cache().clear()
+    rows = [{"username": f"u{i}", "best": i, "completed_at": None, "sets_found": 1, "effective": float(i)} for i in range(5)]
+    with Session(engine) as s:
+        crud.save_leaderboard_snapshot(s, '2020-01-01', rows)
+    client = TestClient(app)
+    r = client.get('/api/leaderboard', params={"date": "2020-01-01", "limit": 3})
+    assert r.status_code == 200
+    assert r.json()["leaders"] == rows[:3]
+
+
+def test_rollover_forgets_finished_day_realtime_state(tmp_path, monkeypatch):
+    import anyio
+    import app.main as m
+
+    setup_db(tmp_path)
+    monkeypatch.setattr(rollover, "_ROLLOVER_HOOKS", [])
+    rollover.register_rollover_hook(m._on_rollover)
+    m._LEADERBOARD_FEED.publish('2099-03-01', [{"username": "alice", "best": 30}])
+    m._LEADERBOARD_FEED.publish('2099-03-02', [{"username": "bob", "best": 40}])
+    anyio.run(m._BROADCAST_COALESCER.submit, {"type": "noop_rollover", "date": "2099-03-01"})
+    before_id = m._SSE_HUB.event_id(m._SSE_HUB.publish('{"a":1}', m.room_for_date('2099-03-01')) - 1)
+    assert m._BROADCAST_COALESCER.stats()['open_windows'] == 1
+
+    sched = rollover.RolloverScheduler(prewarm_lead_seconds=300, finalize_grace_seconds=3600)
+    sched.tick(datetime(2099, 3, 1, 23, 59, tzinfo=timezone.utc))
+    sched.tick(datetime(2099, 3, 2, 0, 0, 1, tzinfo=timezone.utc))
+
+    assert m._LEADERBOARD_FEED.snapshot('2099-03-01') is None
+    assert m._LEADERBOARD_FEED.snapshot('2099-03-02') is not None
+    assert m._BROADCAST_COALESCER.stats()['open_windows'] == 0
+    room = m.room_for_date('2099-03-01')
+    assert all(e[1] != room for e in m._SSE_HUB._history)
+    # A client resuming yesterday's room from before the drop is told to refetch
+    assert m._SSE_HUB.replay(before_id, room) is None
@@ -2,6 +2,7 @@ import asyncio
 from fastapi.testclient import TestClient
 from sqlmodel import SQLModel, create_engine
 from app.main import app, _WS_CONNECTIONS, broadcast_event, WebSocketDisconnect
+from app.connections import ConnectionManager
 from app import crud
 
 
@@ -30,7 +31,7 @@ def test_websocket_connect_and_disconnect(tmp_path):
         ws.send_text('ping')
     # exiting context closes connection; registry cleanup happens in server handler
     # Not directly observable, but ensure registry doesn't explode
-    assert isinstance(_WS_CONNECTIONS, dict)
+    assert isinstance(_WS_CONNECTIONS, ConnectionManager)
 
 
 def test_broadcast_cleanup_on_send_failure(monkeypatch):
@@ -45,8 +46,11 @@ def test_broadcast_cleanup_on_send_failure(monkeypatch):
     _WS_CONNECTIONS.clear()
     _WS_CONNECTIONS[ws] = {"last_sent": 0}
 
-    # Broadcast any event; failure should remove ws from registry
+    # Broadcast any event; failure in the writer should remove ws from registry
     import anyio
-    anyio.run(broadcast_event, {"type": "x"})
+    async def _broadcast_and_flush():
+        await broadcast_event({"type": "x"})
+        await _WS_CONNECTIONS.flush()
+    anyio.run(_broadcast_and_flush)
 
     assert ws not in _WS_CONNECTIONS
@@ -0,0 +1,91 @@
+import contextvars
+import logging
+import threading
+
+from sqlalchemy import text
+from sqlmodel import create_engine
+
+from app.sqlmon import QueryMonitor, fingerprint
+
+
+def _engine(tmp_path, monitor):
+    engine = create_engine(f"sqlite:///{tmp_path / 'q.db'}")
+    monitor.instrument(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)"))
+    return engine
+
+
+def test_fingerprint_strips_literals():
+    a = fingerprint("SELECT * FROM player WHERE id = 12 AND name = 'bob'")
+    b = fingerprint("SELECT *  FROM player\n WHERE id = 7 AND name = 'it''s'")
+    assert a == b == "SELECT * FROM player WHERE id = ? AND name = ?"
+    assert fingerprint("SELECT x FROM t WHERE id IN (1, 2, 3)") == "SELECT x FROM t WHERE id IN (?+)"
+
+
+def test_counts_statements_per_request_and_flags_repeats(tmp_path, caplog):
+    monitor = QueryMonitor(query_budget=3, repeat_threshold=3)
+    engine = _engine(tmp_path, monitor)
+    current = monitor.begin_request()
+    with engine.connect() as conn:
+        for i in range(4):
+            conn.execute(text("SELECT name FROM t WHERE id = :id"), {"id": i})
+    with caplog.at_level(logging.WARNING, logger="app.sqlmon"):
+        queries = monitor.finish_request(current, "/api/things", "GET")
+    assert queries.count == 4 and queries.seconds > 0
+    record = next(r for r in caplog.records if r.getMessage() == "query_budget_exceeded")
+    assert record.event["repeated"] == [{"fingerprint": "SELECT name FROM t WHERE id = ?", "count": 4}]
+    assert monitor.stats()["requests_over_budget"] == 1
+    assert monitor.stats()["requests_with_repeats"] == 1
+    assert monitor.stats()["in_flight_requests"] == 0
+
+
+def test_statements_outside_a_request_are_not_attributed(tmp_path):
+    monitor = QueryMonitor()
+    engine = _engine(tmp_path, monitor)
+    current = monitor.begin_request()
+
+    def background():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    # A plain thread (e.g. the rollover scheduler) does not inherit the request's context
+    t = threading.Thread(target=background)
+    t.start()
+    t.join()
+    assert monitor.finish_request(current, "/x").count == 0
+
+
+def test_concurrent_requests_keep_separate_counts(tmp_path):
+    monitor = QueryMonitor()
+    engine = _engine(tmp_path, monitor)
+
+    def request(n):
+        queries = monitor.begin_request()
+        with engine.connect() as conn:
+            for _ in range(n):
+                conn.execute(text("SELECT 1"))
+        return queries
+
+    # Each request runs in its own context, as ASGI tasks do, even when
+    # clients send the same X-Request-ID
+    first = contextvars.copy_context().run(request, 2)
+    second = contextvars.copy_context().run(request, 5)
+    assert monitor.stats()["in_flight_requests"] == 2
+    assert monitor.finish_request(first, "/a").count == 2
+    assert monitor.finish_request(second, "/b").count == 5
+    assert monitor.stats()["in_flight_requests"] == 0
+
+
+def test_slow_query_fingerprints_are_bounded(tmp_path):
+    monitor = QueryMonitor(slow_ms=0.000001, max_fingerprints=2)
+    engine = _engine(tmp_path, monitor)
+    with engine.connect() as conn:
+        for i in range(3):
+            conn.execute(text(f"SELECT {i} FROM t"))
+        conn.execute(text("SELECT count(*) FROM t WHERE name = 'x'"))
+    slow = monitor.slow_queries()
+    assert len(slow) == 2
+    assert {"SELECT ? FROM t"} <= {s["fingerprint"] for s in slow}
+    assert next(s for s in slow if s["fingerprint"] == "SELECT ? FROM t")["count"] == 3
+    assert monitor.stats()["slow_fingerprints_dropped"] >= 1
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import anyio
+from fastapi.testclient import TestClient
+
+from app.sse import SSEHub, sse_stream
+
+
+def test_publish_is_scoped_to_room_and_undated_events_reach_everyone():
+    hub = SSEHub()
+
+    async def run():
+        day = hub.subscribe("daily-20990101")
+        other = hub.subscribe("daily-20990102")
+        everything = hub.subscribe(None)
+        hub.publish('{"a":1}', room="daily-20990101")
+        hub.publish('{"b":2}', room=None)
+        return [len(s.pending) for s in (day, other, everything)]
+
+    assert anyio.run(run) == [2, 1, 2]
+
+
+def test_replay_returns_missed_events_for_room_or_none_when_unavailable():
+    hub = SSEHub(history=3)
+    first = hub.publish("1", room="r1")
+    hub.publish("2", room="r2")
+    hub.publish("3", room="r1")
+    missed = hub.replay(hub.event_id(first), "r1")
+    assert [e[2] for e in missed] == ["3"]
+    assert hub.replay(hub.event_id(hub._seq), "r1") == []
+    # Unknown epoch, garbage, future ids and ids older than the ring all force a reset
+    assert hub.replay(f"other-{first}", "r1") is None
+    assert hub.replay("garbage", "r1") is None
+    assert hub.replay(hub.event_id(99), "r1") is None
+    hub.publish("4", room="r1")
+    hub.publish("5", room="r1")
+    assert hub.replay(hub.event_id(first), "r1") is None
+
+
+def test_stream_resumes_then_delivers_live_without_duplicates():
+    hub = SSEHub()
+    first = hub.publish('{"n":1}', room="r")
+    hub.publish('{"n":2}', room="r")
+
+    async def run():
+        frames = []
+        stream = sse_stream(hub, "r", hub.event_id(first), heartbeat_seconds=5)
+        frames.append(await stream.__anext__())  # retry
+        frames.append(await stream.__anext__())  # replayed n=2
+        hub.publish('{"n":3}', room="r")
+        frames.append(await stream.__anext__())
+        await stream.aclose()
+        return frames
+
+    frames = anyio.run(run)
+    assert frames[0].startswith("retry:")
+    assert frames[1] == f"id: {hub.event_id(2)}\ndata: {{\"n\":2}}\n\n"
+    assert frames[2] == f"id: {hub.event_id(3)}\ndata: {{\"n\":3}}\n\n"
+    assert hub.subscriber_count() == 0
+    assert hub.stats()["resumes"] == 1
+
+
+def test_stream_sends_reset_for_stale_id_and_heartbeats_when_idle():
+    hub = SSEHub()
+
+    async def run():
+        stream = sse_stream(hub, None, "stale-1", heartbeat_seconds=0.01)
+        frames = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return frames
+
+    frames = anyio.run(run)
+    assert frames[1].startswith("event: reset")
+    assert frames[2] == ": ping\n\n"
+
+
+def test_slow_subscriber_stream_ends_on_overflow():
+    hub = SSEHub(queue_size=2)
+
+    async def run():
+        stream = sse_stream(hub, None, heartbeat_seconds=5)
+        await stream.__anext__()
+        for i in range(5):
+            hub.publish(str(i))
+        return [frame async for frame in stream]
+
+    frames = anyio.run(run)
+    assert len(frames) == 2
+    assert hub.stats()["overflows"] == 1
+    assert hub.subscriber_count() == 0
+
+
+def test_broadcast_pipeline_feeds_sse_hub():
+    import app.main as m
+
+    before = m._SSE_HUB.stats()["published"]
+    m._fan_out({"type": "set_found", "date": "2099-01-01"}, "daily-20990101", "set_found")
+    assert m._SSE_HUB.stats()["published"] == before + 1
+    assert '"set_found"' in m._SSE_HUB._history[-1][2]
+
+
+def test_schedule_broadcast_from_worker_thread_uses_main_loop(monkeypatch):
+    import app.main as m
+
+    seen = []
+
+    async def fake_broadcast(ev):
+        seen.append((ev, threading.current_thread().name))
+
+    async def run():
+        monkeypatch.setattr(m, "_MAIN_LOOP", asyncio.get_running_loop())
+        monkeypatch.setattr(m, "broadcast_event", fake_broadcast)
+        await anyio.to_thread.run_sync(m._schedule_broadcast, {"type": "completion"})
+        await asyncio.sleep(0.01)
+
+    anyio.run(run)
+    assert seen and seen[0][0] == {"type": "completion"}
+    assert seen[0][1] == threading.current_thread().name
+
+
+def test_events_endpoint_rejects_bad_date():
+    from app.main import app
+
+    client = TestClient(app)
+    assert client.get("/api/events?date=tomorrow").status_code == 400
+
+
+def test_streams_are_capped_per_ip_like_websockets(monkeypatch):
+    import app.main as m
+
+    hub = SSEHub(max_subscribers=3, max_per_ip=1)
+    sub = hub.subscribe("r", ip="1.2.3.4")
+    assert hub.admit("1.2.3.4") == "per_ip_limit"
+    assert hub.admit("5.6.7.8") is None
+    hub.unsubscribe(sub)
+    hub.unsubscribe(sub)
+    assert hub.admit("1.2.3.4") is None and hub.subscriber_count() == 0
+
+    monkeypatch.setattr(m._SSE_HUB, "max_per_ip", 1)
+    held = m._SSE_HUB.subscribe(None, ip="testclient")
+    try:
+        r = TestClient(m.app).get("/api/events")
+    finally:
+        m._SSE_HUB.unsubscribe(held)
+    assert r.status_code == 503 and r.headers["retry-after"]
+    assert m._SSE_HUB.stats()["rejected_per_ip"] >= 1
@@ -0,0 +1,90 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.static_assets import IMMUTABLE, REVALIDATE, StaticAssetCache, StaticAssetMiddleware
+
+JS = ("export const x = 1;\n" * 200).encode()
+
+
+def _site(tmp_path):
+    (tmp_path / "dist" / "assets").mkdir(parents=True)
+    (tmp_path / "dist" / "index.html").write_text("<html>" + "x" * 1000 + "</html>")
+    (tmp_path / "dist" / "assets" / "index-abc123.js").write_bytes(JS)
+    (tmp_path / "dist" / "assets" / "index-abc123.js.br").write_bytes(b"prebuilt-br")
+    (tmp_path / "favicon-16x16.png").write_bytes(b"\x89PNG" + b"\0" * 2000)
+    (tmp_path / "site.webmanifest").write_text('{"name": "x"}')
+    cache = StaticAssetCache(tmp_path)
+    cache.load()
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    def ping():
+        return {"ok": True}
+
+    app.add_middleware(StaticAssetMiddleware, cache=cache)
+    return TestClient(app), cache
+
+
+def test_hashed_assets_are_immutable_and_precompressed(tmp_path):
+    client, _ = _site(tmp_path)
+    r = client.get("/static/dist/assets/index-abc123.js", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == IMMUTABLE
+    assert r.headers["content-encoding"] == "gzip" and r.headers["vary"] == "Accept-Encoding"
+    assert r.headers["content-type"] == "text/javascript; charset=utf-8"
+    assert r.content == JS  # httpx decodes gzip
+    assert int(r.headers["content-length"]) == len(gzip.compress(JS, compresslevel=9, mtime=0))
+
+
+def test_prebuilt_brotli_variant_is_preferred_and_identity_when_not_accepted(tmp_path):
+    client, cache = _site(tmp_path)
+    asset = cache.get("/static/dist/assets/index-abc123.js")
+    body, headers = asset.select("gzip;q=0.5, br")
+    assert body == b"prebuilt-br" and (b"content-encoding", b"br") in headers
+    body, headers = asset.select("br;q=0, identity")
+    assert body == JS and not any(h[0] == b"content-encoding" for h in headers)
+
+
+def test_if_none_match_returns_304_without_body(tmp_path):
+    client, _ = _site(tmp_path)
+    first = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert first.headers["cache-control"] == REVALIDATE
+    assert first.text.startswith("<html>")
+    etag = first.headers["etag"]
+    r = client.get("/", headers={"If-None-Match": f'W/{etag}, "other"', "Accept-Encoding": "identity"})
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == etag
+
+
+def test_root_aliases_head_and_passthrough(tmp_path):
+    client, cache = _site(tmp_path)
+    r = client.get("/favicon-16x16.png")
+    assert r.headers["content-type"] == "image/png" and "content-encoding" not in r.headers
+    # manifest.webmanifest falls back to site.webmanifest
+    r = client.get("/manifest.webmanifest")
+    assert r.headers["content-type"].startswith("application/manifest+json")
+    head = client.head("/favicon-16x16.png")
+    assert head.status_code == 200 and head.content == b"" and head.headers["content-length"] == "2004"
+    assert client.get("/api/ping").json() == {"ok": True}
+    assert client.get("/static/missing.js").status_code == 404
+    assert cache.stats()["paths"] >= 5
+
+
+def test_unloaded_cache_passes_through_without_loading(tmp_path, monkeypatch):
+    client, cache = _site(tmp_path)
+    cache.loaded = False
+    monkeypatch.setattr(cache, "load", lambda: (_ for _ in ()).throw(AssertionError("loaded on the request path")))
+    assert client.get("/api/ping").json() == {"ok": True}
+    assert client.get("/favicon-16x16.png").status_code == 404
+
+
+def test_app_serves_shipped_icons_from_memory():
+    from app.main import _STATIC_ASSETS, app
+
+    # Done by the startup hook
+    _STATIC_ASSETS.load()
+    r = TestClient(app).get("/favicon.ico")
+    assert r.status_code == 200 and r.headers["cache-control"] and r.headers["etag"]
+    assert "content-security-policy" in r.headers
@@ -0,0 +1,119 @@
+import json
+import uuid
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import crud, models, tracing
+from app.tracing import FileSpanExporter, Tracer, configure_tracer, span, start_trace, trace_id_for, traced
+
+
+class _Collector:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, s):
+        self.spans.append(s)
+
+    def close(self):
+        pass
+
+    def by_name(self, name):
+        return next(s for s in self.spans if s.name == name)
+
+
+@pytest.fixture
+def collector():
+    c = _Collector()
+    configure_tracer(Tracer(c))
+    yield c
+    configure_tracer(Tracer())
+
+
+def test_nested_spans_share_the_request_trace(collector):
+    @traced()
+    def work():
+        with span("inner", k="v") as s:
+            s.set("n", 1)
+
+    rid = str(uuid.uuid4())
+    root = start_trace("GET /x", rid)
+    work()
+    root.end()
+
+    root_s, work_s, inner = collector.by_name("GET /x"), collector.by_name("test_tracing.work"), collector.by_name("inner")
+    assert root_s.trace_id == trace_id_for(rid) == uuid.UUID(rid).hex
+    assert work_s.parent_id == root_s.span_id and inner.parent_id == work_s.span_id
+    assert inner.tags == {"k": "v", "n": 1}
+    assert tracing.current_span() is None
+    assert len(trace_id_for("not-a-uuid")) == 32
+
+
+def test_spans_outside_a_trace_are_noops(collector):
+    with span("orphan") as s:
+        s.set("x", 1)
+    assert s is tracing.NOOP_SPAN
+    assert collector.spans == []
+    unsampled = Tracer(collector, sample_rate=0.0)
+    assert unsampled.start_trace("GET /", "rid") is tracing.NOOP_SPAN
+
+
+def test_file_exporter_writes_zipkin_v2_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(FileSpanExporter(str(path)))
+    root = tracer.start_trace("GET /api/daily", "req-1")
+    with span("crud.get_leaderboard", date="2099-01-01"):
+        pass
+    root.end()
+    tracer.close()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [s["name"] for s in lines] == ["crud.get_leaderboard", "GET /api/daily"]
+    child, parent = lines
+    assert child["parentId"] == parent["id"] and child["traceId"] == parent["traceId"]
+    assert parent["kind"] == "SERVER" and "parentId" not in parent
+    assert parent["localEndpoint"] == {"serviceName": "daily-set"}
+    assert child["tags"] == {"date": "2099-01-01"}
+    assert isinstance(child["timestamp"], int) and child["duration"] >= 1
+
+
+def test_request_trace_covers_session_crud_cache_and_queries(tmp_path, collector):
+    from app.main import app
+    from app.sqlmon import instrument_engine
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'tr.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    instrument_engine(engine)
+    crud.engine = engine
+    with Session(engine) as s:
+        p = models.Player(username="tracer", password_hash="x")
+        s.add(p)
+        s.commit()
+
+    r = TestClient(app).get("/api/leaderboard?date=2099-04-01", headers={"X-Request-ID": "trace-me"})
+    assert r.status_code == 200
+
+    root = collector.by_name("GET /api/leaderboard")
+    assert root.tags["http.status_code"] == 200 and root.tags["request_id"] == "trace-me"
+    names = {s.name for s in collector.spans if s.trace_id == root.trace_id}
+    assert {"deps.get_session", "cache.get_or_load", "crud.get_leaderboard", "db.query"} <= names
+    # Sync handler work (threadpool) hangs off the request's root span
+    assert collector.by_name("deps.get_session").parent_id == root.span_id
+    assert collector.by_name("crud.get_leaderboard").parent_id == collector.by_name("cache.get_or_load").span_id
+
+
+def test_broadcast_spans_join_the_scheduling_request(collector):
+    import app.main as m
+
+    async def run():
+        root = start_trace("POST /api/complete", "rid-b")
+        await m.broadcast_event({"type": "noop_trace", "date": "2099-01-01"})
+        root.end()
+
+    anyio.run(run)
+    root = collector.by_name("POST /api/complete")
+    bcast = collector.by_name("broadcast_event")
+    assert bcast.parent_id == root.span_id and bcast.tags["type"] == "noop_trace"
+    fan_out = collector.by_name("broadcast.fan_out")
+    assert fan_out.trace_id == root.trace_id and fan_out.tags["room"]
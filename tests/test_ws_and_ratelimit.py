@@ -42,24 +42,26 @@ def test_websocket_broadcast_enrichment(tmp_path):
 
     fake = FakeWS()
     import app.main as app_main
-    app_main._WS_CONNECTIONS = {fake: {'player_id': None, 'last_sent': 0}}
+    app_main._WS_CONNECTIONS.clear()
+    app_main._WS_CONNECTIONS[fake] = {'player_id': None, 'last_sent': 0}
 
-    # Trigger a completion event and run broadcast
+    # Trigger a completion event and run broadcast until the writer has sent it
     event = {"type": "completion", "player_id": pid, "date": today, "seconds": 42}
     import anyio
-    anyio.run(broadcast_event, event)
-
-    # Validate one message was sent and enriched
-    assert len(fake.texts) + len(fake.jsons) >= 1
-    if fake.texts:
-        data = json.loads(fake.texts[0])
-    else:
-        data = fake.jsons[0]
+    async def _broadcast_and_flush():
+        await broadcast_event(event)
+        await app_main._WS_CONNECTIONS.flush()
+    anyio.run(_broadcast_and_flush)
+    app_main._WS_CONNECTIONS.clear()
+
+    # Validate the enriched event was sent, followed by the leaderboard delta
+    assert len(fake.texts) == 2
+    data = json.loads(fake.texts[0])
     assert data.get('type') == 'completion'
     assert data.get('username') == 'alice'
-    leaders = data.get('leaders')
-    assert isinstance(leaders, list)
-    assert any(l.get('username') == 'alice' for l in leaders)
+    delta = json.loads(fake.texts[1])
+    assert delta['type'] == 'leaderboard_delta' and delta['date'] == today
+    assert any(op.get('row', {}).get('username') == 'alice' for op in delta['ops'])
 
 
 def test_rate_limit_window_edges(monkeypatch):
@@ -18,20 +18,25 @@ class FakeWS:
 
 
 def test_broadcast_event_throttle_and_cleanup(monkeypatch):
-    # Register a fake socket and ensure broadcast works and throttles
+    # Register a fake socket and ensure broadcast works and coalesces repeats
     try:
         _WS_CONNECTIONS.clear()
         ws = FakeWS()
         _WS_CONNECTIONS[ws] = {"last_sent": 0}
 
         ev = {"type": "other", "x": 1}
+
+        async def _broadcast_and_flush():
+            await broadcast_event(ev.copy())
+            await _WS_CONNECTIONS.flush()
+
         # First broadcast should send
-        anyio.run(broadcast_event, ev.copy())
+        anyio.run(_broadcast_and_flush)
         first_count = len(ws.sent)
         assert first_count in (1, 0)  # send_text or send_json depending on _prepare_message
 
-        # Rapid second broadcast should be throttled (no additional send)
-        anyio.run(broadcast_event, ev.copy())
+        # A rapid identical second broadcast is coalesced away (no additional send)
+        anyio.run(_broadcast_and_flush)
         assert len(ws.sent) == first_count
     finally:
         _WS_CONNECTIONS.clear()
@@ -66,17 +71,15 @@ async def _send_twice_quickly():
     meta = {"last_sent": 0}
     ev = {"x": 1}
     now = time.time()
-    # First send should pass and set last_sent
     ok1 = await _send_to_websocket(ws, meta, None, ev, now) # pyright: ignore[reportArgumentType]
-    # Second send within 0.45s window should be throttled (but still return True as no failure)
+    # Pacing lives in the connection writer now; a quick second send is not skipped
     ok2 = await _send_to_websocket(ws, meta, None, ev, now + 0.1) # pyright: ignore[reportArgumentType]
     return ws, ok1, ok2, meta
 
 
-def test_send_to_websocket_throttle():
+def test_send_to_websocket_never_silently_drops():
     ws, ok1, ok2, meta = asyncio.run(_send_twice_quickly())
     assert ok1 is True and ok2 is True
-    # Only one actual send should have occurred due to throttling
-    assert len(ws.sent) == 1
+    assert len(ws.sent) == 2
     # meta.last_sent should be updated
     assert meta["last_sent"] > 0
@@ -30,4 +30,55 @@ def test_ws_receives_completion_broadcast(tmp_path):
         msg = ws.receive_text()
         data = json.loads(msg)
         # For test broadcast, allow either enriched completion or raw event
-        assert data.get('type') in ('completion',)
\ No newline at end of file
+        assert data.get('type') in ('completion',)
+
+def test_ws_room_subscription_protocol(tmp_path):
+    setup_db(tmp_path)
+    client = TestClient(app)
+    with client.websocket_connect('/ws') as ws:
+        ws.send_text(json.dumps({"v": 1, "type": "subscribe", "date": "2099-01-01", "id": "s1"}))
+        data = json.loads(ws.receive_text())
+        assert data == {"v": 1, "type": "subscribed", "room": "daily-20990101", "id": "s1"}
+
+        ws.send_text(json.dumps({"type": "ping"}))
+        assert json.loads(ws.receive_text())["type"] == "pong"
+
+        ws.send_text(json.dumps({"type": "subscribe", "room": "no spaces"}))
+        assert json.loads(ws.receive_text())["type"] == "error"
+
+        ws.send_text(json.dumps({"type": "unsubscribe", "room": "daily-20990101"}))
+        assert json.loads(ws.receive_text())["type"] == "unsubscribed"
+
+
+def test_ws_refused_over_per_ip_cap(tmp_path, monkeypatch):
+    import pytest
+    from starlette.websockets import WebSocketDisconnect
+    from app import main as app_main
+
+    setup_db(tmp_path)
+    monkeypatch.setattr(app_main._WS_CONNECTIONS, "max_per_ip", 1)
+    client = TestClient(app)
+    with client.websocket_connect('/ws') as ws:
+        ws.send_text(json.dumps({"type": "ping"}))
+        assert json.loads(ws.receive_text())["type"] == "pong"
+        # The handshake completes and the socket is then closed with 1013
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect('/ws') as refused:
+                refused.receive_text()
+        assert exc.value.code == 1013
+    assert app_main._WS_CONNECTIONS.stats()["rejected_per_ip"] >= 1
+
+
+def test_ws_stats_runs_on_the_loop_that_owns_the_connection_tables(tmp_path):
+    import asyncio
+    from app import main as app_main
+
+    setup_db(tmp_path)
+    # A sync handler would read _conns/_rooms/_subs from a threadpool thread
+    assert asyncio.iscoroutinefunction(app_main.ws_stats)
+    client = TestClient(app)
+    with client.websocket_connect('/ws') as ws:
+        ws.send_text(json.dumps({"type": "ping"}))
+        ws.receive_text()
+        body = client.get('/api/ws/stats').json()
+    assert body["ws_stats"]["connections"] >= 1 and "subscribers" in body["sse"]